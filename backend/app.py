@@ -1,7 +1,7 @@
 import os
 import sys
 import json
-import re
+from typing import Optional
 
 # Get the absolute path of the current file
 current_file_path = os.path.abspath(__file__)
@@ -12,27 +12,30 @@ parent_dir_path = os.path.dirname(current_dir_path)
 # Add the parent directory path to the sys.path
 sys.path.insert(0, parent_dir_path)
 from fastapi import FastAPI, HTTPException, Request, Depends
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi import WebSocket, WebSocketDisconnect
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import BackgroundTasks
+from prometheus_client import make_asgi_app
 from fastapi import HTTPException, status
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import uvicorn
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from backend.auth import get_current_user
-from backend.database import get_db, init_db
-from backend.models import User, Query
+from backend.database import (
+    get_async_db,
+    init_db,
+    ReadOnlySessionLocal,
+)
+from backend.models import User
 from backend.crud import store_query_result, execute_sql, login_user
 from backend.auth import (
     SECRET_KEY,
     ALGORITHM,
     ACCESS_TOKEN_EXPIRE_MINUTES,
-    password_context,
     verify_token,
 )
 from backend.log import logger
@@ -45,16 +48,40 @@ from backend.schemas import (
     QueryCreate,
     QueryResponse,
     QueryRequest,
+    QueryPage,
+)
+from backend.crud import (
+    QUERY_HISTORY_PAGE_SIZE,
+    create_user,
+    get_user_queries,
+    get_user_query,
 )
-from backend.crud import create_user, get_user_queries
 from passlib.hash import bcrypt
 from dotenv import load_dotenv
-from llm import groq_llm
-from backend.config import db_info
+from backend.llm import groq_llm, groq_llm_stream
+from backend.cache import json_default
+from backend.result_encoding import (
+    ARROW_MEDIA_TYPE,
+    STREAM_CHUNK_SIZE,
+    to_arrow_ipc,
+    to_columnar,
+)
+from backend.question_catalogue import question_catalogue
+from backend.schemas import JobStatus
+from backend.jobs import create_job, get_job, subscribe
+from backend.celery_worker import run_text_to_sql
+from backend.services import services
+from backend.mq import event_publisher
+from backend.history_writer import history_writer
+from backend.password_hashing import password_hasher
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Streamed results keep only this many rows in the query history
+STREAM_HISTORY_MAX_ROWS = int(os.getenv("STREAM_HISTORY_MAX_ROWS", "1000"))
+# Completion token limit of the chart descriptions
+CHART_DESCRIPTION_MAX_TOKENS = int(os.getenv("CHART_DESCRIPTION_MAX_TOKENS", "1024"))
 
 app = FastAPI()
 router = APIRouter()
@@ -68,34 +95,95 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Expose Prometheus metrics (cache hit/miss counters, etc.)
+app.mount("/metrics", make_asgi_app())
+
 # Set up Jinja2 templates
 templates = Jinja2Templates(directory="frontend/")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, background_tasks: BackgroundTasks):
+async def websocket_endpoint(websocket: WebSocket, token: str):
+    """Answer questions over a WebSocket, streaming every stage as it happens.
+
+    The client sends `{"query": ...}` and receives `sql_generated` and `retry`
+    events while the agent works, then `result` (sql, columns, guard), the
+    `rows` chunks, the `description_token`s of the chart description and a
+    final `done` (or `error`).
+    """
+    try:
+        user_id = int(verify_token(token)["sub"])
+    except Exception:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
     logger.debug("Starting WebSocket connection")
     await websocket.accept()
+
+    async def send(event, **data):
+        message = json.dumps({"event": event, **data}, default=json_default)
+        await websocket.send_text(message)
+
     try:
         while True:
-            logger.debug(f"Received data in websocket")
-            data = await websocket.receive_text()  # Receive data
-            logger.debug(
-                f"Received data from client: {data}"
-            )  # Log the query for debugging
-            # do some processing here and send the results
-            result = {"data": data}
-            # Send back the data in JSON format
-            await websocket.send_json(result)
+            message = await websocket.receive_json()
+            query = (message.get("query") or "").strip()
+            logger.debug(f"Received query from client: {query}")
+            if not query:
+                await send("error", detail="query is required")
+                continue
+            try:
+                await stream_answer(query, user_id, send)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket query error: {e}")
+                await send("error", detail=getattr(e, "detail", None) or str(e))
 
     except WebSocketDisconnect:
         logger.debug("Client disconnected")
 
 
+async def stream_answer(query: str, user_id: int, send) -> None:
+    """Run one question through the pipeline and send each stage to `send`."""
+
+    async def on_event(event, data):
+        await send(event, **data)
+
+    db = ReadOnlySessionLocal()
+    try:
+        result = await execute_sql(query, db, stream=True, on_event=on_event)
+        await send("result", sql=result.sql, columns=result.columns, guard=result.guard)
+
+        history = []
+        row_count = 0
+        try:
+            async for chunk in result.iter_chunks(STREAM_CHUNK_SIZE):
+                if len(history) < STREAM_HISTORY_MAX_ROWS:
+                    history.extend(chunk[: STREAM_HISTORY_MAX_ROWS - len(history)])
+                await send("rows", rows=chunk)
+                row_count += len(chunk)
+        finally:
+            await result.aclose()
+    finally:
+        await db.close()
+
+    history_result = result.model_copy(update={"rows": history})
+    await history_writer.enqueue(user_id, query, to_columnar(history_result))
+
+    prompt = await asyncio.to_thread(
+        description_prompt, query, history_result.rows, history_result.columns
+    )
+    async for token in groq_llm_stream(prompt, max_tokens=CHART_DESCRIPTION_MAX_TOKENS):
+        await send("description_token", token=token)
+    await send("done", row_count=row_count)
+
+
 @router.post("/login")
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Authenticate user and return JWT token."""
     try:
@@ -104,7 +192,9 @@ def login(
         )  # OAuth2PasswordRequestForm sends 'username' for email
         password = form_data.password
         logger.debug(f"Login with email: {email} and password: {password}")
-        return login_user(db, email, password)
+        return await login_user(db, email, password)
+    except HTTPException:
+        raise
     except ValidationError as e:
         logger.error(f"Validation error: {e.errors()}")
         raise HTTPException(
@@ -116,19 +206,21 @@ def login(
 
 
 @router.post("/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)) -> UserResponse:
+async def register_user(
+    user: UserCreate, db: AsyncSession = Depends(get_async_db)
+) -> UserResponse:
     """Register a new user.
 
     Args:
         user (UserCreate): The user data.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         UserResponse: The registered user data.
     """
     try:
         logger.debug(f"register user: {user.username}")
-        return create_user(user, db)
+        return await create_user(user, db)
     except ValidationError as e:
         logger.error(f"Validation error: {e.errors()}")
         raise HTTPException(
@@ -140,123 +232,270 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)) -> UserRespon
 
 
 @router.post("/queries", response_model=QueryResponse)
-def submit_query(
-    query: QueryCreate, user_id: int, db: Session = Depends(get_db)
+async def submit_query(
+    query: QueryCreate, user_id: int, db: AsyncSession = Depends(get_async_db)
 ) -> QueryResponse:
     """Submit a new query.
 
     Args:
         query (QueryCreate): The query data.
         user_id (int): The user ID.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         QueryResponse: The stored query result.
     """
     try:
         analysis_result = f"Analysis of query: {query.query}"
-        return store_query_result(user_id, query.query, analysis_result, db)
+        return await store_query_result(user_id, query.query, analysis_result, db)
     except Exception as e:
         logger.error(f"Query submission error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@router.get("/queries/{user_id}", response_model=list[QueryResponse])
-def get_queries(user_id: int, db: Session = Depends(get_db)) -> list[QueryResponse]:
-    """Fetch all queries for a given user."""
+def check_history_owner(user_id: int, current_user: User) -> None:
+    """Only let users read their own query history."""
+    if current_user.id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not allowed to read the queries of another user",
+        )
+
+
+@router.get("/queries/{user_id}", response_model=QueryPage)
+async def get_queries(
+    user_id: int,
+    limit: int = QUERY_HISTORY_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+) -> QueryPage:
+    """Fetch a page of queries for a given user, newest first.
+
+    The results are left out; fetch one with `/queries/{user_id}/{query_id}`.
+    """
+    check_history_owner(user_id, current_user)
     try:
-        queries = db.query(Query).filter(Query.user_id == user_id).all()
-        return [
-            QueryResponse.model_validate(q) for q in queries
-        ]  # Auto-converts ORM to Pydantic
+        return await get_user_queries(user_id, db, limit, cursor)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Fetching queries error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.get("/queries/{user_id}/{query_id}", response_model=QueryResponse)
+async def get_query(
+    user_id: int,
+    query_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user),
+) -> QueryResponse:
+    """Fetch one query of a user with its result."""
+    check_history_owner(user_id, current_user)
+    return await get_user_query(user_id, query_id, db)
+
+
 @app.post("/execute_query/")
 async def execute_query(
     request: QueryRequest,
+    format: str = "records",
+    mode: str = "sync",
     user_id: int = Depends(
         get_current_user
     ),  # Ensure only logged-in users can execute queries
-    db: Session = Depends(get_db),
 ):
+    if format not in ("records", "columnar", "arrow"):
+        raise HTTPException(
+            status_code=400, detail="format must be records, columnar or arrow"
+        )
+    if mode not in ("sync", "job"):
+        raise HTTPException(status_code=400, detail="mode must be sync or job")
+
+    if mode == "job":
+        # A Celery worker runs the pipeline, the result is polled or pushed
+        job = await create_job(user_id.id, request.query)
+        # Publishing to the broker is a blocking round trip
+        await asyncio.to_thread(
+            run_text_to_sql.delay, job.job_id, user_id.id, request.query
+        )
+        logger.debug(f"Enqueued job {job.job_id}")
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={
+                "job_id": job.job_id,
+                "status": job.status,
+                "status_url": f"/jobs/{job.job_id}",
+                "events_url": f"/jobs/{job.job_id}/events",
+            },
+        )
+
     try:
-        rows = await execute_sql(request.query, db)
-        logger.debug(f"Executing query: {rows}")
+        # Generated SQL runs on its own read-only sessions
+        result = await execute_sql(request.query)
+        logger.debug(f"Executed query returned {result.row_count} rows")
+
+        # Query results are written to the history in the background
+        columnar = to_columnar(result)
+        await history_writer.enqueue(user_id, request.query, columnar)
+
+        if format == "arrow":
+            return Response(
+                content=to_arrow_ipc(result),
+                media_type=ARROW_MEDIA_TYPE,
+                headers={"X-Query-Guard": json.dumps(result.guard)},
+            )
+        if format == "columnar":
+            return {"sql": result.sql, "guard": result.guard, **columnar}
+        return {"data": result.records(), "sql": result.sql, "guard": result.guard}
+    except Exception as e:
+        logger.error(f"Query execution error: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
 
-        # Store query results in DB for tracking
-        store_query_result(user_id, request.query, rows, db)
+@app.post("/execute_query/stream")
+async def execute_query_stream(
+    request: QueryRequest,
+    format: str = "ndjson",
+    user_id: int = Depends(get_current_user),
+):
+    """Execute a query and stream its rows from a server-side cursor.
+
+    Args:
+        request (QueryRequest): The natural language question.
+        format (str): "ndjson" sends a header line followed by one line per row
+            chunk; "json" sends a single chunked JSON document.
+        user_id (User): The authenticated user.
+
+    Returns:
+        StreamingResponse: The rows, encoded chunk by chunk.
+    """
+    if format not in ("ndjson", "json"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or json")
 
-        return {"data": rows}
+    # The session has to outlive this handler, so it is owned by the stream
+    db = ReadOnlySessionLocal()
+    try:
+        result = await execute_sql(request.query, db, stream=True)
     except Exception as e:
+        await db.close()
         logger.error(f"Query execution error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
+    def dumps(value):
+        return json.dumps(value, default=json_default)
+
+    async def body():
+        history = []
+        row_count = 0
+        try:
+            if format == "ndjson":
+                header = {"sql": result.sql, "columns": result.columns}
+                yield dumps({**header, "guard": result.guard}) + "\n"
+            else:
+                yield '{"sql": %s, "columns": %s, "guard": %s, "data": [' % (
+                    dumps(result.sql),
+                    dumps(result.columns),
+                    dumps(result.guard),
+                )
+            async for chunk in result.iter_chunks(STREAM_CHUNK_SIZE):
+                if len(history) < STREAM_HISTORY_MAX_ROWS:
+                    history.extend(chunk[: STREAM_HISTORY_MAX_ROWS - len(history)])
+                if format == "ndjson":
+                    yield dumps({"rows": chunk}) + "\n"
+                else:
+                    items = ", ".join(
+                        dumps(dict(zip(result.columns, row))) for row in chunk
+                    )
+                    yield (", " if row_count else "") + items
+                row_count += len(chunk)
+            if format == "json":
+                yield "]}"
+            logger.debug(f"Streamed {row_count} rows")
+            history_result = result.model_copy(update={"rows": history})
+            await history_writer.enqueue(
+                user_id, request.query, to_columnar(history_result)
+            )
+        finally:
+            await result.aclose()
+            await db.close()
 
-# Function to extract questions from plain text
-def extract_questions(text):
-    lines = text.split("\n")
-    questions = []
-    for line in lines:
-        line = line.strip()
-        match = re.match(r"^\d+\.\s\*\*(.*?)\*\*$", line)  # Match numbered questions
-        if match:
-            questions.append(match.group(1))  # Extract clean question
-    return questions
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(body(), media_type=media_type)
 
 
-@app.post("/business_questions/")
-async def generate_questions():
-    try:
-        prompt = f""" 
-        You are an expert data scientist. Generate
-        business questions from these tables: {db_info}
-        """
-        data = await groq_llm(prompt)
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def job_status(job_id: str, user_id: int = Depends(get_current_user)):
+    """Poll the state (and, once finished, the result) of a query job."""
+    job = await get_job(job_id)
+    if job is None or job.user_id != user_id.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-        # Log raw response from LLM
-        logger.debug(f"Raw response from LLM: {data}")
 
-        # If response is a string, treat it as plain text
-        if isinstance(data, str):
-            try:
-                data = json.loads(data)  # Try parsing as JSON
-            except json.JSONDecodeError:
-                logger.warning("LLM response is not JSON, treating as plain text.")
-                questions_list = extract_questions(
-                    data
-                )  # Extract questions from raw text
-                return {"questions": questions_list}
-
-        # If JSON, extract questions from "questions" key
-        if "questions" not in data:
-            logger.error("Unexpected response format: missing 'questions' key.")
-            raise HTTPException(
-                status_code=500, detail="Unexpected response format from LLM"
-            )
+@app.websocket("/jobs/{job_id}/events")
+async def job_events(websocket: WebSocket, job_id: str, token: str):
+    """Push the progress events and the result of a query job.
+
+    Browsers can't set headers on WebSockets, so the JWT is sent as `token`.
+    """
+    try:
+        owner = int(verify_token(token)["sub"])
+    except Exception:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    job = await get_job(job_id)
+    if job is None or job.user_id != owner:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
 
-        questions_list = extract_questions(data["questions"])
-        logger.debug(f"Extracted questions: {questions_list}")
-        return {"questions": questions_list}
+    await websocket.accept()
+    try:
+        async for event in subscribe(job_id):
+            await websocket.send_text(json.dumps(event, default=json_default))
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.debug(f"Client stopped following job {job_id}")
 
+
+@app.post("/business_questions/")
+async def generate_questions():
+    """Serve the business questions precomputed for the current schema."""
+    try:
+        catalogue = await question_catalogue.get()
+        logger.debug(f"Serving {len(catalogue.questions)} business questions")
+        return {"questions": catalogue.questions}
     except Exception as e:
         logger.error(f"Business questions error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def description_prompt(query, data, columns=None) -> str:
+    """Build the chart description prompt from a profile of the data.
+
+    The rows are summarized by `profile_data`, so the prompt has the same
+    size however many rows the query returned.
+    """
+    # pandas is only imported once a description is requested
+    from backend.profiling import profile_data
+
+    profile = profile_data(data, columns)
+    return f""" 
+        You are expert data scientist to analysis this data profile:
+        {profile}
+        by this question from user: {query}
+        please explain as a data scientist in details.
+        """
+
+
 @app.post("/chart_description/")
 async def chart_description(request: ChartRequest):
     try:
         logger.info(f"user query: {request.query}")
-        logger.info(f"chart_data: {request.data}")
-        prompt = f""" 
-        You are expert data scientist to analysis this data: {request.data}
-        by this question from user: {request.query}
-        please explain as a data scientist in details.
-        """
-        desc = await groq_llm(prompt)
+        prompt = await asyncio.to_thread(
+            description_prompt, request.query, request.data
+        )
+        desc = await groq_llm(prompt, max_tokens=description_max_tokens(request))
         logger.debug(f"description: {desc}")
         return {"description": desc}
     except Exception as e:
@@ -264,6 +503,53 @@ async def chart_description(request: ChartRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post("/chart_description/stream")
+async def chart_description_stream(request: ChartRequest, http_request: Request):
+    """Stream the chart description as Server-Sent Events.
+
+    Each completion token is sent as `data: {"token": ...}` as soon as the LLM
+    produces it, followed by an `event: done`. The upstream completion is
+    cancelled when the client disconnects.
+    """
+    logger.info(f"user query: {request.query}")
+    prompt = await asyncio.to_thread(description_prompt, request.query, request.data)
+    max_tokens = description_max_tokens(request)
+
+    def sse(data, event=None):
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {json.dumps(data)}\n\n"
+
+    async def events():
+        tokens = groq_llm_stream(prompt, max_tokens=max_tokens)
+        count = 0
+        try:
+            async for token in tokens:
+                if await http_request.is_disconnected():
+                    logger.debug(f"Client left after {count} description tokens")
+                    return
+                count += 1
+                yield sse({"token": token})
+            yield sse({"tokens": count}, event="done")
+        except Exception as e:
+            logger.error(f"Description of chart error: {e}")
+            yield sse({"detail": str(e)}, event="error")
+        finally:
+            # Closes the Groq stream, so no more tokens are generated
+            await tokens.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def description_max_tokens(request: ChartRequest) -> int:
+    if request.max_tokens is None:
+        return CHART_DESCRIPTION_MAX_TOKENS
+    return min(request.max_tokens, CHART_DESCRIPTION_MAX_TOKENS)
+
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -279,6 +565,51 @@ def startup():
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@app.on_event("startup")
+async def warm_up_agents():
+    # Loaded in the background so the API serves requests while DSPy imports
+    async def warm_up():
+        try:
+            await services.aget("text_to_sql")
+        except Exception as e:
+            logger.error(f"Error warming up the agents: {e}")
+
+    app.state.agent_warm_up = asyncio.create_task(warm_up())
+
+
+@app.on_event("startup")
+async def warm_up_question_catalogue():
+    # Generated in the background so startup doesn't wait for the LLM
+    app.state.question_warm_up = asyncio.create_task(question_catalogue.warm_up())
+
+
+@app.on_event("startup")
+async def start_history_writer():
+    history_writer.start()
+
+
+@app.on_event("startup")
+def start_password_hasher():
+    # Worker processes are spawned now rather than by the first login
+    password_hasher.warm_up()
+
+
+@app.on_event("shutdown")
+def stop_password_hasher():
+    password_hasher.shutdown()
+
+
+@app.on_event("shutdown")
+async def flush_history():
+    await history_writer.stop()
+
+
+@app.on_event("shutdown")
+async def flush_events():
+    # Deliver the buffered events before the process exits
+    await asyncio.to_thread(event_publisher.flush)
+
+
 app.include_router(router)
 
 if __name__ == "__main__":
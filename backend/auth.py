@@ -14,11 +14,10 @@ from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from backend.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.database import get_async_db
 from backend.models import User
-from passlib.context import CryptContext
+from backend.principal_cache import principal_cache
 from backend.log import logger
 import jwt
 from fastapi import HTTPException
@@ -36,7 +35,6 @@ ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def verify_token(token: str) -> Optional[dict]:
@@ -69,35 +67,6 @@ def verify_token(token: str) -> Optional[dict]:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-def hash_password(password: str) -> str:
-    return password_context.hash(password)
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash.
-
-    Args:
-        plain_password (str): The plain password.
-        hashed_password (str): The hashed password.
-
-    Returns:
-        bool: True if the password matches, False otherwise.
-    """
-    return password_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str) -> str:
-    """Hash a password.
-
-    Args:
-        password (str): The plain password.
-
-    Returns:
-        str: The hashed password.
-    """
-    return password_context.hash(password)
-
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token.
 
@@ -116,14 +85,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Get the current user from the token.
 
+    The user is read from `principal_cache` and only looked up in MySQL
+    on a miss.
+
     Args:
         token (str): The JWT token.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         User: The current user.
@@ -135,11 +107,15 @@ def get_current_user(
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token"
             )
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await principal_cache.get(user_id)
+        if user is not None:
+            return user
+        user = await db.get(User, int(user_id))
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found"
             )
+        await principal_cache.put(user)
         return user
     except JWTError:
         raise HTTPException(
@@ -9,9 +9,21 @@ current_dir_path = os.path.dirname(current_file_path)
 parent_dir_path = os.path.dirname(current_dir_path)
 # Add the parent directory path to the sys.path
 sys.path.insert(0, parent_dir_path)
-import redis
+import re
+import time
 import json
-from backend.encryption import encrypt, decrypt
+import asyncio
+import hashlib
+import weakref
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+import redis
+import redis.asyncio as aioredis
+import sqlglot
+from sqlglot import exp
+from prometheus_client import Counter
+from sqlalchemy.sql import bindparam, text
 from backend.log import logger
 from dotenv import load_dotenv
 
@@ -20,15 +32,97 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Secret key and hashing algorithm
-REDIS_HOST = os.getenv("REDIS_HOST")
-REDIS_PORT = int(os.getenv("REDIS_PORT"))
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+# Key results on the tables' UPDATE_TIME too, so writes made by other clients
+# (ETL, admin tools) invalidate them; without it they only expire after the TTL
+RESULT_CACHE_UPDATE_TIME = (
+    os.getenv("RESULT_CACHE_UPDATE_TIME", "true").lower() == "true"
+)
+
+RESULT_PREFIX = "sqlcache:result:"
+VERSION_PREFIX = "sqlcache:version:"
+INDEX_KEY = "sqlcache:index"
+
+UPDATE_TIMES_SQL = text(
+    """
+SELECT LOWER(TABLE_NAME), UPDATE_TIME, UPDATE_TIME >= NOW() - INTERVAL 1 SECOND
+FROM information_schema.TABLES
+WHERE TABLE_SCHEMA = DATABASE() AND LOWER(TABLE_NAME) IN :tables
+"""
+).bindparams(bindparam("tables", expanding=True))
 
 # Connect to Redis
 redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+# asyncio clients by event loop, their connections can't be shared across loops
+async_redis_clients = weakref.WeakKeyDictionary()
+
+result_cache_hits = Counter(
+    "result_cache_hits_total", "Executed SQL answered from the result cache"
+)
+result_cache_misses = Counter(
+    "result_cache_misses_total", "Executed SQL that had to run against MySQL"
+)
+result_cache_evictions = Counter(
+    "result_cache_evictions_total", "Result cache entries evicted by the size bound"
+)
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Return the asyncio Redis client of the running event loop.
+
+    Use it instead of `redis_client` in coroutines on the request path, so a
+    Redis round trip never blocks the event loop. Celery tasks run their own
+    loops and get their own client.
+    """
+    loop = asyncio.get_running_loop()
+    client = async_redis_clients.get(loop)
+    if client is None:
+        client = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+        async_redis_clients[loop] = client
+    return client
+
+
+async def release_lock(key: str, token: str) -> bool:
+    """Delete a lock only if it still holds the token of its owner.
+
+    A lock whose timeout passed may have been taken by another worker, so the
+    comparison and the delete run in one WATCH/MULTI transaction.
+
+    Args:
+        key (str): The lock key.
+        token (str): The value the owner stored with SET NX.
+
+    Returns:
+        bool: Whether the lock was released.
+    """
+    async with get_async_redis().pipeline(transaction=True) as pipe:
+        try:
+            await pipe.watch(key)
+            if await pipe.get(key) != token:
+                return False
+            pipe.multi()
+            pipe.delete(key)
+            await pipe.execute()
+            return True
+        except redis.WatchError:
+            return False
+
+
+def json_default(value):
+    """Serialize database values that `json` does not handle natively."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
 
 
 def set_cache(key: str, value: dict, expiration: int = 3600) -> None:
-    """Store encrypted data in Redis cache.
+    """Store data in Redis cache.
 
     Args:
         key (str): The key under which the data is stored.
@@ -36,30 +130,269 @@ def set_cache(key: str, value: dict, expiration: int = 3600) -> None:
         expiration (int, optional): Expiration time in seconds. Defaults to 3600.
     """
     try:
-        encrypted_value = encrypt(json.dumps(value))
-        redis_client.set(key, encrypted_value, ex=expiration)
+        redis_client.set(key, json.dumps(value, default=json_default), ex=expiration)
         logger.info(f"Cache set for key: {key}")
     except Exception as e:
         logger.error(f"Error setting cache: {e}")
 
 
 def get_cache(key: str) -> dict:
-    """Retrieve decrypted data from Redis cache.
+    """Retrieve data from Redis cache.
 
     Args:
         key (str): The key under which the data is stored.
 
     Returns:
-        dict: The decrypted data if found, otherwise None.
+        dict: The data if found, otherwise None.
     """
     try:
         data = redis_client.get(key)
         if data:
-            decrypted_data = json.loads(decrypt(data))
             logger.info(f"Cache hit for key: {key}")
-            return decrypted_data
+            return json.loads(data)
         logger.info(f"Cache miss for key: {key}")
         return None
     except Exception as e:
         logger.error(f"Error getting cache: {e}")
         return None
+
+
+def canonical_sql(sql: str) -> str:
+    """Normalize SQL so that formatting differences map onto the same text.
+
+    Comments, redundant whitespace, identifier quoting, keyword case and the
+    trailing semicolon are removed. String literals are kept verbatim.
+
+    Args:
+        sql (str): The SQL statement.
+
+    Returns:
+        str: The canonical form of the statement.
+    """
+    sql = re.sub(r"/\*(?!\+).*?\*/", " ", sql, flags=re.S)
+    sql = re.sub(r"(--|#)[^\n]*", " ", sql)
+    parts = re.split(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\")", sql)
+    canonical = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            canonical.append(part)  # string literal
+            continue
+        part = part.replace("`", "").lower()
+        part = re.sub(r"\s+", " ", part)
+        part = re.sub(r"\s*([,()=<>+*/-])\s*", r"\1", part)
+        canonical.append(part)
+    return "".join(canonical).strip().rstrip(";").strip()
+
+
+def sql_fingerprint(sql: str) -> str:
+    """Hash the canonical form of a SQL statement.
+
+    Args:
+        sql (str): The SQL statement.
+
+    Returns:
+        str: The SHA-256 hex digest of the canonical SQL.
+    """
+    return hashlib.sha256(canonical_sql(sql).encode("utf-8")).hexdigest()
+
+
+def referenced_tables(sql: str) -> list[str]:
+    """Find the tables a SQL statement reads from or writes to.
+
+    CTE names are not tables. Statements sqlglot can't parse fall back to a
+    scan for the names following FROM, JOIN, UPDATE, INTO and TABLE.
+
+    Args:
+        sql (str): The SQL statement.
+
+    Returns:
+        list[str]: The sorted, de-duplicated table names.
+    """
+    try:
+        trees = [tree for tree in sqlglot.parse(sql, read="mysql") if tree]
+    except sqlglot.errors.ParseError:
+        trees = None
+    if trees is not None:
+        tables = set()
+        for tree in trees:
+            ctes = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+            tables |= {
+                table.name.lower()
+                for table in tree.find_all(exp.Table)
+                if table.name and table.name.lower() not in ctes
+            }
+        return sorted(tables)
+
+    sql = canonical_sql(sql)
+    tables = set()
+    pattern = (
+        r"\b(?:from|join|update|into|table)\s+"
+        r"([\w.]+(?:\s*(?:as\s+)?\w*\s*,\s*[\w.]+)*)"
+    )
+    for match in re.finditer(pattern, sql):
+        for item in match.group(1).split(","):
+            name = item.strip().split(" ")[0]
+            if name and not name.startswith("("):
+                tables.add(name.split(".")[-1])
+    return sorted(tables)
+
+
+def is_write_statement(sql: str) -> bool:
+    """Check whether a SQL statement modifies data or schema."""
+    return bool(
+        re.match(
+            r"(insert|update|delete|replace|merge|create|alter|drop|truncate|rename)\b",
+            canonical_sql(sql),
+        )
+    )
+
+
+async def table_versions(tables: list[str]) -> list[int]:
+    """Read the current version counter of each table.
+
+    Args:
+        tables (list[str]): The table names.
+
+    Returns:
+        list[int]: One version per table, 0 for tables never written.
+    """
+    if not tables:
+        return []
+    versions = await get_async_redis().mget([f"{VERSION_PREFIX}{t}" for t in tables])
+    return [int(v or 0) for v in versions]
+
+
+async def bump_table_versions(tables: list[str]) -> None:
+    """Invalidate every cached result that reads from the given tables.
+
+    Args:
+        tables (list[str]): The tables that were written to.
+    """
+    try:
+        pipe = get_async_redis().pipeline()
+        for table in tables:
+            pipe.incr(f"{VERSION_PREFIX}{table}")
+        await pipe.execute()
+        logger.info(f"Result cache invalidated for tables: {tables}")
+    except Exception as e:
+        logger.error(f"Error bumping table versions: {e}")
+
+
+async def table_update_times(session, tables: list[str]) -> Optional[list[str]]:
+    """Read when MySQL last saw a write to each table, whoever made it.
+
+    Bumping versions only covers writes that pass through this application,
+    so the UPDATE_TIME of the tables becomes part of the cache key as well.
+    UPDATE_TIME has a resolution of one second: results of a table written
+    within the last second are not cached at all.
+
+    Args:
+        session (AsyncSession): The session the query runs on.
+        tables (list[str]): The table names, as from `referenced_tables`.
+
+    Returns:
+        Optional[list[str]]: One stamp per table ("" if MySQL has not recorded
+            a write since it started), or None if the result must bypass the
+            cache because a table is being written or the stamps are unknown.
+    """
+    if not RESULT_CACHE_UPDATE_TIME or not tables:
+        return []
+    try:
+        result = await session.execute(UPDATE_TIMES_SQL, {"tables": tables})
+        rows = {name: (stamp, recent) for name, stamp, recent in result}
+    except Exception as e:
+        logger.warning(f"Table update times unavailable, skipping the cache: {e}")
+        return None
+    stamps = []
+    for table in tables:
+        stamp, recent = rows.get(table, (None, None))
+        if recent:
+            return None
+        stamps.append(stamp.isoformat() if stamp is not None else "")
+    return stamps
+
+
+async def result_cache_key(sql: str, update_times: Optional[list[str]] = None) -> str:
+    """Build the cache key for a query from its fingerprint and table versions.
+
+    Args:
+        sql (str): The SQL statement.
+        update_times (Optional[list[str]]): The output of `table_update_times`.
+
+    Returns:
+        str: The Redis key of the cached result.
+    """
+    tables = referenced_tables(sql)
+    versions = await table_versions(tables)
+    version_tag = ".".join(f"{t}@{v}" for t, v in zip(tables, versions))
+    if update_times:
+        stamps = ",".join(update_times)
+        version_tag += f":{hashlib.sha256(stamps.encode('utf-8')).hexdigest()[:16]}"
+    return f"{RESULT_PREFIX}{sql_fingerprint(sql)}:{version_tag}"
+
+
+async def get_cached_result(
+    sql: str, update_times: Optional[list[str]] = None
+) -> Optional[list]:
+    """Return the cached rows of a query if none of its tables changed.
+
+    Args:
+        sql (str): The SQL statement.
+        update_times (Optional[list[str]]): The output of `table_update_times`.
+
+    Returns:
+        Optional[list]: The cached rows, otherwise None.
+    """
+    try:
+        client = get_async_redis()
+        key = await result_cache_key(sql, update_times)
+        data = await client.get(key)
+        if data is None:
+            result_cache_misses.inc()
+            return None
+        # Refresh the recency score used for eviction
+        await client.zadd(INDEX_KEY, {key: time.time()})
+        result_cache_hits.inc()
+        logger.info(f"Result cache hit for key: {key}")
+        return json.loads(data)
+    except Exception as e:
+        logger.error(f"Error reading result cache: {e}")
+        result_cache_misses.inc()
+        return None
+
+
+async def set_cached_result(
+    sql: str,
+    rows: list,
+    expiration: int = RESULT_CACHE_TTL,
+    update_times: Optional[list[str]] = None,
+) -> None:
+    """Cache the rows of a read query and evict the least recently used entries.
+
+    Args:
+        sql (str): The SQL statement.
+        rows (list): The rows returned by the query.
+        expiration (int, optional): Expiration time in seconds.
+        update_times (Optional[list[str]]): The output of `table_update_times`.
+    """
+    try:
+        client = get_async_redis()
+        key = await result_cache_key(sql, update_times)
+        now = time.time()
+        pipe = client.pipeline()
+        pipe.set(key, json.dumps(rows, default=json_default), ex=expiration)
+        pipe.zadd(INDEX_KEY, {key: now})
+        # Forget index entries whose values have already expired
+        pipe.zremrangebyscore(INDEX_KEY, 0, now - expiration)
+        pipe.zcard(INDEX_KEY)
+        size = (await pipe.execute())[-1]
+
+        overflow = size - RESULT_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            evicted = [k for k, _ in await client.zpopmin(INDEX_KEY, overflow)]
+            if evicted:
+                await client.delete(*evicted)
+                result_cache_evictions.inc(len(evicted))
+        logger.info(f"Result cache set for key: {key}")
+    except Exception as e:
+        logger.error(f"Error writing result cache: {e}")
@@ -11,16 +11,26 @@ parent_dir_path = os.path.dirname(current_dir_path)
 # Add the parent directory path to the sys.path
 sys.path.insert(0, parent_dir_path)
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 import time
+import asyncio
 from dotenv import load_dotenv
+from backend.database import async_engine, readonly_async_engine
+from backend.crud import execute_sql
+from backend.history_writer import history_writer
+from backend.jobs import publish_event
+from backend.mq import event_publisher
+from backend.services import services
+from backend.llm import llm_client
+from backend.result_encoding import to_columnar
 
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Secret key and hashing algorithm
-REDIS_HOST = os.getenv("REDIS_HOST")
-REDIS_PORT = int(os.getenv("REDIS_PORT"))
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 
 celery_app = Celery(
     "tasks",
@@ -29,7 +39,72 @@ celery_app = Celery(
 )
 
 
+@worker_process_init.connect
+def warm_up_agents(**kwargs):
+    # Each worker process builds its agents once, before the first job
+    services.get("text_to_sql")
+
+
+@worker_process_shutdown.connect
+def flush_events(**kwargs):
+    # The Kafka drain thread dies with the process, deliver what it buffered
+    event_publisher.close()
+
+
+@worker_process_shutdown.connect
+def flush_history(**kwargs):
+    # History records buffered in memory while Redis was down die with the
+    # process too; write them (and the spool) to MySQL before it exits
+    asyncio.run(flush_history_buffer())
+
+
+async def flush_history_buffer() -> None:
+    try:
+        await history_writer.stop()
+    finally:
+        await async_engine.dispose()
+
+
 @celery_app.task
 def long_running_task(x, y):
     time.sleep(5)  # Simulate long task
     return x + y
+
+
+@celery_app.task(name="text_to_sql")
+def run_text_to_sql(job_id: str, user_id: int, query: str):
+    """Run the text-to-SQL pipeline for a job and publish its progress.
+
+    Args:
+        job_id (str): The job created by `backend.jobs.create_job`.
+        user_id (int): The user who submitted the question.
+        query (str): The natural language question.
+    """
+    asyncio.run(text_to_sql_job(job_id, user_id, query))
+
+
+async def text_to_sql_job(job_id: str, user_id: int, query: str) -> None:
+    async def on_event(event, data):
+        await publish_event(job_id, event, data)
+
+    await publish_event(job_id, "running")
+    try:
+        result = await execute_sql(query, on_event=on_event)
+        columnar = to_columnar(result)
+        # The API flushes the spooled history into MySQL
+        await history_writer.enqueue(user_id, query, columnar)
+        await publish_event(
+            job_id,
+            "succeeded",
+            {"sql": result.sql, "guard": result.guard, **columnar},
+        )
+        logger.info(f"Job {job_id} finished with {result.row_count} rows")
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e)
+        logger.error(f"Job {job_id} failed: {detail}")
+        await publish_event(job_id, "failed", {"error": detail})
+    finally:
+        # Pooled connections are bound to this task's event loop
+        await async_engine.dispose()
+        await readonly_async_engine.dispose()
+        await llm_client.close()
@@ -0,0 +1,189 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import uuid
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Optional
+from prometheus_client import Counter
+from dotenv import load_dotenv
+from backend.cache import get_async_redis
+from backend.schemas import QueryResult
+from backend.semantic_cache import normalize_question
+from backend.log import logger
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+# Longest time a replica runs a question on behalf of the others
+COALESCE_LOCK_TTL = int(os.getenv("COALESCE_LOCK_TTL", "120"))
+# How long a finished result stays readable for waiting replicas
+COALESCE_RESULT_TTL = int(os.getenv("COALESCE_RESULT_TTL", "10"))
+
+LOCK_PREFIX = "coalesce:lock:"
+RESULT_PREFIX = "coalesce:result:"
+CHANNEL_PREFIX = "coalesce:done:"
+
+coalesced_requests = Counter(
+    "coalesced_requests_total",
+    "Questions answered by another in-flight execution",
+    ["scope"],
+)
+
+
+def coalesce_key(question: str, schema_hash: str, stream: bool) -> str:
+    """Key identical questions against the same schema and result mode."""
+    mode = "stream" if stream else "rows"
+    digest = hashlib.sha256(normalize_question(question).encode("utf-8")).hexdigest()
+    return f"{schema_hash}:{mode}:{digest[:32]}"
+
+
+class Coalescer:
+    """
+    Singleflight for the text-to-SQL pipeline.
+
+    Concurrent calls with the same key in this process await one shared
+    future; across replicas, a Redis lock elects the replica that runs the
+    pipeline and the others wait for its result on a pub/sub channel.
+    """
+
+    def __init__(self, lock_ttl=COALESCE_LOCK_TTL, result_ttl=COALESCE_RESULT_TTL):
+        self.lock_ttl = lock_ttl
+        self.result_ttl = result_ttl
+        self._inflight = {}
+        self._loop = None
+
+    def _flights(self) -> dict:
+        # Futures belong to one event loop (Celery tasks run their own)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._inflight = {}
+            self._loop = loop
+        return self._inflight
+
+    async def run(
+        self, key: str, fn: Callable[[], Awaitable[QueryResult]]
+    ) -> tuple[QueryResult, bool]:
+        """Run `fn` once for all concurrent callers with the same key.
+
+        Args:
+            key (str): The coalescing key (see `coalesce_key`).
+            fn (Callable): Produces the result when this caller leads.
+
+        Returns:
+            tuple[QueryResult, bool]: The result and whether this caller ran
+                `fn` itself (followers get a copy).
+        """
+        if not COALESCE_ENABLED:
+            return await fn(), True
+
+        flights = self._flights()
+        future = flights.get(key)
+        if future is not None:
+            try:
+                result = await asyncio.shield(future)
+                coalesced_requests.labels(scope="local").inc()
+                # A fresh model: the cursor of a streamed result stays with the leader
+                return QueryResult(**result.model_dump()), False
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            except Exception as e:
+                logger.warning(f"Coalesced execution failed, running again: {e}")
+            return await fn(), True
+
+        future = asyncio.get_running_loop().create_future()
+        # Followers may all be gone when the leader fails
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        flights[key] = future
+        try:
+            result, leader = await self._run_cluster(key, fn)
+            future.set_result(result)
+            return result, leader
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            flights.pop(key, None)
+
+    async def _run_cluster(
+        self, key: str, fn: Callable[[], Awaitable[QueryResult]]
+    ) -> tuple[QueryResult, bool]:
+        """Elect one replica per key through Redis and share its result."""
+        token = uuid.uuid4().hex
+        try:
+            leader = await get_async_redis().set(
+                f"{LOCK_PREFIX}{key}", token, nx=True, ex=self.lock_ttl
+            )
+        except Exception as e:
+            logger.error(f"Coalescing lock unavailable, running locally: {e}")
+            return await fn(), True
+
+        if leader:
+            return await self._lead(key, token, fn), True
+
+        result = await self._follow(key)
+        if result is None:
+            return await fn(), True
+        coalesced_requests.labels(scope="cluster").inc()
+        return result, False
+
+    async def _lead(self, key, token, fn) -> QueryResult:
+        client = get_async_redis()
+        outcome = "failed"
+        try:
+            result = await fn()
+            # The rows of a streamed result stay on this replica's cursor
+            await client.set(
+                f"{RESULT_PREFIX}{key}", result.model_dump_json(), ex=self.result_ttl
+            )
+            outcome = "done"
+            return result
+        finally:
+            try:
+                await client.publish(f"{CHANNEL_PREFIX}{key}", outcome)
+                if await client.get(f"{LOCK_PREFIX}{key}") == token:
+                    await client.delete(f"{LOCK_PREFIX}{key}")
+            except Exception as e:
+                logger.error(f"Error releasing coalescing lock: {e}")
+
+    async def _follow(self, key) -> Optional[QueryResult]:
+        """Wait for the replica holding the lock; None if it fails or times out."""
+        client = get_async_redis()
+        pubsub = client.pubsub()
+        try:
+            # Subscribe before checking, so a result published in between is seen
+            await pubsub.subscribe(f"{CHANNEL_PREFIX}{key}")
+            data = await client.get(f"{RESULT_PREFIX}{key}")
+            if data is None and await client.exists(f"{LOCK_PREFIX}{key}"):
+
+                async def finished():
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            return
+
+                await asyncio.wait_for(finished(), self.lock_ttl)
+                data = await client.get(f"{RESULT_PREFIX}{key}")
+            return QueryResult.model_validate_json(data) if data else None
+        except Exception as e:
+            logger.warning(f"Waiting for a coalesced result failed: {e}")
+            return None
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+
+
+coalescer = Coalescer()
@@ -43,7 +43,7 @@ db_info = """### Database Structure:
     | 10      | 6           | 300        | 2021-01-01 |
 
     ### Key Points:
-    - **Relationships**: One-to-many between `employee` and `product_sales` via `employee_id`.
+    - **Relationships**: One-to-many between `employee` and `sales` via `employee_id`.
     - **Indexes**: Likely primary keys on `employee_id` and `sale_id`.
 
     ### Example Query:
@@ -51,7 +51,7 @@ db_info = """### Database Structure:
     ```sql
     SELECT e.full_name, SUM(p.units_sold) AS total_sales_units
     FROM employee e
-    JOIN product_sales p ON e.employee_id = p.employee_id
+    JOIN sales p ON e.employee_id = p.employee_id
     GROUP BY e.employee_id;
     ```
    
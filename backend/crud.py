@@ -9,55 +9,85 @@ current_dir_path = os.path.dirname(current_file_path)
 parent_dir_path = os.path.dirname(current_dir_path)
 # Add the parent directory path to the sys.path
 sys.path.insert(0, parent_dir_path)
-import json
-from decimal import Decimal  # ✅ Import Decimal
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+import base64
+import asyncio
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, or_
 from backend.models import User, Query
-from backend.schemas import UserCreate, QueryCreate
-from backend.auth import (
-    get_password_hash,
-    verify_password,
-    create_access_token,
-    password_context,
-)
-from backend.schemas import UserCreate, QueryCreate
+from backend.schemas import UserCreate, QueryResult, QueryPage
+from backend.auth import create_access_token
+from backend.schemas import QueryResponse
+from backend.result_store import load_result, prepare_blob, store_blobs, to_json
 from fastapi import HTTPException, status
-from pydantic import BaseModel, EmailStr
-from backend.main import get_sql_query
+from pydantic import EmailStr
+from backend.services import services
+from backend.mq import send_event
+from backend.principal_cache import principal_cache
+from backend.password_hashing import HashingOverloaded, password_hasher
 from backend.log import logger
 
+# Default and largest number of history entries per page
+QUERY_HISTORY_PAGE_SIZE = int(os.getenv("QUERY_HISTORY_PAGE_SIZE", "50"))
+QUERY_HISTORY_MAX_PAGE_SIZE = int(os.getenv("QUERY_HISTORY_MAX_PAGE_SIZE", "200"))
 
-def create_user(user: UserCreate, db: Session) -> User:
+
+def load_text_to_sql():
+    # DSPy, LiteLLM and Chroma are imported with the agents, not with the API
+    from backend.main import agent_pool, get_sql_query
+
+    agent_pool.warm_up()
+    return get_sql_query
+
+
+services.register("text_to_sql", load_text_to_sql)
+
+
+def overloaded(error: HashingOverloaded) -> HTTPException:
+    logger.warning(f"Rejecting password check: {error}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many logins in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def create_user(user: UserCreate, db: AsyncSession) -> User:
     """Create a new user.
 
     Args:
         user (UserCreate): The user data.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
         User: The created user.
     """
     try:
-        hashed_password = get_password_hash(user.password)
+        # bcrypt is CPU bound, it runs on the dedicated hashing processes
+        hashed_password = await password_hasher.hash(user.password)
         db_user = User(
             username=user.username, email=user.email, hashed_password=hashed_password
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         logger.info(f"User created: {user.username}")
+        await principal_cache.invalidate(db_user.id)
+        send_event({"type": "user_registered", "user_id": db_user.id})
         return db_user
+    except HashingOverloaded as e:
+        raise overloaded(e)
     except Exception as e:
         logger.error(f"Error creating user: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-def authenticate_user(db: Session, email: EmailStr, password: str) -> User:
+async def authenticate_user(db: AsyncSession, email: EmailStr, password: str) -> User:
     """Authenticate a user.
 
     Args:
-        db (Session): The database session.
+        db (AsyncSession): The database session.
         email (EmailStr): The user email.
         password (str): The password.
 
@@ -65,20 +95,32 @@ def authenticate_user(db: Session, email: EmailStr, password: str) -> User:
         User: The authenticated user.
     """
     try:
-        user = db.query(User).filter(User.email == email).first()
-        if not user or not verify_password(password, user.hashed_password):
+        result = await db.execute(select(User).where(User.email == email))
+        user = result.scalars().first()
+        if not user:
+            return None
+        valid, new_hash = await password_hasher.verify(password, user.hashed_password)
+        if not valid:
             return None
+        if new_hash is not None:
+            # Upgrade to the current scheme and cost while the password is known
+            user.hashed_password = new_hash
+            await db.commit()
+            await principal_cache.invalidate(user.id)
+            logger.info(f"Password hash of user {user.id} upgraded")
         return user
+    except HashingOverloaded as e:
+        raise overloaded(e)
     except Exception as e:
         logger.error(f"Error authenticating user: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-def login_user(db: Session, email: EmailStr, password: str) -> dict:
+async def login_user(db: AsyncSession, email: EmailStr, password: str) -> dict:
     """Login a user.
 
     Args:
-        db (Session): The database session.
+        db (AsyncSession): The database session.
         email (EmailStr): The user email.
         password (str): The password.
 
@@ -86,7 +128,7 @@ def login_user(db: Session, email: EmailStr, password: str) -> dict:
         dict: The access token and token type.
     """
     try:
-        user = authenticate_user(db, email, password)
+        user = await authenticate_user(db, email, password)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -95,24 +137,28 @@ def login_user(db: Session, email: EmailStr, password: str) -> dict:
         access_token = create_access_token({"sub": str(user.id)})
         logger.info(f"User email logged in: {email}")
         return {"access_token": access_token, "token_type": "bearer"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error logging in user: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-def store_query_result(
-    user, query_text: str, analysis_result: dict | list, db: Session
-) -> Query:
+async def store_query_result(
+    user, query_text: str, analysis_result: dict | list, db: AsyncSession
+) -> QueryResponse:
     """Store a query result in the database.
 
+    The result itself goes to the compressed, deduplicated result store.
+
     Args:
         user (User | int): The User object or user ID.
         query_text (str): The executed SQL query.
         analysis_result (dict | list): The analysis result (converted to JSON).
-        db (Session): The database session.
+        db (AsyncSession): The database session.
 
     Returns:
-        Query: The stored query object.
+        QueryResponse: The stored query with its result.
     """
     try:
         # ✅ Extract user ID if a User object is provided
@@ -121,69 +167,167 @@ def store_query_result(
         if not isinstance(user_id, int):
             raise ValueError(f"Invalid user_id: {user_id}")
 
-        # ✅ Convert analysis_result to JSON
-        analysis_result_json = json.dumps(analysis_result)
+        # ✅ Convert analysis_result to JSON, then hash and compress it
+        analysis_result_json = to_json(analysis_result)
+        blob = await asyncio.to_thread(prepare_blob, analysis_result_json)
+        await store_blobs(db, [blob])
 
         db_query = Query(
             user_id=user_id,
             query_text=query_text,
-            analysis_result=analysis_result_json,  # ✅ Store JSON string
+            result_digest=blob["digest"],  # ✅ Reference the stored result
         )
 
         db.add(db_query)
-        db.commit()
-        db.refresh(db_query)
+        await db.commit()
+        await db.refresh(db_query)
 
         logger.info(f"Query successfully stored for user {user_id}")
-        return db_query
+        return QueryResponse.model_validate(db_query).model_copy(
+            update={"analysis_result": analysis_result_json}
+        )
 
     except Exception as e:
         logger.error(f"Error storing query result: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 
-def get_user_queries(user_id: int, db: Session) -> list[Query]:
-    """Get all queries for a user.
+def encode_cursor(created_at: datetime, query_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{query_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, query_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(query_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def get_user_queries(
+    user_id: int,
+    db: AsyncSession,
+    limit: int = QUERY_HISTORY_PAGE_SIZE,
+    cursor: Optional[str] = None,
+) -> QueryPage:
+    """Get one page of a user's queries, newest first, without their results.
+
+    Pages are keyset-paginated on `(user_id, created_at, id)`, which the
+    `ix_queries_user_created_id` index serves, so every page costs the same
+    however long the history is.
 
     Args:
         user_id (int): The user ID.
-        db (Session): The database session.
+        db (AsyncSession): The database session.
+        limit (int): The page size, capped at QUERY_HISTORY_MAX_PAGE_SIZE.
+        cursor (Optional[str]): The `next_cursor` of the previous page.
 
     Returns:
-        list[Query]: The list of queries.
+        QueryPage: The queries and the cursor of the next page, if any.
     """
+    limit = max(1, min(limit, QUERY_HISTORY_MAX_PAGE_SIZE))
+    statement = select(
+        Query.id, Query.user_id, Query.query_text, Query.created_at
+    ).where(Query.user_id == user_id)
+    if cursor:
+        created_at, query_id = decode_cursor(cursor)
+        statement = statement.where(
+            or_(
+                Query.created_at < created_at,
+                and_(Query.created_at == created_at, Query.id < query_id),
+            )
+        )
+    statement = statement.order_by(Query.created_at.desc(), Query.id.desc())
+
     try:
-        queries = db.query(Query).filter(Query.user_id == user_id).all()
-        logger.info(f"Queries fetched for user {user_id}")
-        return queries
+        # One extra row tells whether there is a next page
+        rows = (await db.execute(statement.limit(limit + 1))).all()
     except Exception as e:
         logger.error(f"Error fetching user queries: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    logger.info(f"Queries fetched for user {user_id}")
+    return QueryPage(items=[row._asdict() for row in items], next_cursor=next_cursor)
 
-async def execute_sql(query: str, db: Session):
-    try:
-        # Await the result of the asynchronous get_sql function
-        result = await get_sql_query(query)  # Await here
 
-        # The generated SQL is wrapped in a list, so we need to extract the query
-        result_sql = str(result["sql"][0])  # Extract the first item from the list
+async def get_user_query(
+    user_id: int, query_id: int, db: AsyncSession
+) -> QueryResponse:
+    """Get one query of a user together with its result.
 
-        logger.debug(f"Executing query: {result_sql}")
+    The result is decompressed from the result store; queries stored before
+    it existed keep their result inline.
+
+    Args:
+        user_id (int): The user ID.
+        query_id (int): The query ID.
+        db (AsyncSession): The database session.
 
-        result = db.execute(text(result_sql))
-        logger.debug(f"Query result: {result}")
+    Returns:
+        QueryResponse: The query and its JSON result.
 
-        # Fetch all rows from the result and convert them into a list of dictionaries
-        columns = result.keys()
-        rows = [dict(zip(columns, row)) for row in result.fetchall()]
+    Raises:
+        HTTPException: 404 if the user has no such query.
+    """
+    result = await db.execute(
+        select(Query).where(Query.id == query_id, Query.user_id == user_id)
+    )
+    query = result.scalar_one_or_none()
+    if query is None:
+        raise HTTPException(status_code=404, detail="Query not found")
+    response = QueryResponse.model_validate(query)
+    if query.result_digest is not None:
+        analysis_result = await load_result(db, query.result_digest)
+        response = response.model_copy(update={"analysis_result": analysis_result})
+    return response
+
+
+async def execute_sql(
+    query: str,
+    db: Optional[AsyncSession] = None,
+    stream: bool = False,
+    on_event=None,
+) -> QueryResult:
+    """Generate SQL for a question and execute it once.
 
-        # Convert Decimal to float for easier handling in JavaScript
-        for row in rows:
-            row["total_sales_units"] = float(row["total_sales_units"])
+    Args:
+        query (str): The natural language question.
+        db (Optional[AsyncSession]): A read-only session (`ReadOnlySessionLocal`)
+            the generated SQL runs on; one is opened per attempt if omitted.
+        stream (bool): Keep the result on a server-side cursor and only fetch
+            the first chunk; the caller must consume or close the result.
+        on_event (Optional[Callable]): Async callback receiving the progress
+            events of the pipeline as `(event, data)`.
 
-        logger.debug(f"Rows: {rows}")
-        return rows
+    Returns:
+        QueryResult: The validated SQL together with its columns and rows.
+    """
+    try:
+        get_sql_query = await services.aget("text_to_sql")
+        result = await get_sql_query(query, db, stream, on_event)
+        if result.sql is None:
+            raise ValueError(result.error or "Could not generate a valid SQL query")
+
+        logger.debug(f"Executed query: {result.sql} ({result.row_count} rows)")
+        send_event(
+            {
+                "type": "query_executed",
+                "sql": result.sql,
+                "rows": result.row_count,
+                "attempts": len(result.attempts),
+                "cached": result.cached,
+            }
+        )
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error: {e}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -14,10 +14,10 @@ sys.path.insert(0, parent_dir_path)
 from fastapi import HTTPException  # Add this import in database.py
 from fastapi import Depends
 from sqlalchemy.orm import Session
-import pymongo
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -25,6 +25,7 @@ from jose import JWTError, jwt
 from sqlalchemy.sql import text  # Add this import
 from dotenv import load_dotenv
 from backend.log import logger
+from backend.services import services
 
 # Load environment variables from .env file
 load_dotenv()
@@ -35,36 +36,92 @@ mysql_user = os.getenv("mysql_user", "root")
 mysql_password = os.getenv("mysql_password", "")
 mysql_database = os.getenv("mysql_database", "chatbot")
 
+# Connection pool settings shared by the sync and async engines
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Statement timeout of the read-only sessions that run generated SQL (0 = none)
+SQL_GUARD_TIMEOUT_MS = int(os.getenv("SQL_GUARD_TIMEOUT_MS", "30000"))
+
 mongo_host = os.getenv("mongo_host", "localhost")  # Default to localhost
 mongo_port = os.getenv("mongo_port", "27017")  # Default MongoDB port
 mongo_database = os.getenv("mongo_database", "chatbot_db")  # Default
 
 
+def create_mongo_client():
+    import pymongo
+
+    client = pymongo.MongoClient(f"mongodb://{mongo_host}:{mongo_port}")
+    logger.info("MongoDB connection established")
+    return client
+
+
+services.register("mongo_client", create_mongo_client)
+
+
 # database URL
 DATABASE_URL = f"mysql+pymysql://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_database}"
+ASYNC_DATABASE_URL = f"mysql+aiomysql://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_database}"
+
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
 
 
 # SQLAlchemy setup
 Base = declarative_base()
 
 # Create a MySQL engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **pool_options)
 
 # Create sessionmaker
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the request handlers so slow queries don't block the loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+# Separate pool for LLM-generated SQL, its connections can never write
+readonly_async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options)
+
+
+@event.listens_for(readonly_async_engine.sync_engine, "connect")
+def set_read_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("SET SESSION TRANSACTION READ ONLY")
+    # Backstop for statements that can't carry a MAX_EXECUTION_TIME hint
+    cursor.execute(f"SET SESSION max_execution_time = {SQL_GUARD_TIMEOUT_MS}")
+    try:
+        # MySQL 8 caches table statistics for a day; the result cache needs the
+        # current information_schema.TABLES.UPDATE_TIME
+        cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+    except Exception:
+        pass  # MySQL 5.7 has no such cache
+    cursor.close()
+
+
+ReadOnlySessionLocal = async_sessionmaker(
+    bind=readonly_async_engine, autoflush=False, expire_on_commit=False
+)
+
 
 def get_mongo_db():
     """
     Get a MongoDB database connection.
     """
-    client = pymongo.MongoClient(f"mongodb://{mongo_host}:{mongo_port}")
-    db = client[mongo_database]
-    logger.info("MongoDB connection established")
-    try:
-        yield db
-    finally:
-        client.close()
+    # The client keeps its own connection pool, so it is shared
+    client = services.get("mongo_client")
+    yield client[mongo_database]
 
 
 def init_db():
@@ -73,6 +130,30 @@ def init_db():
     """
     # Create all tables
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+    # create_all skips existing tables, so indexes added later are created here
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def upgrade_schema():
+    """
+    Apply the column changes that create_all can't make to existing tables.
+    """
+    columns = {column["name"] for column in inspect(engine).get_columns("queries")}
+    if "result_digest" not in columns:
+        # Query results moved to the compressed `result_blobs` store
+        with engine.begin() as connection:
+            connection.execute(
+                text(
+                    "ALTER TABLE queries "
+                    "ADD COLUMN result_digest VARCHAR(64) NULL, "
+                    "MODIFY analysis_result TEXT NULL, "
+                    "ADD FOREIGN KEY (result_digest) REFERENCES result_blobs (digest)"
+                )
+            )
+        logger.info("Added queries.result_digest")
 
 
 def get_db():
@@ -86,6 +167,14 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    Get an async SQLAlchemy session.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def test_db_connection(db: Session):
     try:
         db.execute(text("SELECT 1"))  # Explicitly use text()
@@ -0,0 +1,307 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import json
+import uuid
+import asyncio
+from datetime import datetime
+from collections import deque
+from sqlalchemy import exc, insert
+from prometheus_client import Counter, Gauge
+from dotenv import load_dotenv
+from backend.cache import get_async_redis
+from backend.database import AsyncSessionLocal
+from backend.models import Query
+from backend.result_store import prepare_blob, store_blobs, to_json
+from backend.log import logger
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# History records written by one multi-row INSERT
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+# Longest time (seconds) a history record waits before it is flushed
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+# Records kept in memory while the Redis spool is unavailable
+HISTORY_MAX_BUFFERED = int(os.getenv("HISTORY_MAX_BUFFERED", "10000"))
+# Failed flushes of a batch before its failing records move to the dead letters
+HISTORY_MAX_ATTEMPTS = int(os.getenv("HISTORY_MAX_ATTEMPTS", "5"))
+
+SPOOL_KEY = "history:spool"
+LOCK_KEY = "history:flush-lock"
+ATTEMPTS_KEY = "history:flush-attempts"
+DEAD_LETTER_KEY = "history:dead-letter"
+LOCK_TIMEOUT = 30
+
+history_flush_lag = Gauge(
+    "history_flush_lag_seconds", "Age of the oldest query history record not flushed"
+)
+history_records_flushed = Counter(
+    "history_records_flushed_total", "Query history records written to MySQL"
+)
+history_records_dropped = Counter(
+    "history_records_dropped_total", "Query history records lost before flushing"
+)
+history_records_dead_lettered = Counter(
+    "history_records_dead_lettered_total",
+    "Query history records MySQL kept rejecting, moved to the dead letters",
+)
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed INSERT may succeed unchanged later (MySQL unreachable)."""
+    if isinstance(error, exc.DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(
+        error, (exc.OperationalError, exc.InterfaceError, OSError, TimeoutError)
+    )
+
+
+class HistoryWriter:
+    """
+    Write-behind persistence of the query history.
+
+    Requests only spool a serialized record to a Redis list, which survives
+    restarts of the API and is shared by its replicas. A background task
+    (one replica at a time, guarded by a Redis lock) moves the spool into
+    MySQL with multi-row INSERTs, when a batch is full or every
+    HISTORY_FLUSH_INTERVAL seconds. A crash between the INSERT and the
+    trim of the spool writes that batch twice rather than losing it.
+
+    A batch that MySQL rejects HISTORY_MAX_ATTEMPTS times for another reason
+    than being unreachable is written record by record, and the records that
+    still fail move to the DEAD_LETTER_KEY list, so they don't block the spool.
+    """
+
+    def __init__(
+        self, batch_size=HISTORY_BATCH_SIZE, flush_interval=HISTORY_FLUSH_INTERVAL
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Records that could not be spooled (Redis down), flushed from memory
+        self._buffer = deque()
+        self._buffer_attempts = 0
+        self._task = None
+        self._wake = None
+
+    @staticmethod
+    def record(user, query_text: str, analysis_result) -> str:
+        # Extract user ID if a User object is provided
+        user_id = user.id if hasattr(user, "id") else user
+        if not isinstance(user_id, int):
+            raise ValueError(f"Invalid user_id: {user_id}")
+        return json.dumps(
+            {
+                "user_id": user_id,
+                "query_text": query_text,
+                "analysis_result": to_json(analysis_result),
+                "created_at": datetime.utcnow().isoformat(),
+            }
+        )
+
+    def _buffer_record(self, record: str) -> int:
+        if len(self._buffer) >= HISTORY_MAX_BUFFERED:
+            self._buffer.popleft()
+            history_records_dropped.inc()
+        self._buffer.append(record)
+        return len(self._buffer)
+
+    async def enqueue(self, user, query_text: str, analysis_result) -> None:
+        """Queue a query result for the history.
+
+        Serializing happens off the event loop; the record is written to
+        MySQL by the background flush.
+
+        Args:
+            user (User | int): The User object or user ID.
+            query_text (str): The question or SQL that was executed.
+            analysis_result (dict | list): The result (converted to JSON).
+        """
+        try:
+            record = await asyncio.to_thread(
+                self.record, user, query_text, analysis_result
+            )
+        except Exception as e:
+            logger.error(f"Error queueing query history: {e}")
+            return
+        try:
+            pending = await self._spool(record)
+        except Exception as e:
+            logger.error(f"History spool unavailable, buffering in memory: {e}")
+            pending = self._buffer_record(record)
+        if pending >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    async def _spool(self, record: str) -> int:
+        """Append a record to the spool, after the ones buffered in memory."""
+        buffered = list(self._buffer)
+        pending = await get_async_redis().rpush(SPOOL_KEY, *buffered, record)
+        if buffered:
+            # Redis is back: the spool takes over the records kept in memory
+            for _ in buffered:
+                self._buffer.popleft()
+            logger.info(f"Moved {len(buffered)} buffered history records to Redis")
+        return pending
+
+    async def isolate(self, batch: list) -> tuple[int, list]:
+        """Write the records of a failing batch one by one.
+
+        Returns:
+            tuple: The number of records written and the ones MySQL rejected.
+
+        Raises:
+            Exception: If MySQL becomes unreachable (see `is_transient`).
+        """
+        written, rejected = 0, []
+        for record in batch:
+            try:
+                await self.insert([record])
+                written += 1
+            except Exception as e:
+                if is_transient(e):
+                    raise
+                logger.error(f"Query history record rejected: {e}")
+                rejected.append(record)
+        return written, rejected
+
+    async def dead_letter(self, records: list) -> None:
+        if not records:
+            return
+        history_records_dead_lettered.inc(len(records))
+        try:
+            await get_async_redis().rpush(DEAD_LETTER_KEY, *records)
+        except Exception as e:
+            history_records_dropped.inc(len(records))
+            logger.error(f"Dropped {len(records)} rejected history records: {e}")
+
+    async def flush(self) -> int:
+        """Write the spooled records to MySQL.
+
+        Returns:
+            int: The number of records written.
+        """
+        written = 0
+        while self._buffer:
+            count = min(len(self._buffer), self.batch_size)
+            batch = [self._buffer.popleft() for _ in range(count)]
+            try:
+                await self.insert(batch)
+                written += len(batch)
+            except Exception as e:
+                if not is_transient(e):
+                    self._buffer_attempts += 1
+                if self._buffer_attempts < HISTORY_MAX_ATTEMPTS:
+                    self._buffer.extendleft(reversed(batch))
+                    raise
+                inserted, rejected = await self.isolate(batch)
+                await self.dead_letter(rejected)
+                written += inserted
+            self._buffer_attempts = 0
+
+        client = get_async_redis()
+        token = uuid.uuid4().hex
+        if not await client.set(LOCK_KEY, token, nx=True, ex=LOCK_TIMEOUT):
+            return written  # Another replica is flushing
+        try:
+            while True:
+                batch = await client.lrange(SPOOL_KEY, 0, self.batch_size - 1)
+                if not batch:
+                    break
+                try:
+                    await self.insert(batch)
+                    written += len(batch)
+                except Exception as e:
+                    # The attempts are shared by the replicas flushing the spool
+                    if is_transient(e) or (
+                        await client.incr(ATTEMPTS_KEY) < HISTORY_MAX_ATTEMPTS
+                    ):
+                        raise
+                    inserted, rejected = await self.isolate(batch)
+                    await self.dead_letter(rejected)
+                    written += inserted
+                # Only trimmed once the INSERT committed
+                await client.ltrim(SPOOL_KEY, len(batch), -1)
+                await client.delete(ATTEMPTS_KEY)
+                await client.expire(LOCK_KEY, LOCK_TIMEOUT)
+                if len(batch) < self.batch_size:
+                    break
+            history_flush_lag.set(await self.lag())
+        finally:
+            if await client.get(LOCK_KEY) == token:
+                await client.delete(LOCK_KEY)
+        return written
+
+    @staticmethod
+    async def lag() -> float:
+        oldest = await get_async_redis().lindex(SPOOL_KEY, 0)
+        if oldest is None:
+            return 0.0
+        created_at = datetime.fromisoformat(json.loads(oldest)["created_at"])
+        return max((datetime.utcnow() - created_at).total_seconds(), 0.0)
+
+    async def insert(self, batch: list) -> None:
+        """Write records with one multi-row INSERT per batch.
+
+        The results go to the compressed, deduplicated result store and the
+        history rows only reference them.
+        """
+        rows = []
+        for item in batch:
+            row = json.loads(item)
+            row["created_at"] = datetime.fromisoformat(row["created_at"])
+            rows.append(row)
+        history_flush_lag.set(
+            (datetime.utcnow() - rows[0]["created_at"]).total_seconds()
+        )
+        blobs = await asyncio.to_thread(
+            lambda: [prepare_blob(row.pop("analysis_result")) for row in rows]
+        )
+        for row, blob in zip(rows, blobs):
+            row["result_digest"] = blob["digest"]
+        async with AsyncSessionLocal() as db:
+            await store_blobs(db, blobs)
+            await db.execute(insert(Query).values(rows))
+            await db.commit()
+        history_records_flushed.inc(len(rows))
+        logger.debug(f"Flushed {len(rows)} query history records")
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing query history: {e}")
+
+    def start(self) -> None:
+        """Start the background flush on the running event loop."""
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop the background flush and write what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing query history on shutdown: {e}")
+
+
+history_writer = HistoryWriter()
@@ -0,0 +1,146 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import json
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Optional
+from dotenv import load_dotenv
+from backend.cache import get_async_redis, json_default
+from backend.schemas import JobStatus
+from backend.log import logger
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Seconds a finished job (and its result) stays available for polling
+JOB_TTL = int(os.getenv("JOB_TTL", "3600"))
+
+JOB_PREFIX = "job:"
+CHANNEL_PREFIX = "job-events:"
+FINISHED = ("succeeded", "failed")
+
+
+def job_key(job_id: str) -> str:
+    return f"{JOB_PREFIX}{job_id}"
+
+
+def job_channel(job_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{job_id}"
+
+
+async def create_job(user_id: int, query: str) -> JobStatus:
+    """Register a new text-to-SQL job before it is handed to a worker.
+
+    Args:
+        user_id (int): The user who submitted the question.
+        query (str): The natural language question.
+
+    Returns:
+        JobStatus: The queued job.
+    """
+    now = datetime.utcnow()
+    job = JobStatus(
+        job_id=uuid.uuid4().hex,
+        user_id=user_id,
+        query=query,
+        status="queued",
+        created_at=now,
+        updated_at=now,
+    )
+    await get_async_redis().set(job_key(job.job_id), job.model_dump_json(), ex=JOB_TTL)
+    return job
+
+
+async def get_job(job_id: str) -> Optional[JobStatus]:
+    """Read the current state of a job.
+
+    Args:
+        job_id (str): The job ID.
+
+    Returns:
+        Optional[JobStatus]: The job, or None if it is unknown or expired.
+    """
+    data = await get_async_redis().get(job_key(job_id))
+    return JobStatus.model_validate_json(data) if data else None
+
+
+async def publish_event(job_id: str, event: str, data: Optional[dict] = None) -> None:
+    """Update a job and push the event to its subscribers.
+
+    Events named like a job status ("running", "succeeded", "failed") change
+    the status; every other event (e.g. "sql_generated", "retry") is progress.
+
+    Args:
+        job_id (str): The job ID.
+        event (str): The event name.
+        data (Optional[dict]): The event payload.
+    """
+    data = data or {}
+    try:
+        job = await get_job(job_id)
+        if job is None:
+            logger.warning(f"Event {event} for unknown job {job_id}")
+            return
+        job.updated_at = datetime.utcnow()
+        if event in ("running",) + FINISHED:
+            job.status = event
+        if event == "succeeded":
+            job.result = data
+        elif event == "failed":
+            job.error = data.get("error")
+        else:
+            job.stage = event
+        client = get_async_redis()
+        await client.set(job_key(job_id), job.model_dump_json(), ex=JOB_TTL)
+
+        message = {"job_id": job_id, "event": event, "status": job.status, **data}
+        await client.publish(
+            job_channel(job_id), json.dumps(message, default=json_default)
+        )
+    except Exception as e:
+        logger.error(f"Error publishing job event: {e}")
+
+
+async def subscribe(job_id: str) -> AsyncIterator[dict]:
+    """Yield the events of a job until it finishes.
+
+    The current state is sent first, so a subscriber that connects after the
+    job finished still gets the result.
+
+    Args:
+        job_id (str): The job ID.
+
+    Yields:
+        dict: The job events.
+    """
+    pubsub = get_async_redis().pubsub()
+    try:
+        # Subscribe before reading the state so no event is lost in between
+        await pubsub.subscribe(job_channel(job_id))
+        job = await get_job(job_id)
+        if job is None:
+            return
+        yield {"job_id": job_id, "event": "status", **job.model_dump(mode="json")}
+        if job.status in FINISHED:
+            return
+
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            event = json.loads(message["data"])
+            yield event
+            if event["status"] in FINISHED:
+                return
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
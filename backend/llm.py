@@ -11,6 +11,8 @@ parent_dir_path = os.path.dirname(current_dir_path)
 sys.path.insert(0, parent_dir_path)
 from fastapi import APIRouter
 import groq
+import httpx
+import random
 import asyncio
 from dotenv import load_dotenv
 from backend.log import logger
@@ -24,23 +26,202 @@ router = APIRouter()
 model = os.getenv("GROQ_MODEL", "llama3-8b-8192")
 api_key = os.getenv("GROQ_API_KEY")
 
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "8"))
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "20"))
+GROQ_KEEPALIVE_CONNECTIONS = int(os.getenv("GROQ_KEEPALIVE_CONNECTIONS", "10"))
+GROQ_KEEPALIVE_EXPIRY = float(os.getenv("GROQ_KEEPALIVE_EXPIRY", "30"))
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "5"))
+GROQ_BACKOFF_BASE = float(os.getenv("GROQ_BACKOFF_BASE", "1"))
+GROQ_BACKOFF_MAX = float(os.getenv("GROQ_BACKOFF_MAX", "60"))
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    return random.uniform(0, min(GROQ_BACKOFF_MAX, GROQ_BACKOFF_BASE * 2**attempt))
+
+
+class LLMClient:
+    """
+    Shared async Groq client with keep-alive pooling, a concurrency limit and
+    non-blocking retries on rate limits.
+
+    The HTTP pool and the semaphore belong to the event loop that created them,
+    so they are rebuilt when the client is used from a different loop (e.g. a
+    Celery task running `asyncio.run`).
+    """
+
+    def __init__(self, max_concurrency=GROQ_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    def _ensure_client(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=GROQ_MAX_CONNECTIONS,
+                    max_keepalive_connections=GROQ_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=GROQ_KEEPALIVE_EXPIRY,
+                ),
+                timeout=GROQ_TIMEOUT,
+            )
+            # Retries are handled here so that backoff never blocks the loop
+            self._client = groq.AsyncGroq(
+                api_key=api_key, http_client=http_client, max_retries=0
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client
+
+    async def chat(self, messages, model=model, temperature=0.1, max_tokens=256):
+        """
+        Run a chat completion, retrying rate-limited calls with jittered backoff.
+
+        Args:
+            messages (list): The chat messages.
+            model (str): The Groq model name (a litellm "groq/" prefix is accepted).
+            temperature (float): The sampling temperature.
+            max_tokens (int): The completion token limit.
+
+        Returns:
+            str: The stripped completion text, or None if there was no choice.
+        """
+        client = self._ensure_client()
+        model = model.removeprefix("groq/")
+        for attempt in range(GROQ_MAX_RETRIES + 1):
+            try:
+                async with self._semaphore:
+                    response = await client.chat.completions.create(
+                        model=model,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        messages=messages,
+                    )
+                if response.choices:
+                    return response.choices[0].message.content.strip()
+                return None
+            except groq.RateLimitError:
+                if attempt == GROQ_MAX_RETRIES:
+                    logger.error("Max retries reached, aborting.")
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"Rate limit exceeded, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def chat_sync(self, messages, **kwargs):
+        """
+        Run `chat` from a worker thread (e.g. a synchronous DSPy call).
+
+        The call is scheduled on the loop that owns the pool, so it shares the
+        connections and the concurrency limit with the async callers; a new
+        loop is only used when no loop owns the client yet.
+
+        Args:
+            messages (list): The chat messages.
+            **kwargs: The `chat` options.
+
+        Returns:
+            str: The stripped completion text, or None if there was no choice.
+        """
+        loop = self._loop
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is loop:
+                raise RuntimeError("chat_sync would block the event loop, await chat")
+            future = asyncio.run_coroutine_threadsafe(
+                self.chat(messages, **kwargs), loop
+            )
+            return future.result()
+        return asyncio.run(self.chat(messages, **kwargs))
+
+    async def astream(self, messages, model=model, temperature=0.1, max_tokens=256):
+        """
+        Stream a chat completion token by token.
+
+        Rate limits are retried with jittered backoff until the first token
+        arrives; closing the generator early cancels the upstream request.
+
+        Args:
+            messages (list): The chat messages.
+            model (str): The Groq model name (a litellm "groq/" prefix is accepted).
+            temperature (float): The sampling temperature.
+            max_tokens (int): The completion token limit.
+
+        Yields:
+            str: The content deltas, in order.
+        """
+        client = self._ensure_client()
+        model = model.removeprefix("groq/")
+        for attempt in range(GROQ_MAX_RETRIES + 1):
+            try:
+                async with self._semaphore:
+                    stream = await client.chat.completions.create(
+                        model=model,
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        messages=messages,
+                        stream=True,
+                    )
+                    try:
+                        async for chunk in stream:
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                yield chunk.choices[0].delta.content
+                    finally:
+                        await stream.close()
+                return
+            except groq.RateLimitError:
+                if attempt == GROQ_MAX_RETRIES:
+                    logger.error("Max retries reached, aborting.")
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"Rate limit exceeded, retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+llm_client = LLMClient()
+
 
 async def groq_llm(prompt, temperature=0.1, max_tokens=256):
     """
     Generate a response using the Groq API asynchronously for better performance.
     """
     try:
-        client = groq.Client(api_key=api_key)
-        response = client.chat.completions.create(
-            model=model,
+        result = await llm_client.chat(
+            [{"role": "user", "content": prompt}],
             temperature=temperature,
             max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}],
         )
-        if response.choices:
-            result = response.choices[0].message.content.strip()
+        if result is not None:
             logger.info(f"Generated response: {result}")
-            return result
+        return result
     except Exception as e:
         logger.error(f"Unexpected error in Groq API call: {str(e)}")
         return None
+
+
+async def groq_llm_stream(prompt, temperature=0.1, max_tokens=256):
+    """
+    Stream a response from the Groq API token by token.
+    """
+    tokens = llm_client.astream(
+        [{"role": "user", "content": prompt}],
+        temperature=temperature,
+        max_tokens=max_tokens,
+    )
+    try:
+        async for token in tokens:
+            yield token
+    finally:
+        # Stops the upstream completion when the consumer goes away
+        await tokens.aclose()
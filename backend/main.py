@@ -11,50 +11,94 @@ parent_dir_path = os.path.dirname(current_dir_path)
 sys.path.insert(0, parent_dir_path)
 # Placeholder for main logic, can include background jobs, scheduled tasks, etc.
 import asyncio
-import time
 import os
-import json
-import pandas as pd
+import contextlib
+from types import SimpleNamespace
 import dspy
 import groq
-import litellm
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import text
-from sqlalchemy.ext.declarative import declarative_base
 from dotenv import load_dotenv
-from agents import SQLAgent, error_reasoning_agent, error_fix_agent
-from backend.database import SessionLocal
+from backend.agents import SQLAgent, error_reasoning_agent, error_fix_agent
+from backend.database import ReadOnlySessionLocal
+from backend.llm import llm_client
 from backend.log import logger
-from dotenv import load_dotenv
-from backend.config import db_info
+from backend.semantic_cache import semantic_cache
+from backend.schema_introspection import schema_introspector
+from backend.cache import (
+    get_cached_result,
+    set_cached_result,
+    referenced_tables,
+    table_update_times,
+)
+from backend.schemas import QueryResult
+from backend.result_encoding import STREAM_CHUNK_SIZE, column_types, convert_rows
+from backend.sql_validator import validate_sql
+from backend.sql_guard import query_guard
+from backend.coalesce import coalescer, coalesce_key
 
 # Load environment variables from .env file
 load_dotenv()
 
 
 class GroqLM(dspy.LM):
-    def __init__(self, model="groq/llama3-8b-8192", temperature=0.1):
+    """
+    DSPy LM answering through the shared, pooled `llm_client`, so predictor
+    calls share its connections, concurrency limit and rate-limit backoff.
+    """
+
+    def __init__(self, model="groq/llama3-8b-8192", temperature=0.1, max_tokens=1024):
         super().__init__(model=model)
         self.model = model
         self.temperature = temperature
+        self.max_tokens = max_tokens
         self.api_key = os.getenv("GROQ_API_KEY")
 
+    def _chat_arguments(self, prompt, messages, kwargs):
+        options = {**self.kwargs, **kwargs}
+        temperature = options.get("temperature")
+        max_tokens = options.get("max_tokens")
+        return {
+            "messages": messages or [{"role": "user", "content": prompt}],
+            "model": self.model,
+            "temperature": self.temperature if temperature is None else temperature,
+            "max_tokens": max_tokens or self.max_tokens,
+        }
+
+    def _completion(self, content):
+        # DSPy parses OpenAI-style chat completions
+        message = SimpleNamespace(content=content)
+        choice = SimpleNamespace(message=message, finish_reason="stop")
+        return SimpleNamespace(choices=[choice], usage={}, model=self.model)
+
+    def forward(self, prompt=None, messages=None, **kwargs):
+        """
+        Completes a synchronous DSPy call on the loop that owns `llm_client`.
+        """
+        arguments = self._chat_arguments(prompt, messages, kwargs)
+        return self._completion(llm_client.chat_sync(**arguments))
+
+    async def aforward(self, prompt=None, messages=None, **kwargs):
+        """
+        Completes an async DSPy call (`Predict.acall`) through `llm_client`.
+        """
+        arguments = self._chat_arguments(prompt, messages, kwargs)
+        return self._completion(await llm_client.chat(**arguments))
+
     async def generate(self, prompt, max_tokens=256):
         """
-        Generate a response using the Groq API asynchronously for better performance.
+        Generate a response through the shared, pooled Groq client.
         """
         try:
-            response = await asyncio.to_thread(
-                litellm.completion,
+            return await llm_client.chat(
+                [{"role": "user", "content": prompt}],
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                api_key=self.api_key,
                 temperature=self.temperature,
                 max_tokens=max_tokens,
             )
-            return response.choices[0].message.content.strip()
-        except litellm.BadRequestError as e:
+        except groq.RateLimitError as e:
+            logger.error(f"Rate limit error: {str(e)}")
+            return None
+        except groq.BadRequestError as e:
             logger.error(f"Bad request error: {str(e)}")
             return None
         except Exception as e:
@@ -62,8 +106,46 @@ class GroqLM(dspy.LM):
             return None
 
 
-# Update DSPy to use the async `GroqLM`
-dspy.configure(lm=GroqLM(model="groq/llama3-8b-8192"))
+# SQL candidates generated concurrently before the repair loop (0 = off)
+SQL_SPECULATIVE_CANDIDATES = int(os.getenv("SQL_SPECULATIVE_CANDIDATES", "0"))
+# Sampling temperature of each candidate, reused cyclically
+SQL_SPECULATIVE_TEMPERATURES = [
+    float(t)
+    for t in os.getenv("SQL_SPECULATIVE_TEMPERATURES", "0.0,0.5,0.9").split(",")
+]
+# Candidates executed against MySQL at the same time
+SQL_SPECULATIVE_MAX_PARALLEL = int(os.getenv("SQL_SPECULATIVE_MAX_PARALLEL", "2"))
+# Agents kept ready per process; more are built while all of them are in use
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "8"))
+# Optimized DSPy program saved with `AgentSystem.save` (optional)
+DSPY_PROGRAM_PATH = os.getenv("DSPY_PROGRAM_PATH")
+
+
+async def closing(result, session):
+    """
+    Wraps the remaining chunks of a streamed result so that the session that
+    owns its cursor is closed with it.
+    """
+    chunks = result._pending
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        await chunks.aclose()
+        await session.close()
+
+
+async def emit(on_event, event, **data):
+    """
+    Reports pipeline progress (e.g. "sql_generated", "retry") to an optional
+    async callback; a failing callback never breaks the pipeline.
+    """
+    if on_event is None:
+        return
+    try:
+        await on_event(event, data)
+    except Exception as e:
+        logger.warning(f"Progress callback failed for {event}: {e}")
 
 
 def clean_llm_response(text):
@@ -81,105 +163,451 @@ class AgentSystem(dspy.Module):
     Handles the full workflow of generating, executing, and debugging SQL queries.
     """
 
-    def __init__(self, dataset_information, max_retry=3):
+    def __init__(
+        self,
+        dataset_information,
+        max_retry=3,
+        schema_index=None,
+        candidates=SQL_SPECULATIVE_CANDIDATES,
+    ):
         self.max_retry = max_retry
+        self.candidates = candidates
         self.sql_agent = dspy.Predict(SQLAgent)
         self.error_reasoning_agent = dspy.Predict(error_reasoning_agent)
         self.error_fix_agent = dspy.ChainOfThought(error_fix_agent)
         self.dataset_information = dataset_information
+        # Column names per table, used to validate SQL before it reaches MySQL
+        self.schema_index = schema_index or {}
 
-    async def execute_query(self, sql_query, session):
+    async def execute_query(self, sql_query, session, stream=False):
         """
         Executes a SQL query safely, handling errors and transactions asynchronously.
+        The cost guard bounds the statement first and its decisions are reported
+        in the result.
         """
+        guarded = query_guard.prepare(sql_query)
+        # None when writes by other clients can't be ruled out: skip the cache
+        update_times = await table_update_times(session, referenced_tables(guarded.sql))
+        cached = None
+        if update_times is not None:
+            cached = await get_cached_result(guarded.sql, update_times)
+        if cached is not None:
+            return QueryResult(
+                sql=guarded.sql, cached=True, guard=guarded.decisions, **cached
+            )
+
+        guarded = await query_guard.admit(guarded, session)
+        if stream:
+            return await self.stream_query(guarded, session)
+
         try:
-            result = await asyncio.to_thread(session.execute, text(sql_query))
-            df = pd.DataFrame(result.fetchall(), columns=[col for col in result.keys()])
-            return df
+            result = await session.execute(text(guarded.executable_sql))
+            if not result.returns_rows:
+                return QueryResult(sql=guarded.sql, guard=guarded.decisions)
+            columns = list(result.keys())
+            types = column_types(result)
+            rows = convert_rows(result.fetchall(), types)
         except Exception as e:
             logger.error(f"Query execution failed: {e}")
             raise
-        finally:
-            session.close()
 
-    async def forward(self, query):
+        if update_times is not None:
+            await set_cached_result(
+                guarded.sql,
+                {"columns": columns, "column_types": types, "rows": rows},
+                update_times=update_times,
+            )
+        decisions = list(guarded.decisions)
+        notice = query_guard.truncation_notice(guarded, len(rows))
+        if notice:
+            decisions.append(notice)
+        return QueryResult(
+            sql=guarded.sql,
+            columns=columns,
+            column_types=types,
+            rows=rows,
+            guard=decisions,
+        )
+
+    async def stream_query(self, guarded, session):
+        """
+        Executes a guarded query on a server-side cursor and fetches only the
+        first chunk, so the SQL is validated without materialising the whole result.
+        """
+        try:
+            result = await session.stream(text(guarded.executable_sql))
+        except Exception as e:
+            logger.error(f"Query execution failed: {e}")
+            raise
+
+        try:
+            columns = list(result.keys())
+            types = column_types(result)
+            rows = convert_rows(await result.fetchmany(STREAM_CHUNK_SIZE), types)
+        except Exception as e:
+            logger.error(f"Query execution failed: {e}")
+            await result.close()
+            raise
+
+        query_result = QueryResult(
+            sql=guarded.sql,
+            columns=columns,
+            column_types=types,
+            rows=rows,
+            guard=guarded.decisions,
+        )
+        if len(rows) < STREAM_CHUNK_SIZE:
+            # Everything fit into the first chunk, release the cursor right away
+            await result.close()
+            return query_result
+
+        async def remaining_chunks():
+            try:
+                while True:
+                    chunk = await result.fetchmany(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield convert_rows(chunk, types)
+            finally:
+                await result.close()
+
+        query_result.set_pending(remaining_chunks())
+        return query_result
+
+    async def forward(self, query, session=None, stream=False, on_event=None):
         """
         Processes a user query, generates SQL, executes it, and handles errors asynchronously.
+        Progress is reported to `on_event(event, data)` when given.
         """
-        return_dict = {"response": [], "sql": [], "error_reason": [], "df": []}
-        session = SessionLocal()
+        query_result = QueryResult()
+        owns_session = session is None
+        if owns_session:
+            session = ReadOnlySessionLocal()
 
         try:
-            # Wrap the prediction call in asyncio.to_thread to prevent blocking
-            response = await asyncio.to_thread(
-                self.sql_agent,
-                user_query=query,
-                dataset_information=self.dataset_information,
-                sql_dialect="MySQL",
-            )
-            return_dict["response"].append(response)
+            response = None
+            if self.candidates > 1:
+                winner, response = await self.speculate(query, stream, on_event)
+                if winner is not None:
+                    return winner
+
+            if response is None:
+                # Predictions await the pooled `llm_client` on this loop
+                response = await self.sql_agent.acall(
+                    user_query=query,
+                    dataset_information=self.dataset_information,
+                    sql_dialect="MySQL",
+                )
 
             for attempt in range(self.max_retry):
                 sql = clean_llm_response(response.generated_sql)
-                return_dict["sql"].append(sql)
+
+                # Catch syntax errors and fix identifier typos locally first
+                check = validate_sql(sql, self.schema_index)
+                sql = check.sql
+                query_result.repairs.extend(check.repairs)
+                query_result.attempts.append(sql)
+                await emit(on_event, "sql_generated", sql=sql, attempt=attempt + 1)
 
                 try:
-                    df = await self.execute_query(sql, session)
-                    return_dict["df"].append(df)
-                    if df.empty:
+                    if not check.valid:
+                        raise ValueError("; ".join(check.errors))
+                    executed = await self.execute_query(sql, session, stream)
+                    await emit(on_event, "executed", row_count=executed.row_count)
+                    # Keep the last result that ran, even if it was empty
+                    query_result = executed.model_copy(
+                        update={
+                            "attempts": query_result.attempts,
+                            "error_reasons": query_result.error_reasons,
+                            "repairs": query_result.repairs,
+                            "error": None,
+                        }
+                    )
+                    if not executed.rows:
                         raise ValueError("Query returned an empty result set.")
+                    query_result.validated = True
                     break
 
                 except Exception as e:
                     logger.error(f"SQL Execution Error: {e}")
-                    error_reason = await asyncio.to_thread(
-                        self.error_reasoning_agent,
+                    if query_result.sql is None:
+                        query_result.error = str(e)
+                    error_reason = await self.error_reasoning_agent.acall(
                         error_message=str(e),
                         incorrect_sql=sql,
                         information=self.dataset_information,
                     )
-                    return_dict["error_reason"].append(error_reason.error_fix_reasoning)
+                    query_result.error_reasons.append(error_reason.error_fix_reasoning)
 
                     if "NOT ASKING FOR SQL" in error_reason.error_fix_reasoning:
                         break
 
-                    response = await asyncio.to_thread(
-                        self.error_fix_agent,
+                    await emit(
+                        on_event,
+                        "retry",
+                        attempt=attempt + 1,
+                        error=str(e),
+                        reason=error_reason.error_fix_reasoning,
+                    )
+                    response = await self.error_fix_agent.acall(
                         instruction=error_reason.error_fix_reasoning,
                     )
-                    return_dict["response"].append(response)
 
         except Exception as e:
             logger.error(f"Critical failure in query processing: {e}")
+            query_result.error = query_result.error or str(e)
 
         finally:
-            session.close()
+            if owns_session:
+                await session.close()
+
+        return query_result
+
+    async def speculate(self, query, stream=False, on_event=None):
+        """
+        Generates `self.candidates` SQL candidates at different temperatures and
+        executes them concurrently, each on its own read-only session. The first
+        candidate returning rows wins and the others are cancelled. The LLM calls
+        share the concurrency limit of `llm_client`.
+
+        Returns:
+            tuple: The winning QueryResult (None if every candidate failed) and
+                the prediction of the lowest-numbered candidate that produced
+                one (candidate 0 runs at the first, lowest temperature), to seed
+                the repair loop.
+        """
+        semaphore = asyncio.Semaphore(SQL_SPECULATIVE_MAX_PARALLEL)
+        predictions = {}  # candidate index -> prediction
+        executed_sql = {}
 
-        return return_dict
+        async def candidate(index):
+            temperature = SQL_SPECULATIVE_TEMPERATURES[
+                index % len(SQL_SPECULATIVE_TEMPERATURES)
+            ]
+            response = await self.sql_agent.acall(
+                user_query=query,
+                dataset_information=self.dataset_information,
+                sql_dialect="MySQL",
+                config={"temperature": temperature},
+            )
+            predictions[index] = response
+            sql = clean_llm_response(response.generated_sql)
+            check = validate_sql(sql, self.schema_index)
+            if not check.valid:
+                raise ValueError("; ".join(check.errors))
+            # Candidates that converge on the same SQL only run once
+            if check.sql in executed_sql:
+                raise ValueError(f"Duplicate of candidate {executed_sql[check.sql]}")
+            executed_sql[check.sql] = index
+            await emit(
+                on_event,
+                "sql_generated",
+                sql=check.sql,
+                attempt=index + 1,
+                speculative=True,
+            )
+
+            async with semaphore:
+                session = ReadOnlySessionLocal()
+                try:
+                    result = await self.execute_query(check.sql, session, stream)
+                except BaseException:
+                    await session.close()
+                    raise
+                if not result.streaming:
+                    await session.close()
+                else:
+                    result.set_pending(closing(result, session))
+            result.attempts = [check.sql]
+            result.repairs = check.repairs
+            if not result.rows:
+                await result.aclose()
+                raise ValueError("Query returned an empty result set.")
+            result.validated = True
+            return result
+
+        tasks = [asyncio.create_task(candidate(i)) for i in range(self.candidates)]
+        winner = None
+        try:
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is not None:
+                        await emit(
+                            on_event,
+                            "candidate_failed",
+                            attempt=tasks.index(task) + 1,
+                            error=str(task.exception()),
+                        )
+                    elif winner is None:
+                        winner = task.result()
+                    else:
+                        await task.result().aclose()
+        finally:
+            for task in tasks:
+                task.cancel()
+            for task in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(task, QueryResult) and task is not winner:
+                    await task.aclose()
+
+        if winner is not None:
+            winner.attempts = [
+                sql for sql, _ in sorted(executed_sql.items(), key=lambda i: i[1])
+            ]
+            logger.debug(f"Speculative candidate won: {winner.sql}")
+        return winner, (predictions[min(predictions)] if predictions else None)
+
+    async def replay(self, sql, session=None, stream=False, on_event=None):
+        """
+        Executes SQL taken from the semantic cache without calling the LLM.
+        """
+        owns_session = session is None
+        if owns_session:
+            session = ReadOnlySessionLocal()
+
+        try:
+            await emit(on_event, "sql_generated", sql=sql, attempt=0, cached=True)
+            query_result = await self.execute_query(sql, session, stream)
+            await emit(on_event, "executed", row_count=query_result.row_count)
+            query_result.attempts = [sql]
+            query_result.validated = bool(query_result.rows)
+            return query_result
+        except Exception as e:
+            logger.warning(f"Cached SQL failed, regenerating: {e}")
+            return QueryResult(attempts=[sql], error=str(e))
+
+        finally:
+            if owns_session:
+                await session.close()
 
     async def rate_limited_request(self, prompt):
         """
-        Handles Groq rate limit error and retries with exponential backoff.
+        Sends a prompt to the LM; rate limits are retried with jittered
+        exponential backoff by the shared client without blocking the event loop.
         """
-        backoff = 1
-        while True:
-            try:
-                return await self.lm.generate(prompt)
-            except litellm.RateLimitError:
-                logger.warning("Rate limit exceeded, retrying after backoff...")
-                time.sleep(backoff)
-                backoff *= 2  # Exponential backoff
-                if backoff > 60:  # Max backoff of 60 seconds
-                    logger.error("Max retries reached, aborting.")
-                    break
+        lm = getattr(self, "lm", None) or dspy.settings.lm
+        return await lm.generate(prompt)
+
+
+class AgentPool:
+    """
+    Long-lived `AgentSystem` instances shared by the requests of a process.
+
+    The LM, the predictors and the optional optimized program are set up once
+    by `warm_up`. A request checks an agent out with the schema context of its
+    question and hands it back afterwards, so concurrent requests never share
+    an agent and every request starts from the same program.
+    """
+
+    def __init__(self, size=AGENT_POOL_SIZE, program_path=DSPY_PROGRAM_PATH):
+        self.size = size
+        self.program_path = program_path
+        self._program = None
+        self._idle = []
+
+    def warm_up(self):
+        """Configure DSPy and build the agents; later calls do nothing."""
+        if self._program is not None:
+            return
+        # Update DSPy to use the async `GroqLM`
+        dspy.configure(lm=GroqLM(model="groq/llama3-8b-8192"))
+        program = AgentSystem(dataset_information="", max_retry=3)
+        if self.program_path:
+            program.load(self.program_path)
+            logger.info(f"Loaded DSPy program from {self.program_path}")
+        self._idle = [program.deepcopy() for _ in range(self.size)]
+        self._program = program
+        logger.info(f"Agent pool ready with {self.size} agents")
+
+    @contextlib.contextmanager
+    def acquire(self, dataset_information, schema_index=None):
+        """
+        Checks out an agent answering from the given schema context.
+        """
+        self.warm_up()
+        agent = self._idle.pop() if self._idle else self._program.deepcopy()
+        agent.dataset_information = dataset_information
+        agent.schema_index = schema_index or {}
+        try:
+            yield agent
+        finally:
+            agent.dataset_information = ""
+            agent.schema_index = {}
+            if len(self._idle) < self.size:
+                self._idle.append(agent)
 
 
-async def get_sql_query(query: str):
-    sql_system = AgentSystem(dataset_information=db_info, max_retry=3)
+agent_pool = AgentPool()
+
+
+async def get_sql_query(
+    query: str, session=None, stream=False, on_event=None
+) -> QueryResult:
     try:
-        responses = await sql_system.forward(query=query)
-        logger.debug(f"sql generated: {responses}")
-        return responses
+        # Only the tables relevant to the question go into the prompts
+        dataset_information, schema_hash = await schema_introspector.context_for(query)
+        snapshot = await schema_introspector.snapshot()
+        with agent_pool.acquire(
+            dataset_information, snapshot.column_index()
+        ) as sql_system:
+            return await answer(
+                sql_system, query, schema_hash, session, stream, on_event
+            )
     except Exception as e:
         logger.error(f"Execution failed: {e}")
         raise
+
+
+async def answer(sql_system, query, schema_hash, session, stream, on_event):
+    """
+    Answers a question with a checked-out agent, sharing the execution with
+    identical questions in flight.
+    """
+
+    async def resolve():
+        cached_sql = await asyncio.to_thread(semantic_cache.lookup, query, schema_hash)
+        if cached_sql:
+            query_result = await sql_system.replay(
+                cached_sql, session, stream, on_event
+            )
+            semantic_cache.record_replay(query_result.validated)
+            if query_result.validated:
+                logger.debug(f"sql reused from semantic cache: {cached_sql}")
+                return query_result
+
+        query_result = await sql_system.forward(
+            query=query, session=session, stream=stream, on_event=on_event
+        )
+        logger.debug(
+            f"sql generated: {query_result.sql} ({query_result.row_count} rows, "
+            f"{len(query_result.attempts)} attempts)"
+        )
+        if query_result.validated:
+            await asyncio.to_thread(
+                semantic_cache.store, query, query_result.sql, schema_hash
+            )
+        return query_result
+
+    # Identical questions in flight share one execution
+    key = coalesce_key(query, schema_hash, stream)
+    query_result, leader = await coalescer.run(key, resolve)
+    if leader:
+        return query_result
+
+    await emit(
+        on_event, "sql_generated", sql=query_result.sql, attempt=0, coalesced=True
+    )
+    if stream and query_result.sql is not None:
+        # A server-side cursor can't be shared, run the leader's SQL again
+        replayed = await sql_system.replay(query_result.sql, session, stream)
+        return replayed.model_copy(
+            update={
+                "attempts": query_result.attempts,
+                "repairs": query_result.repairs,
+                "error_reasons": query_result.error_reasons,
+            }
+        )
+    return query_result
@@ -9,7 +9,9 @@ current_dir_path = os.path.dirname(current_file_path)
 parent_dir_path = os.path.dirname(current_dir_path)
 # Add the parent directory path to the sys.path
 sys.path.insert(0, parent_dir_path)
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Index
+from sqlalchemy import LargeBinary
+from sqlalchemy.dialects.mysql import LONGBLOB
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from backend.database import Base
@@ -32,10 +34,29 @@ try:
         id = Column(Integer, primary_key=True, index=True)
         user_id = Column(Integer, ForeignKey("users.id"))
         query_text = Column(Text, nullable=False)
-        analysis_result = Column(Text, nullable=False)
+        # Inline JSON of rows stored before results moved to `result_blobs`
+        analysis_result = Column(Text, nullable=True)
+        result_digest = Column(String(64), ForeignKey("result_blobs.digest"))
         created_at = Column(DateTime, default=datetime.utcnow)
 
         user = relationship("User", back_populates="queries")
+
+        # Serves the keyset-paginated history of a user, newest first
+        __table_args__ = (
+            Index("ix_queries_user_created_id", "user_id", "created_at", "id"),
+        )
+
+    class ResultBlob(Base):
+        """A compressed query result, stored once per distinct content."""
+
+        __tablename__ = "result_blobs"
+
+        digest = Column(String(64), primary_key=True)  # SHA-256 of the JSON
+        codec = Column(String(16), nullable=False)  # zstd or zlib
+        size = Column(Integer, nullable=False)  # Uncompressed bytes
+        payload = Column(LargeBinary().with_variant(LONGBLOB, "mysql"), nullable=False)
+        created_at = Column(DateTime, default=datetime.utcnow)
+
 except Exception as e:
     logger.error(f"Error occurred while defining models: {e}")
     raise
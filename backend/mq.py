@@ -9,9 +9,17 @@ current_dir_path = os.path.dirname(current_file_path)
 parent_dir_path = os.path.dirname(current_dir_path)
 # Add the parent directory path to the sys.path
 sys.path.insert(0, parent_dir_path)
-from kafka import KafkaProducer, KafkaConsumer
+import gzip
 import json
+import time
+import queue
+import asyncio
+import threading
+from collections import defaultdict
+from prometheus_client import Counter, Gauge, Histogram
+from backend.cache import json_default
 from backend.log import logger
+from backend.services import services
 from dotenv import load_dotenv
 
 
@@ -21,31 +29,312 @@ load_dotenv()
 
 KAFKA_BROKER = os.getenv("KAFKA_BROKER")
 KAFKA_TOPIC = os.getenv("KAFKA_TOPIC")
+# Milliseconds the producer waits to fill a batch before sending it
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "20"))
+# Maximum size of one batch in bytes
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", "65536"))
+# Batch compression: gzip, snappy, lz4, zstd or none
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION", "gzip")
+# Events buffered in memory before new ones are dropped or have to wait
+KAFKA_MAX_PENDING = int(os.getenv("KAFKA_MAX_PENDING", "10000"))
+# Seconds `EventPublisher.publish` waits for room in a full buffer
+KAFKA_ENQUEUE_TIMEOUT = float(os.getenv("KAFKA_ENQUEUE_TIMEOUT", "1"))
 
-# Kafka Producer
-producer = KafkaProducer(
-    bootstrap_servers=KAFKA_BROKER,
-    value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+# KAFKA_BROKER value selecting the in-process stand-in broker
+MEMORY_BROKER = "memory"
+
+events_sent = Counter("kafka_events_sent_total", "Events acknowledged by Kafka")
+events_failed = Counter("kafka_events_failed_total", "Events Kafka did not store")
+events_dropped = Counter(
+    "kafka_events_dropped_total", "Events dropped because the buffer was full"
+)
+events_pending = Gauge("kafka_events_pending", "Events waiting in the buffer")
+delivery_seconds = Histogram(
+    "kafka_event_delivery_seconds", "Time from enqueueing an event to its ack"
 )
 
 
-def send_event(event: dict) -> None:
-    """Send an event to Kafka.
+class Delivery:
+    """A send awaiting its batch, with the callback API of kafka-python futures."""
+
+    def __init__(self, topic):
+        self.topic = topic
+        self.offset = None
+        self.is_done = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def add_callback(self, fn, *args):
+        with self._lock:
+            if not self.is_done:
+                self._callbacks.append((fn, args))
+                return self
+        fn(*args, self)
+        return self
+
+    def add_errback(self, fn, *args):
+        return self
+
+    def success(self, offset) -> None:
+        with self._lock:
+            self.offset = offset
+            self.is_done = True
+            callbacks, self._callbacks = self._callbacks, []
+        for fn, args in callbacks:
+            fn(*args, self)
+
+
+class PendingBatch:
+    def __init__(self, timer):
+        self.records = []
+        self.deliveries = []
+        self.size = 0
+        self.timer = timer
+
+
+class InMemoryProducer:
+    """
+    In-process stand-in for Kafka (KAFKA_BROKER=memory) for local runs and
+    tests.
+
+    Like KafkaProducer it collects the events of a topic into a batch that is
+    sent once it holds `batch_size` bytes or `linger_ms` after its first
+    event, compressed with gzip or not at all. Delivered events are kept in
+    `topics` and the sent batches, as `(topic, events, payload)`, in
+    `batches`.
+    """
+
+    def __init__(
+        self,
+        linger_ms=KAFKA_LINGER_MS,
+        batch_size=KAFKA_BATCH_SIZE,
+        compression_type=None,
+    ):
+        if compression_type not in (None, "gzip"):
+            logger.warning(f"In-memory broker has no {compression_type} codec")
+            compression_type = None
+        self.linger_ms = linger_ms
+        self.batch_size = batch_size
+        self.compression_type = compression_type
+        self.topics = defaultdict(list)
+        self.batches = []
+        self.closed = False
+        self._pending = {}  # topic -> PendingBatch
+        self._lock = threading.Lock()
+
+    def send(self, topic, value):
+        if self.closed:
+            raise RuntimeError("Cannot send on a closed producer")
+        record = json.dumps(value, default=json_default).encode("utf-8")
+        delivery = Delivery(topic)
+        with self._lock:
+            batch = self._pending.get(topic)
+            if batch is None:
+                timer = threading.Timer(self.linger_ms / 1000, self._send, (topic,))
+                timer.daemon = True
+                batch = self._pending[topic] = PendingBatch(timer)
+                timer.start()
+            batch.records.append(record)
+            batch.deliveries.append(delivery)
+            batch.size += len(record)
+            full = batch.size >= self.batch_size
+        if full:
+            self._send(topic)
+        return delivery
+
+    def _send(self, topic) -> None:
+        with self._lock:
+            batch = self._pending.pop(topic, None)
+            if batch is None:
+                return
+            batch.timer.cancel()
+            payload = b"\n".join(batch.records)
+            if self.compression_type == "gzip":
+                payload = gzip.compress(payload)
+            self.batches.append((topic, len(batch.records), payload))
+            offset = len(self.topics[topic])
+            self.topics[topic].extend(json.loads(r) for r in batch.records)
+        for index, delivery in enumerate(batch.deliveries):
+            delivery.success(offset + index)
+
+    def flush(self, timeout=None):
+        for topic in list(self._pending):
+            self._send(topic)
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        self.closed = True
+
+
+def create_producer():
+    compression_type = None if KAFKA_COMPRESSION == "none" else KAFKA_COMPRESSION
+    if KAFKA_BROKER == MEMORY_BROKER:
+        return InMemoryProducer(
+            linger_ms=KAFKA_LINGER_MS,
+            batch_size=KAFKA_BATCH_SIZE,
+            compression_type=compression_type,
+        )
+
+    from kafka import KafkaProducer
+
+    return KafkaProducer(
+        bootstrap_servers=KAFKA_BROKER,
+        value_serializer=lambda v: json.dumps(v, default=json_default).encode("utf-8"),
+        linger_ms=KAFKA_LINGER_MS,
+        batch_size=KAFKA_BATCH_SIZE,
+        compression_type=compression_type,
+    )
+
+
+# Kafka Producer, connected on the first event
+services.register("kafka_producer", create_producer)
+
+
+class EventPublisher:
+    """
+    Batched, non-blocking event pipeline to Kafka.
+
+    Callers only put events on a bounded in-memory buffer. A background
+    thread hands them to the producer, which batches (linger) and compresses
+    them; nobody waits for the broker and deliveries are counted by the
+    producer callbacks. When the buffer is full `send` drops the event and
+    `publish` waits for room. After `close` both refuse new events.
+    """
+
+    def __init__(self, topic=KAFKA_TOPIC, max_pending=KAFKA_MAX_PENDING):
+        self.topic = topic
+        # Events are disabled unless a broker and a topic are configured
+        self.enabled = bool(KAFKA_BROKER and topic)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._drain, name="kafka-events", daemon=True
+                )
+                self._thread.start()
+
+    def _offer(self, event: dict) -> bool:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((event, time.monotonic()))
+        except queue.Full:
+            return False
+        events_pending.inc()
+        return True
+
+    @staticmethod
+    def _drop(event: dict) -> bool:
+        events_dropped.inc()
+        logger.warning(f"Event buffer full, dropping event: {event.get('type')}")
+        return False
+
+    def send(self, event: dict) -> bool:
+        """Buffer an event without blocking.
+
+        Args:
+            event (dict): The event data.
+
+        Returns:
+            bool: False if events are disabled or the buffer is full.
+        """
+        if not self.enabled:
+            return False
+        return self._offer(event) or self._drop(event)
+
+    async def publish(self, event: dict, timeout=KAFKA_ENQUEUE_TIMEOUT) -> bool:
+        """Buffer an event, waiting up to `timeout` seconds while it is full.
+
+        Args:
+            event (dict): The event data.
+            timeout (float): The longest time to wait for room in the buffer.
+
+        Returns:
+            bool: False if events are disabled or the buffer stayed full.
+        """
+        if not self.enabled:
+            return False
+        deadline = time.monotonic() + timeout
+        while not self._offer(event):
+            if time.monotonic() >= deadline:
+                return self._drop(event)
+            await asyncio.sleep(0.01)
+        return True
+
+    def _drain(self) -> None:
+        while True:
+            event, enqueued_at = self._queue.get()
+            events_pending.dec()
+            try:
+                producer = services.get("kafka_producer")
+                future = producer.send(self.topic, event)
+                future.add_callback(self._delivered, enqueued_at)
+                future.add_errback(self._failed)
+            except Exception as e:
+                events_failed.inc()
+                logger.error(f"Error sending event: {e}")
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _delivered(enqueued_at, metadata) -> None:
+        events_sent.inc()
+        delivery_seconds.observe(time.monotonic() - enqueued_at)
+
+    @staticmethod
+    def _failed(exception) -> None:
+        events_failed.inc()
+        logger.error(f"Error delivering event: {exception}")
+
+    def flush(self, timeout: float = 10.0) -> None:
+        """Wait until the buffered events reached the broker (e.g. at shutdown)."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        if services.initialized("kafka_producer"):
+            remaining = max(deadline - time.monotonic(), 0)
+            services.get("kafka_producer").flush(timeout=remaining)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Deliver the buffered events and refuse new ones (at process exit).
+
+        The drain thread is a daemon, so events still buffered when the
+        process exits are lost unless it is closed first.
+        """
+        self.enabled = False
+        self.flush(timeout)
+        if services.initialized("kafka_producer"):
+            services.get("kafka_producer").close(timeout=timeout)
+
+
+event_publisher = EventPublisher()
+
+
+def send_event(event: dict) -> bool:
+    """Send an event to Kafka without waiting for the broker.
+
+    The event is batched with others by `event_publisher`; delivery is
+    reported by the `kafka_events_*` metrics.
 
     Args:
         event (dict): The event data.
+
+    Returns:
+        bool: False if the event was not buffered.
     """
-    try:
-        producer.send(KAFKA_TOPIC, event)
-        producer.flush()
-        logger.info(f"Event sent: {event}")
-    except Exception as e:
-        logger.error(f"Error sending event: {e}")
+    return event_publisher.send(event)
 
 
 def consume_events() -> None:
     """Consume events from Kafka."""
     try:
+        from kafka import KafkaConsumer
+
         consumer = KafkaConsumer(
             KAFKA_TOPIC,
             bootstrap_servers=KAFKA_BROKER,
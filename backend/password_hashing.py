@@ -0,0 +1,137 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from passlib.context import CryptContext
+from prometheus_client import Counter, Gauge
+from dotenv import load_dotenv
+from backend.log import logger
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Processes dedicated to hashing and verifying passwords
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Hashing requests queued or running before new ones are rejected
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+# Accepted schemes, the first one hashes new passwords (e.g. "argon2,bcrypt"
+# with argon2-cffi installed); hashes of the others are upgraded on login
+PASSWORD_HASH_SCHEMES = os.getenv("PASSWORD_HASH_SCHEMES", "bcrypt").split(",")
+# bcrypt cost; hashes with a lower cost are upgraded on login
+PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+
+bcrypt_options = {}
+if "bcrypt" in PASSWORD_HASH_SCHEMES:
+    bcrypt_options = {
+        "bcrypt__default_rounds": PASSWORD_BCRYPT_ROUNDS,
+        "bcrypt__min_rounds": PASSWORD_BCRYPT_ROUNDS,
+    }
+password_context = CryptContext(
+    schemes=PASSWORD_HASH_SCHEMES, deprecated="auto", **bcrypt_options
+)
+
+hash_rejections = Counter(
+    "password_hash_rejected_total", "Password hashing requests rejected as overloaded"
+)
+hash_pending = Gauge("password_hash_pending", "Password hashing requests in flight")
+
+
+class HashingOverloaded(RuntimeError):
+    """Raised when the hashing queue is full; retry later."""
+
+
+def hash_in_worker(password: str) -> str:
+    return password_context.hash(password)
+
+
+def verify_in_worker(password: str, hashed: str) -> tuple[bool, Optional[str]]:
+    return password_context.verify_and_update(password, hashed)
+
+
+class PasswordHasher:
+    """
+    bcrypt/argon2 on a bounded process pool of its own.
+
+    Login storms only queue up here instead of occupying the shared
+    threadpool that sync endpoints and `asyncio.to_thread` calls use. At most
+    `max_pending` requests wait or run at once, the next ones fail fast with
+    HashingOverloaded.
+    """
+
+    def __init__(
+        self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pending = 0
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned, not forked: the API process already runs threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            hash_rejections.inc()
+            raise HashingOverloaded("Too many password checks in progress")
+        self._pending += 1
+        hash_pending.inc()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._ensure_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+            hash_pending.dec()
+
+    async def hash(self, password: str) -> str:
+        """Hash a new password with the preferred scheme.
+
+        Raises:
+            HashingOverloaded: If the hashing queue is full.
+        """
+        return await self._run(hash_in_worker, password)
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, Optional[str]]:
+        """Verify a password against its hash.
+
+        Returns:
+            tuple[bool, Optional[str]]: Whether the password matches, and a
+                new hash to store when the old one uses a deprecated scheme
+                or a lower cost.
+
+        Raises:
+            HashingOverloaded: If the hashing queue is full.
+        """
+        return await self._run(verify_in_worker, password, hashed)
+
+    def warm_up(self) -> None:
+        """Start the worker processes before the first login needs them."""
+        executor = self._ensure_executor()
+        for _ in range(self.workers):
+            executor.submit(int)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Password hashing pool stopped")
+
+
+password_hasher = PasswordHasher()
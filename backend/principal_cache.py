@@ -0,0 +1,129 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+from prometheus_client import Counter
+from dotenv import load_dotenv
+from backend.cache import get_async_redis
+from backend.models import User
+from backend.log import logger
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Seconds this process trusts a resolved user without asking Redis or MySQL
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "30"))
+# Users kept in the in-process LRU
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+# Seconds a resolved user is shared between replicas through Redis (0 = off)
+PRINCIPAL_CACHE_REDIS_TTL = int(os.getenv("PRINCIPAL_CACHE_REDIS_TTL", "300"))
+
+PRINCIPAL_PREFIX = "principal:"
+FIELDS = ("id", "username", "email")
+
+principal_lookups = Counter(
+    "principal_cache_lookups_total",
+    "Authenticated user lookups by the tier that answered",
+    ["tier"],  # local, redis or database
+)
+
+
+class PrincipalCache:
+    """
+    Users resolved from access tokens, keyed by the token subject.
+
+    An in-process LRU with a short TTL answers the hot path; Redis is an
+    optional second tier shared by the replicas. Cached users are detached
+    `User` objects carrying the public fields only (no password hash).
+    Every code path that changes or deletes a user must await `invalidate`
+    once its transaction committed.
+    """
+
+    def __init__(
+        self,
+        ttl=PRINCIPAL_CACHE_TTL,
+        size=PRINCIPAL_CACHE_SIZE,
+        redis_ttl=PRINCIPAL_CACHE_REDIS_TTL,
+    ):
+        self.ttl = ttl
+        self.size = size
+        self.redis_ttl = redis_ttl
+        self._entries = OrderedDict()  # subject -> (expires at, fields)
+
+    @staticmethod
+    def key(subject) -> str:
+        return f"{PRINCIPAL_PREFIX}{subject}"
+
+    async def get(self, subject) -> Optional[User]:
+        """Return the cached user of a token subject, or None."""
+        subject = str(subject)
+        entry = self._entries.get(subject)
+        if entry is not None:
+            expires_at, fields = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(subject)
+                principal_lookups.labels(tier="local").inc()
+                return User(**fields)
+            self._entries.pop(subject, None)
+
+        if self.redis_ttl <= 0:
+            return None
+        try:
+            data = await get_async_redis().get(self.key(subject))
+        except Exception as e:
+            logger.error(f"Error reading principal cache: {e}")
+            return None
+        if data is None:
+            return None
+        fields = json.loads(data)
+        self._remember(subject, fields)
+        principal_lookups.labels(tier="redis").inc()
+        return User(**fields)
+
+    async def put(self, user: User) -> None:
+        """Cache a user read from the database."""
+        principal_lookups.labels(tier="database").inc()
+        fields = {name: getattr(user, name) for name in FIELDS}
+        subject = str(user.id)
+        self._remember(subject, fields)
+        if self.redis_ttl <= 0:
+            return
+        try:
+            await get_async_redis().set(
+                self.key(subject), json.dumps(fields), ex=self.redis_ttl
+            )
+        except Exception as e:
+            logger.error(f"Error writing principal cache: {e}")
+
+    def _remember(self, subject: str, fields: dict) -> None:
+        self._entries[subject] = (time.monotonic() + self.ttl, fields)
+        self._entries.move_to_end(subject)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    async def invalidate(self, subject) -> None:
+        """Forget a user after it changed.
+
+        Other replicas drop their local copy within PRINCIPAL_CACHE_TTL.
+        """
+        subject = str(subject)
+        self._entries.pop(subject, None)
+        try:
+            await get_async_redis().delete(self.key(subject))
+        except Exception as e:
+            logger.error(f"Error invalidating principal cache: {e}")
+
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,276 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+from typing import Any, Optional
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from backend.log import logger
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Approximate token budget of a data profile sent to the LLM
+PROFILE_TOKEN_BUDGET = int(os.getenv("PROFILE_TOKEN_BUDGET", "800"))
+# Most frequent values listed per categorical column
+PROFILE_TOP_K = int(os.getenv("PROFILE_TOP_K", "5"))
+# Example rows included at the end of the profile
+PROFILE_SAMPLE_ROWS = int(os.getenv("PROFILE_SAMPLE_ROWS", "3"))
+# Periods listed in a time trend
+PROFILE_TREND_PERIODS = int(os.getenv("PROFILE_TREND_PERIODS", "12"))
+
+# Rough characters per token of the English/number mix in profiles
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def to_frame(data: Any, columns: Optional[list[str]] = None) -> pd.DataFrame:
+    """Build a DataFrame from the result encodings used by the API.
+
+    Args:
+        data: A list of records, a list of rows (with `columns`) or a columnar
+            result (`{"columns": [...], "data": [[...], ...]}`).
+        columns (Optional[list[str]]): Column names for a list of rows.
+
+    Returns:
+        pd.DataFrame: The data, empty if the format is not recognised.
+    """
+    if isinstance(data, dict) and "columns" in data and "data" in data:
+        return pd.DataFrame(dict(zip(data["columns"], data["data"])))
+    if isinstance(data, list) and data:
+        if isinstance(data[0], dict):
+            return pd.DataFrame.from_records(data)
+        if columns is not None:
+            return pd.DataFrame(data, columns=columns)
+        return pd.DataFrame(data)
+    return pd.DataFrame()
+
+
+def is_key(name) -> bool:
+    name = str(name).lower()
+    return name == "id" or name.endswith("_id")
+
+
+def classify_columns(df: pd.DataFrame) -> tuple[pd.DataFrame, list, list, list]:
+    """Split columns into numeric, datetime and categorical ones.
+
+    Values serialized as JSON arrive as strings, so numbers and dates are
+    recovered when (almost) every non-null value converts. Key columns
+    (`id`, `*_id`) are grouped like categories rather than summed.
+
+    Returns:
+        tuple: The converted frame and the numeric, datetime and categorical
+            column names.
+    """
+    numeric, dates, categorical = [], [], []
+    converted = {}
+    for name in df.columns:
+        column = df[name]
+        present = column.notna().sum()
+        if present == 0:
+            categorical.append(name)
+            converted[name] = column
+            continue
+        if pd.api.types.is_bool_dtype(column) or is_key(name):
+            categorical.append(name)
+            converted[name] = column
+            continue
+        as_number = pd.to_numeric(column, errors="coerce")
+        if as_number.notna().sum() >= 0.95 * present:
+            numeric.append(name)
+            converted[name] = as_number
+            continue
+        as_date = pd.to_datetime(column, errors="coerce", format="mixed")
+        if as_date.notna().sum() >= 0.95 * present:
+            dates.append(name)
+            converted[name] = as_date
+            continue
+        categorical.append(name)
+        converted[name] = column.astype("string")
+    return pd.DataFrame(converted), numeric, dates, categorical
+
+
+def fmt(value) -> str:
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return f"{value:,}"
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return "n/a"
+        return f"{value:.4g}" if abs(value) < 1000 else f"{value:,.0f}"
+    if isinstance(value, pd.Timestamp):
+        return value.date().isoformat() if value == value.normalize() else str(value)
+    return str(value)
+
+
+def numeric_section(df: pd.DataFrame, numeric: list) -> list[str]:
+    if not numeric:
+        return []
+    # One vectorized pass over every numeric column
+    stats = df[numeric].describe(percentiles=[0.25, 0.5, 0.75]).T
+    totals = df[numeric].sum()
+    lines = ["Numeric columns (count, min, p25, median, p75, max, mean, std, sum):"]
+    for name, row in stats.iterrows():
+        nulls = len(df) - int(row["count"])
+        line = (
+            f"- {name}: {int(row['count'])}, {fmt(row['min'])}, {fmt(row['25%'])}, "
+            f"{fmt(row['50%'])}, {fmt(row['75%'])}, {fmt(row['max'])}, "
+            f"{fmt(row['mean'])}, {fmt(row['std'])}, {fmt(totals[name])}"
+        )
+        if nulls:
+            line += f" ({nulls} nulls)"
+        lines.append(line)
+    return lines
+
+
+def categorical_section(df: pd.DataFrame, categorical: list, top_k: int) -> list[str]:
+    if not categorical:
+        return []
+    lines = ["Categorical columns (distinct values, top values with share):"]
+    for name in categorical:
+        present = int(df[name].notna().sum())
+        if present == 0:
+            lines.append(f"- {name}: all null")
+            continue
+        nulls = f" ({len(df) - present} nulls)" if present < len(df) else ""
+        counts = df[name].value_counts(dropna=True)
+        if len(counts) == present:
+            lines.append(f"- {name}: {len(counts)} distinct (all unique){nulls}")
+            continue
+        shares = counts.head(top_k) / max(len(df), 1)
+        top = ", ".join(f"{value} {share:.0%}" for value, share in shares.items())
+        lines.append(f"- {name}: {len(counts)} distinct; {top}{nulls}")
+    return lines
+
+
+def trend_section(
+    df: pd.DataFrame, dates: list, numeric: list, periods: int
+) -> list[str]:
+    """Aggregate the numeric columns over the first date column."""
+    if not dates:
+        return []
+    lines = []
+    date_column = dates[0]
+    for name in dates:
+        lines.append(f"- {name}: {fmt(df[name].min())} to {fmt(df[name].max())}")
+    if not numeric:
+        return ["Date columns:"] + lines
+
+    span = df[date_column].max() - df[date_column].min()
+    freq, label = ("MS", "month") if span > pd.Timedelta(days=62) else ("D", "day")
+    series = (
+        df.dropna(subset=[date_column])
+        .set_index(date_column)[numeric]
+        .resample(freq)
+        .sum()
+    )
+    lines.append(f"Trend per {label} over {date_column} (sum):")
+    for name in numeric:
+        values = series[name].to_numpy(dtype=float)
+        if len(values) < 2:
+            continue
+        slope = np.polyfit(np.arange(len(values)), values, 1)[0]
+        mean = np.abs(values).mean() or 1.0
+        direction = "flat"
+        if abs(slope) / mean > 0.02:
+            direction = "rising" if slope > 0 else "falling"
+        recent = series[name].tail(periods)
+        points = ", ".join(
+            f"{fmt(index)[:7] if label == 'month' else fmt(index)}={fmt(value)}"
+            for index, value in recent.items()
+        )
+        peak = series[name].idxmax()
+        lines.append(
+            f"- {name}: {direction} ({fmt(slope)} per {label}), peak {fmt(peak)}; "
+            f"last {len(recent)}: {points}"
+        )
+    return ["Date columns:"] + lines
+
+
+def correlation_section(df: pd.DataFrame, numeric: list, limit: int = 5) -> list[str]:
+    if len(numeric) < 2:
+        return []
+    matrix = df[numeric].corr().to_numpy()
+    upper = np.triu_indices_from(matrix, k=1)
+    values = matrix[upper]
+    order = np.argsort(-np.nan_to_num(np.abs(values)))
+    pairs = [
+        f"{numeric[upper[0][i]]} ~ {numeric[upper[1][i]]}: {values[i]:+.2f}"
+        for i in order[:limit]
+        if not np.isnan(values[i]) and abs(values[i]) >= 0.3
+    ]
+    return ["Notable correlations: " + "; ".join(pairs)] if pairs else []
+
+
+def sample_section(df: pd.DataFrame, rows: int) -> list[str]:
+    if rows <= 0 or df.empty:
+        return []
+    sample = df.head(rows).to_dict(orient="records")
+    return ["Example rows:"] + [
+        "- " + ", ".join(f"{k}={fmt(v)}" for k, v in record.items())
+        for record in sample
+    ]
+
+
+def profile_data(
+    data: Any,
+    columns: Optional[list[str]] = None,
+    token_budget: int = PROFILE_TOKEN_BUDGET,
+) -> str:
+    """Summarize a query result for an LLM prompt within a token budget.
+
+    The profile has the same size for ten rows or a million: per-column
+    statistics, top categories, trends over the first date column and the
+    strongest correlations. Sections are added in that order until the
+    budget is reached.
+
+    Args:
+        data: The result rows (see `to_frame` for the accepted formats).
+        columns (Optional[list[str]]): Column names for a list of rows.
+        token_budget (int): The approximate maximum size of the profile.
+
+    Returns:
+        str: The profile text.
+    """
+    df = to_frame(data, columns)
+    if df.empty:
+        return "The query returned no rows."
+
+    df, numeric, dates, categorical = classify_columns(df)
+    names = ", ".join(map(str, df.columns))
+    header = f"{len(df)} rows, {len(df.columns)} columns: {names}"
+    sections = [
+        numeric_section(df, numeric),
+        categorical_section(df, categorical, PROFILE_TOP_K),
+        trend_section(df, dates, numeric, PROFILE_TREND_PERIODS),
+        correlation_section(df, numeric),
+        sample_section(df, PROFILE_SAMPLE_ROWS),
+    ]
+
+    lines = [header]
+    used = estimate_tokens(header)
+    truncated = False
+    for section in sections:
+        for line in section:
+            cost = estimate_tokens(line)
+            if used + cost > token_budget:
+                truncated = True
+                break
+            lines.append(line)
+            used += cost
+    if truncated:
+        lines.append("(profile truncated to fit the token budget)")
+    profile = "\n".join(lines)
+    logger.debug(f"Profiled {len(df)} rows into ~{used} tokens")
+    return profile
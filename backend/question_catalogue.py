@@ -0,0 +1,213 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import re
+import json
+import time
+import uuid
+import asyncio
+from typing import Optional
+from pydantic import BaseModel
+from prometheus_client import Counter
+from dotenv import load_dotenv
+from backend.cache import get_async_redis, release_lock
+from backend.llm import groq_llm
+from backend.schema_introspection import schema_introspector
+from backend.log import logger
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Age after which a catalogue is served stale and regenerated in the background
+QUESTION_CATALOGUE_TTL = int(os.getenv("QUESTION_CATALOGUE_TTL", "86400"))
+# How long this process trusts its in-memory copy before re-reading Redis
+QUESTION_CATALOGUE_LOCAL_TTL = int(os.getenv("QUESTION_CATALOGUE_LOCAL_TTL", "60"))
+# Seconds a cold request waits for a catalogue another worker is generating
+QUESTION_CATALOGUE_WAIT = int(os.getenv("QUESTION_CATALOGUE_WAIT", "30"))
+
+CATALOGUE_PREFIX = "questions:"
+LOCK_PREFIX = "questions:lock:"
+LOCK_TIMEOUT = 120
+
+catalogue_hits = Counter(
+    "question_catalogue_hits_total", "Business questions served from the catalogue"
+)
+catalogue_generations = Counter(
+    "question_catalogue_generations_total", "Business question catalogues generated"
+)
+
+
+class QuestionCatalogue(BaseModel):
+    schema_hash: str
+    questions: list[str]
+    generated_at: float
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self.generated_at > QUESTION_CATALOGUE_TTL
+
+
+# Function to extract questions from plain text
+def extract_questions(text):
+    lines = text.split("\n")
+    questions = []
+    for line in lines:
+        line = line.strip()
+        match = re.match(r"^\d+\.\s\*\*(.*?)\*\*$", line)  # Match numbered questions
+        if match:
+            questions.append(match.group(1))  # Extract clean question
+    return questions
+
+
+def parse_questions(data) -> list[str]:
+    """Extract the questions from a JSON or plain text LLM response."""
+    if not isinstance(data, str):
+        return []
+    try:
+        data = json.loads(data)  # Try parsing as JSON
+    except json.JSONDecodeError:
+        logger.warning("LLM response is not JSON, treating as plain text.")
+        return extract_questions(data)
+
+    questions = data.get("questions") if isinstance(data, dict) else None
+    if isinstance(questions, list):
+        return [str(q) for q in questions]
+    if isinstance(questions, str):
+        return extract_questions(questions)
+    logger.error("Unexpected response format: missing 'questions' key.")
+    return []
+
+
+class QuestionCatalogueStore:
+    """
+    Business questions generated once per schema, kept in Redis and in memory.
+
+    Catalogues older than QUESTION_CATALOGUE_TTL are still served while a
+    single worker (guarded by a Redis lock) regenerates them in the background.
+    """
+
+    def __init__(self):
+        self._local = None
+        self._read_at = 0.0
+        self._refreshing = {}  # schema hash -> background refresh task
+
+    @staticmethod
+    def key(schema_hash: str) -> str:
+        return f"{CATALOGUE_PREFIX}{schema_hash}"
+
+    async def read(self, schema_hash: str) -> Optional[QuestionCatalogue]:
+        """Return the catalogue of a schema from memory or Redis."""
+        local = self._local
+        if (
+            local is not None
+            and local.schema_hash == schema_hash
+            and time.monotonic() - self._read_at < QUESTION_CATALOGUE_LOCAL_TTL
+        ):
+            return local
+        data = await get_async_redis().get(self.key(schema_hash))
+        if data is None:
+            return None
+        self._local = QuestionCatalogue.model_validate_json(data)
+        self._read_at = time.monotonic()
+        return self._local
+
+    async def generate(self, schema_hash: str) -> Optional[QuestionCatalogue]:
+        """Ask the LLM for business questions and store them.
+
+        Only one worker generates a catalogue at a time; others return None.
+
+        Raises:
+            RuntimeError: If the LLM response contains no questions.
+        """
+        client = get_async_redis()
+        lock = f"{LOCK_PREFIX}{schema_hash}"
+        token = uuid.uuid4().hex
+        if not await client.set(lock, token, nx=True, ex=LOCK_TIMEOUT):
+            return None
+        try:
+            schema, current_hash = await schema_introspector.full_context()
+            prompt = f"""
+            You are an expert data scientist. Generate
+            business questions from these tables: {schema}
+            """
+            data = await groq_llm(prompt)
+            logger.debug(f"Raw response from LLM: {data}")
+            questions = parse_questions(data)
+            if not questions:
+                raise RuntimeError("No business questions in the LLM response")
+
+            catalogue = QuestionCatalogue(
+                schema_hash=current_hash, questions=questions, generated_at=time.time()
+            )
+            await client.set(self.key(current_hash), catalogue.model_dump_json())
+            self._local = catalogue
+            self._read_at = time.monotonic()
+            catalogue_generations.inc()
+            logger.info(f"Generated {len(questions)} business questions")
+            return catalogue
+        finally:
+            # After LOCK_TIMEOUT the lock may belong to another worker
+            await release_lock(lock, token)
+
+    def refresh_in_background(self, schema_hash: str) -> None:
+        if schema_hash in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self.generate(schema_hash)
+            except Exception as e:
+                logger.error(f"Error refreshing business questions: {e}")
+            finally:
+                self._refreshing.pop(schema_hash, None)
+
+        self._refreshing[schema_hash] = asyncio.create_task(refresh())
+
+    async def get(self) -> QuestionCatalogue:
+        """Return the catalogue of the current schema.
+
+        Returns:
+            QuestionCatalogue: The catalogue, possibly stale.
+
+        Raises:
+            RuntimeError: If no catalogue could be generated.
+        """
+        schema_hash = (await schema_introspector.snapshot()).fingerprint
+        catalogue = await self.read(schema_hash)
+        if catalogue is not None:
+            catalogue_hits.inc()
+            if catalogue.stale:
+                self.refresh_in_background(schema_hash)
+            return catalogue
+
+        # Cold start: generate, or wait for the worker that already is
+        deadline = time.monotonic() + QUESTION_CATALOGUE_WAIT
+        while True:
+            catalogue = await self.read(schema_hash) or await self.generate(schema_hash)
+            if catalogue is not None:
+                return catalogue
+            if time.monotonic() > deadline:
+                raise RuntimeError("Business questions are not available yet")
+            await asyncio.sleep(0.5)
+
+    async def warm_up(self) -> None:
+        """Generate the catalogue of the current schema if it is missing."""
+        try:
+            schema_hash = (await schema_introspector.snapshot()).fingerprint
+            catalogue = await self.read(schema_hash)
+            if catalogue is None or catalogue.stale:
+                await self.generate(schema_hash)
+        except Exception as e:
+            logger.error(f"Error warming up business questions: {e}")
+
+
+question_catalogue = QuestionCatalogueStore()
@@ -0,0 +1,183 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+from decimal import Decimal
+import numpy as np
+from dotenv import load_dotenv
+from backend.log import logger
+
+try:
+    import pyarrow as pa
+except ImportError:  # Arrow IPC encoding is optional
+    pa = None
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Rows fetched per round trip when streaming from a server-side cursor
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "500"))
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# MySQL protocol field type codes (pymysql.constants.FIELD_TYPE) to logical types
+MYSQL_TYPE_CODES = {
+    0: "decimal",
+    246: "decimal",
+    1: "int",
+    2: "int",
+    3: "int",
+    8: "int",
+    9: "int",
+    13: "int",
+    4: "float",
+    5: "float",
+    10: "date",
+    14: "date",
+    7: "datetime",
+    12: "datetime",
+    11: "time",
+    16: "bytes",
+    249: "bytes",
+    250: "bytes",
+    251: "bytes",
+    252: "bytes",
+    245: "json",
+}
+
+
+def column_types(result) -> list[str]:
+    """Read the logical column types from the cursor metadata of a result.
+
+    Args:
+        result: A SQLAlchemy (Async)Result that still holds its DBAPI cursor.
+
+    Returns:
+        list[str]: One logical type per column; "unknown" when the driver does
+            not report MySQL type codes.
+    """
+    result = getattr(result, "_real_result", result)
+    cursor = getattr(result, "cursor", None)
+    description = getattr(cursor, "description", None)
+    if not description:
+        return []
+    return [
+        MYSQL_TYPE_CODES.get(
+            column[1], "string" if column[1] is not None else "unknown"
+        )
+        for column in description
+    ]
+
+
+def decimal_to_float(values: list) -> list:
+    """Convert one column of Decimal values (or None) to floats in one pass."""
+    column = np.array(values, dtype=object)
+    nulls = np.equal(column, None)
+    if not nulls.any():
+        return column.astype(np.float64).tolist()
+    column[nulls] = np.nan
+    converted = column.astype(np.float64).astype(object)
+    converted[nulls] = None
+    return converted.tolist()
+
+
+def rows_to_columns(rows: list, width: int) -> list[list]:
+    """Transpose row-major data into one list per column."""
+    if not rows:
+        return [[] for _ in range(width)]
+    return [list(column) for column in zip(*rows)]
+
+
+def columns_to_rows(columns: list[list]) -> list[list]:
+    """Transpose column-major data back into one list per row."""
+    return [list(row) for row in zip(*columns)]
+
+
+def convert_columns(columns: list[list], types: list[str]) -> list[list]:
+    """Convert the numeric columns of a result for JSON/Arrow serialization.
+
+    Columns are converted as a whole based on the cursor type metadata. When
+    no metadata is available the first non-null value decides.
+
+    Args:
+        columns (list[list]): The column-major values.
+        types (list[str]): The logical type of each column.
+
+    Returns:
+        list[list]: The converted columns.
+    """
+    converted = []
+    for index, values in enumerate(columns):
+        kind = types[index] if index < len(types) else "unknown"
+        if kind == "unknown":
+            sample = next((v for v in values if v is not None), None)
+            kind = "decimal" if isinstance(sample, Decimal) else kind
+        converted.append(decimal_to_float(values) if kind == "decimal" else values)
+    return converted
+
+
+def convert_rows(rows: list, types: list[str]) -> list[list]:
+    """Convert row-major database rows column by column.
+
+    Args:
+        rows (list): The rows returned by the cursor.
+        types (list[str]): The logical type of each column.
+
+    Returns:
+        list[list]: The converted rows.
+    """
+    if not rows:
+        return []
+    if types and "decimal" not in types and "unknown" not in types:
+        return [list(row) for row in rows]
+    columns = rows_to_columns(rows, len(rows[0]))
+    return columns_to_rows(convert_columns(columns, types))
+
+
+def to_columnar(result) -> dict:
+    """Encode a QueryResult with column names once and one array per column.
+
+    Args:
+        result (QueryResult): The query result.
+
+    Returns:
+        dict: The columns, their logical types and the column arrays.
+    """
+    return {
+        "columns": result.columns,
+        "types": result.column_types,
+        "data": rows_to_columns(result.rows, len(result.columns)),
+    }
+
+
+def to_arrow_ipc(result) -> bytes:
+    """Encode a QueryResult as an Apache Arrow IPC stream.
+
+    Args:
+        result (QueryResult): The query result.
+
+    Returns:
+        bytes: The Arrow IPC stream.
+
+    Raises:
+        RuntimeError: If pyarrow is not installed.
+    """
+    if pa is None:
+        raise RuntimeError("Arrow encoding requires the pyarrow package")
+    columns = rows_to_columns(result.rows, len(result.columns))
+    table = pa.Table.from_arrays(
+        [pa.array(values) for values in columns], names=result.columns
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    logger.debug(f"Arrow IPC payload: {sink.tell()} bytes")
+    return sink.getvalue().to_pybytes()
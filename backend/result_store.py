@@ -0,0 +1,128 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import json
+import zlib
+import hashlib
+from typing import Optional
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from prometheus_client import Counter
+from dotenv import load_dotenv
+from backend.cache import json_default
+from backend.models import ResultBlob
+from backend.log import logger
+
+try:
+    import zstandard
+except ImportError:  # zlib is used when zstandard is not installed
+    zstandard = None
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# zstd compression level of stored results (1-22)
+RESULT_STORE_ZSTD_LEVEL = int(os.getenv("RESULT_STORE_ZSTD_LEVEL", "3"))
+
+result_bytes = Counter(
+    "result_store_bytes_total",
+    "Bytes of query results written to the result store",
+    ["kind"],  # raw or stored
+)
+
+
+def to_json(analysis_result) -> str:
+    """Serialize a result the same way wherever it is stored."""
+    return json.dumps(analysis_result, default=json_default)
+
+
+def digest_of(payload: bytes) -> str:
+    return hashlib.sha256(payload).hexdigest()
+
+
+def compress(payload: bytes) -> tuple[str, bytes]:
+    """Compress a payload with zstd, or zlib without zstandard.
+
+    Returns:
+        tuple[str, bytes]: The codec name and the compressed bytes.
+    """
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=RESULT_STORE_ZSTD_LEVEL)
+        return "zstd", compressor.compress(payload)
+    return "zlib", zlib.compress(payload, 6)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd results")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise ValueError(f"Unknown result codec: {codec}")
+
+
+def prepare_blob(result_json: str) -> dict:
+    """Hash and compress a JSON result into a `result_blobs` row.
+
+    CPU bound; run it off the event loop.
+    """
+    payload = result_json.encode("utf-8")
+    codec, data = compress(payload)
+    result_bytes.labels(kind="raw").inc(len(payload))
+    result_bytes.labels(kind="stored").inc(len(data))
+    return {
+        "digest": digest_of(payload),
+        "codec": codec,
+        "size": len(payload),
+        "payload": data,
+    }
+
+
+async def store_blobs(db: AsyncSession, blobs: list[dict]) -> None:
+    """Insert result blobs, skipping the ones already stored.
+
+    Blobs are content-addressed, so identical results of a popular question
+    share one row. The caller commits.
+    """
+    unique = list({blob["digest"]: blob for blob in blobs}.values())
+    if not unique:
+        return
+    statement = (
+        insert(ResultBlob)
+        .prefix_with("IGNORE", dialect="mysql")
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+    await db.execute(statement, unique)
+
+
+async def load_result(db: AsyncSession, digest: str) -> Optional[str]:
+    """Read and decompress a stored result.
+
+    Args:
+        db (AsyncSession): The database session.
+        digest (str): The `Query.result_digest` of the result.
+
+    Returns:
+        Optional[str]: The JSON result, or None if the blob is missing.
+    """
+    row = (
+        await db.execute(
+            select(ResultBlob.codec, ResultBlob.payload).where(
+                ResultBlob.digest == digest
+            )
+        )
+    ).first()
+    if row is None:
+        logger.warning(f"Result blob {digest} is missing")
+        return None
+    return decompress(row.codec, row.payload).decode("utf-8")
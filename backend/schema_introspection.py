@@ -0,0 +1,344 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import time
+import asyncio
+import hashlib
+from typing import Optional
+import numpy as np
+from pydantic import BaseModel
+from sqlalchemy.sql import text
+from dotenv import load_dotenv
+from backend.database import AsyncSessionLocal
+from backend.config import db_info
+from backend.log import logger
+from backend.vector_db import embed_texts
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Seconds between two checks of the schema version
+SCHEMA_CACHE_TTL = int(os.getenv("SCHEMA_CACHE_TTL", "300"))
+# Maximum number of tables (before FK neighbours) sent with a question
+SCHEMA_CONTEXT_TABLES = int(os.getenv("SCHEMA_CONTEXT_TABLES", "4"))
+# Application tables that must never be exposed to the SQL agent
+EXCLUDED_TABLES = os.getenv("SCHEMA_EXCLUDED_TABLES", "users,queries,result_blobs")
+SCHEMA_EXCLUDED_TABLES = set(t.strip() for t in EXCLUDED_TABLES.split(",") if t.strip())
+
+VERSION_SQL = """
+SELECT
+    (SELECT COUNT(*) FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()),
+    (SELECT COALESCE(SUM(CRC32(CONCAT_WS(',', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE))), 0)
+       FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE()),
+    (SELECT COUNT(*) FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE())
+"""
+
+TABLES_SQL = """
+SELECT TABLE_NAME, TABLE_ROWS, TABLE_COMMENT
+FROM information_schema.TABLES
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
+"""
+
+COLUMNS_SQL = """
+SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_COMMENT
+FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE()
+ORDER BY TABLE_NAME, ORDINAL_POSITION
+"""
+
+INDEXES_SQL = """
+SELECT TABLE_NAME, INDEX_NAME, NON_UNIQUE,
+       GROUP_CONCAT(COLUMN_NAME ORDER BY SEQ_IN_INDEX SEPARATOR ', ')
+FROM information_schema.STATISTICS
+WHERE TABLE_SCHEMA = DATABASE()
+GROUP BY TABLE_NAME, INDEX_NAME, NON_UNIQUE
+"""
+
+FOREIGN_KEYS_SQL = """
+SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+FROM information_schema.KEY_COLUMN_USAGE
+WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL
+"""
+
+
+class ColumnInfo(BaseModel):
+    name: str
+    type: str
+    nullable: bool = True
+    key: str = ""  # PRI, UNI or MUL
+    comment: str = ""
+
+
+class ForeignKeyInfo(BaseModel):
+    column: str
+    referenced_table: str
+    referenced_column: str
+
+
+class TableInfo(BaseModel):
+    name: str
+    row_estimate: Optional[int] = None
+    comment: str = ""
+    columns: list[ColumnInfo] = []
+    indexes: dict[str, str] = {}  # index name -> "UNIQUE (a, b)" / "(a, b)"
+    foreign_keys: list[ForeignKeyInfo] = []
+
+    def render(self) -> str:
+        """Render the table as a compact markdown block for LLM prompts."""
+        header = f"**{self.name}**"
+        if self.row_estimate is not None:
+            header += f" (~{self.row_estimate} rows)"
+        if self.comment:
+            header += f": {self.comment}"
+        lines = [header]
+        for column in self.columns:
+            line = f"- `{column.name}` {column.type}"
+            if column.key == "PRI":
+                line += " PK"
+            if not column.nullable:
+                line += " NOT NULL"
+            if column.comment:
+                line += f" -- {column.comment}"
+            lines.append(line)
+        for fk in self.foreign_keys:
+            lines.append(
+                f"- FK `{fk.column}` -> `{fk.referenced_table}.{fk.referenced_column}`"
+            )
+        if self.indexes:
+            indexes = "; ".join(f"{n} {c}" for n, c in self.indexes.items())
+            lines.append(f"- Indexes: {indexes}")
+        return "\n".join(lines)
+
+    def description(self) -> str:
+        """Plain text used to embed the table for retrieval."""
+        columns = ", ".join(c.name.replace("_", " ") for c in self.columns)
+        return f"{self.name.replace('_', ' ')}: {self.comment} {columns}".strip()
+
+
+class SchemaSnapshot(BaseModel):
+    fingerprint: str
+    tables: dict[str, TableInfo] = {}
+    fallback: Optional[str] = None  # Static description when introspection failed
+
+    def render(self, names: Optional[list[str]] = None) -> str:
+        """Render the given tables (all by default) as prompt context."""
+        if self.fallback is not None:
+            return self.fallback
+        names = names if names is not None else sorted(self.tables)
+        blocks = [self.tables[n].render() for n in names if n in self.tables]
+        return "### Database Structure:\n\n" + "\n\n".join(blocks)
+
+    def column_index(self) -> dict[str, list[str]]:
+        """Column names per table, empty when only the static fallback is known."""
+        return {n: [c.name for c in t.columns] for n, t in self.tables.items()}
+
+
+class SchemaIntrospector:
+    """
+    Reads the live schema from INFORMATION_SCHEMA, caches it and selects the
+    tables relevant to a question by embedding similarity.
+    """
+
+    def __init__(self, ttl=SCHEMA_CACHE_TTL, max_tables=SCHEMA_CONTEXT_TABLES):
+        self.ttl = ttl
+        self.max_tables = max_tables
+        self._snapshot = None
+        self._version = None
+        self._checked_at = 0.0
+        self._table_names = []
+        self._table_vectors = None
+        self._lock = None
+        self._loop = None
+
+    def _ensure_lock(self):
+        # asyncio primitives belong to one event loop (Celery tasks run their own)
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    async def snapshot(self) -> SchemaSnapshot:
+        """Return the cached schema, reloading it if the schema version changed.
+
+        Returns:
+            SchemaSnapshot: The current schema.
+        """
+        fresh = time.monotonic() - self._checked_at < self.ttl
+        if self._snapshot is not None and fresh:
+            return self._snapshot
+
+        async with self._ensure_lock():
+            if (
+                self._snapshot is not None
+                and time.monotonic() - self._checked_at < self.ttl
+            ):
+                return self._snapshot
+            try:
+                async with AsyncSessionLocal() as session:
+                    version = tuple((await session.execute(text(VERSION_SQL))).one())
+                    if self._snapshot is None or version != self._version:
+                        snapshot = await self.load(session)
+                        await self.index(snapshot)
+                        if self._snapshot is not None:
+                            logger.info(
+                                f"Schema changed: {self._snapshot.fingerprint} -> "
+                                f"{snapshot.fingerprint}"
+                            )
+                        self._snapshot = snapshot
+                        self._version = version
+            except Exception as e:
+                logger.error(f"Schema introspection failed, using static db_info: {e}")
+                if self._snapshot is None:
+                    self._snapshot = SchemaSnapshot(
+                        fingerprint=schema_fingerprint(db_info), fallback=db_info
+                    )
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    async def load(self, session) -> SchemaSnapshot:
+        """Read tables, columns, indexes, foreign keys and row estimates.
+
+        Args:
+            session (AsyncSession): The database session.
+
+        Returns:
+            SchemaSnapshot: The freshly loaded schema.
+        """
+        tables = {}
+        for name, rows, comment in (await session.execute(text(TABLES_SQL))).all():
+            if name not in SCHEMA_EXCLUDED_TABLES:
+                tables[name] = TableInfo(
+                    name=name, row_estimate=rows, comment=comment or ""
+                )
+
+        for table, name, type_, nullable, key, comment in (
+            await session.execute(text(COLUMNS_SQL))
+        ).all():
+            if table in tables:
+                tables[table].columns.append(
+                    ColumnInfo(
+                        name=name,
+                        type=type_,
+                        nullable=nullable == "YES",
+                        key=key or "",
+                        comment=comment or "",
+                    )
+                )
+
+        for table, index, non_unique, columns in (
+            await session.execute(text(INDEXES_SQL))
+        ).all():
+            if table in tables:
+                prefix = "" if non_unique else "UNIQUE "
+                tables[table].indexes[index] = f"{prefix}({columns})"
+
+        for table, column, ref_table, ref_column in (
+            await session.execute(text(FOREIGN_KEYS_SQL))
+        ).all():
+            if table in tables:
+                tables[table].foreign_keys.append(
+                    ForeignKeyInfo(
+                        column=column,
+                        referenced_table=ref_table,
+                        referenced_column=ref_column,
+                    )
+                )
+
+        snapshot = SchemaSnapshot(fingerprint="", tables=tables)
+        # Row estimates change constantly, so they are not part of the fingerprint
+        structure = "\n".join(
+            t.model_dump_json(exclude={"row_estimate"})
+            for _, t in sorted(tables.items())
+        )
+        snapshot.fingerprint = schema_fingerprint(structure)
+        logger.info(f"Loaded schema {snapshot.fingerprint} with {len(tables)} tables")
+        return snapshot
+
+    async def index(self, snapshot: SchemaSnapshot) -> None:
+        """Embed every table description for retrieval."""
+        names = sorted(snapshot.tables)
+        vectors = None
+        if len(names) > self.max_tables:
+            descriptions = [snapshot.tables[n].description() for n in names]
+            vectors = np.asarray(await asyncio.to_thread(embed_texts, descriptions))
+        self._table_names = names
+        self._table_vectors = vectors
+
+    async def relevant_tables(self, question: str) -> list[str]:
+        """Pick the tables most similar to the question plus their FK neighbours.
+
+        Args:
+            question (str): The user question.
+
+        Returns:
+            list[str]: The selected table names.
+        """
+        snapshot = await self.snapshot()
+        if self._table_vectors is None:
+            return self._table_names
+
+        query = np.asarray((await asyncio.to_thread(embed_texts, [question]))[0])
+        norms = np.linalg.norm(self._table_vectors, axis=1) * np.linalg.norm(query)
+        scores = self._table_vectors @ query / np.where(norms == 0, 1, norms)
+        best = [self._table_names[i] for i in np.argsort(-scores)[: self.max_tables]]
+
+        selected = list(best)
+        for name in best:
+            for fk in snapshot.tables[name].foreign_keys:
+                referenced = fk.referenced_table
+                if referenced in snapshot.tables and referenced not in selected:
+                    selected.append(referenced)
+        return selected
+
+    async def context_for(self, question: str) -> tuple[str, str]:
+        """Build the schema context for a question.
+
+        Args:
+            question (str): The user question.
+
+        Returns:
+            tuple[str, str]: The rendered schema context and the schema fingerprint.
+        """
+        snapshot = await self.snapshot()
+        if snapshot.fallback is not None:
+            return snapshot.fallback, snapshot.fingerprint
+        tables = await self.relevant_tables(question)
+        return snapshot.render(tables), snapshot.fingerprint
+
+    async def full_context(self) -> tuple[str, str]:
+        """Render every table of the schema.
+
+        Returns:
+            tuple[str, str]: The rendered schema and the schema fingerprint.
+        """
+        snapshot = await self.snapshot()
+        return snapshot.render(), snapshot.fingerprint
+
+    def invalidate(self) -> None:
+        """Force a version check on the next access."""
+        self._checked_at = 0.0
+
+
+def schema_fingerprint(schema: str) -> str:
+    """Hash a schema description.
+
+    Args:
+        schema (str): The schema description the SQL is generated against.
+
+    Returns:
+        str: A short, stable hash of the schema.
+    """
+    return hashlib.sha256(schema.encode("utf-8")).hexdigest()[:16]
+
+
+schema_introspector = SchemaIntrospector()
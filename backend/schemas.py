@@ -9,8 +9,9 @@ current_dir_path = os.path.dirname(current_file_path)
 parent_dir_path = os.path.dirname(current_dir_path)
 # Add the parent directory path to the sys.path
 sys.path.insert(0, parent_dir_path)
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List, Any
+from pydantic import BaseModel, EmailStr, PrivateAttr
+from typing import Optional, List, Any, AsyncIterator
+from datetime import datetime
 from backend.log import logger
 
 
@@ -35,6 +36,81 @@ class QueryRequest(BaseModel):
 class ChartRequest(BaseModel):
     query: str
     data: Any
+    max_tokens: Optional[int] = None  # Capped by CHART_DESCRIPTION_MAX_TOKENS
+
+
+class QueryResult(BaseModel):
+    """Outcome of the text-to-SQL pipeline for one user question."""
+
+    sql: Optional[str] = None  # The SQL that produced `rows`
+    columns: List[str] = []
+    column_types: List[str] = []  # Logical types from the cursor metadata
+    rows: List[List[Any]] = []
+    attempts: List[str] = []  # Every SQL statement that was tried
+    error_reasons: List[str] = []
+    repairs: List[str] = []  # Identifier fixes applied without the LLM
+    guard: List[str] = []  # Cost guard decisions (added LIMIT, capped plan, ...)
+    error: Optional[str] = None  # Set when no attempt could be executed
+    validated: bool = False  # True when the SQL returned a non-empty result
+    cached: bool = False
+
+    # Remaining row chunks of a streamed result, read from a server-side cursor
+    _pending: Optional[AsyncIterator[List[List[Any]]]] = PrivateAttr(default=None)
+
+    @property
+    def row_count(self) -> int:
+        return len(self.rows)
+
+    @property
+    def streaming(self) -> bool:
+        return self._pending is not None
+
+    def records(self) -> List[dict]:
+        """Return the rows as a list of dictionaries keyed by column name."""
+        columns = self.columns
+        return [dict(zip(columns, row)) for row in self.rows]
+
+    def set_pending(self, chunks: AsyncIterator[List[List[Any]]]) -> None:
+        self._pending = chunks
+
+    async def iter_chunks(self, chunk_size: int) -> AsyncIterator[List[List[Any]]]:
+        """Yield all rows in chunks, starting with the rows already fetched.
+
+        Args:
+            chunk_size (int): The maximum number of rows per chunk.
+
+        Yields:
+            List[List[Any]]: The next chunk of rows.
+        """
+        for start in range(0, len(self.rows), chunk_size):
+            yield self.rows[start : start + chunk_size]
+        if self._pending is None:
+            return
+        try:
+            async for chunk in self._pending:
+                yield chunk
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        """Release the server-side cursor of a streamed result."""
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            await pending.aclose()
+
+
+class JobStatus(BaseModel):
+    """State of a text-to-SQL job run by a Celery worker."""
+
+    job_id: str
+    user_id: int
+    query: str
+    status: str = "queued"  # queued, running, succeeded or failed
+    stage: Optional[str] = None  # Last progress event, e.g. "sql_generated"
+    result: Optional[dict] = None  # sql, guard and the columnar rows
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
 
 
 class QueryCreate(BaseModel):
@@ -49,3 +125,20 @@ class QueryResponse(BaseModel):
 
     class Config:
         from_attributes = True  # Ensures compatibility with ORM objects
+
+
+class QuerySummary(BaseModel):
+    """A history entry without its result body."""
+
+    id: int
+    user_id: int
+    query_text: str
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class QueryPage(BaseModel):
+    items: List[QuerySummary]
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next page
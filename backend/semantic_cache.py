@@ -0,0 +1,274 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import re
+import json
+import hashlib
+from typing import Optional
+from prometheus_client import Counter
+from dotenv import load_dotenv
+from backend.log import logger
+from backend.vector_db import get_collection, embed_texts, distance_to_similarity
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_NEIGHBOURS = int(os.getenv("SEMANTIC_CACHE_NEIGHBOURS", "3"))
+
+# Marks the entries of the shared collection that belong to this cache
+ENTRY_KIND = "nl2sql"
+
+cache_hits = Counter(
+    "semantic_cache_hits_total", "NL-to-SQL lookups answered from the semantic cache"
+)
+cache_misses = Counter(
+    "semantic_cache_misses_total", "NL-to-SQL lookups that had to call the LLM"
+)
+cache_invalidations = Counter(
+    "semantic_cache_invalidations_total",
+    "Semantic cache entries dropped because the schema changed",
+)
+
+
+def normalize_question(question: str) -> str:
+    """Normalize a natural language question before embedding it.
+
+    Args:
+        question (str): The raw user question.
+
+    Returns:
+        str: The lower-cased question without punctuation or repeated spaces.
+    """
+    question = question.lower()
+    question = re.sub(r"[^\w\s%.-]", " ", question)
+    question = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", question)
+    return re.sub(r"\s+", " ", question).strip()
+
+
+# Calendar words that pick a period even when written in lower case
+CALENDAR_WORDS = set(
+    (
+        "january february march april may june july august september october "
+        "november december jan feb mar apr jun jul aug sep sept oct nov dec "
+        "monday tuesday wednesday thursday friday saturday sunday"
+    ).split()
+)
+
+
+def question_literals(question: str) -> str:
+    """Extract the values a question filters on.
+
+    Questions that only differ in a year, an id, a month or a name embed
+    almost identically but need different SQL, so a cached neighbour is only
+    reused when these values match exactly. Names are the quoted strings and
+    the capitalized words that do not start a sentence.
+
+    Args:
+        question (str): The raw user question.
+
+    Returns:
+        str: The quoted strings, calendar words, names and numbers, as JSON.
+    """
+    quoted = re.findall(r"'([^']*)'|\"([^\"]*)\"", question)
+    literals = [normalize_question(a or b) for a, b in quoted]
+    unquoted = re.sub(r"'[^']*'|\"[^\"]*\"", " ", question)
+    for sentence in re.split(r"[.?!:;]\s+", unquoted):
+        words = re.findall(r"[A-Za-z][\w&-]*", sentence)
+        for position, word in enumerate(words):
+            name = position > 0 and word[0].isupper() and word != "I"
+            if name or word.lower() in CALENDAR_WORDS:
+                literals.append(word.lower())
+    literals += re.findall(r"\d+(?:\.\d+)?%?", normalize_question(question))
+    return json.dumps(literals)
+
+
+def sql_literals_in(sql: str, normalized_question: str) -> bool:
+    """Check that the text values cached SQL filters on appear in a question.
+
+    This catches names the question does not capitalize ("sales of acme").
+
+    Args:
+        sql (str): The cached SQL.
+        normalized_question (str): The new question, see `normalize_question`.
+
+    Returns:
+        bool: Whether every string literal with letters occurs in the question.
+    """
+    for literal in re.findall(r"'((?:[^']|'')*)'", sql):
+        value = normalize_question(literal.replace("%", " ").replace("''", "'"))
+        if re.search(r"[a-z]", value) and value not in normalized_question:
+            return False
+    return True
+
+
+class SemanticQueryCache:
+    """
+    Maps paraphrased user questions onto SQL that already executed successfully.
+    """
+
+    def __init__(
+        self,
+        collection=None,
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        n_results=SEMANTIC_CACHE_NEIGHBOURS,
+    ):
+        self._collection = collection
+        self.threshold = threshold
+        self.n_results = n_results
+        self.schema_hash = None
+
+    @property
+    def collection(self):
+        # The shared Chroma collection is opened on the first lookup
+        return self._collection or get_collection()
+
+    @staticmethod
+    def entry_id(normalized_question: str, schema_hash: str) -> str:
+        digest = hashlib.sha256(normalized_question.encode("utf-8")).hexdigest()
+        return f"{ENTRY_KIND}:{schema_hash}:{digest[:32]}"
+
+    def check_schema(self, schema_hash: str) -> None:
+        """Drop entries generated against another schema when the schema changes.
+
+        Args:
+            schema_hash (str): The fingerprint of the current schema.
+        """
+        if self.schema_hash == schema_hash:
+            return
+        if self.schema_hash is not None:
+            logger.info(f"Schema changed ({self.schema_hash} -> {schema_hash})")
+        self.schema_hash = schema_hash
+        self.invalidate(keep_schema_hash=schema_hash)
+
+    def invalidate(self, keep_schema_hash: Optional[str] = None) -> int:
+        """Remove cached SQL, optionally keeping entries for one schema.
+
+        Args:
+            keep_schema_hash (Optional[str]): Entries with this fingerprint are kept.
+
+        Returns:
+            int: The number of removed entries.
+        """
+        where = {"kind": ENTRY_KIND}
+        if keep_schema_hash is not None:
+            where = {
+                "$and": [
+                    {"kind": ENTRY_KIND},
+                    {"schema_hash": {"$ne": keep_schema_hash}},
+                ]
+            }
+        try:
+            stale = self.collection.get(where=where, include=[])
+            ids = stale.get("ids", [])
+            if ids:
+                self.collection.delete(ids=ids)
+                cache_invalidations.inc(len(ids))
+                logger.info(f"Invalidated {len(ids)} semantic cache entries")
+            return len(ids)
+        except Exception as e:
+            logger.error(f"Error invalidating semantic cache: {e}")
+            return 0
+
+    def lookup(self, question: str, schema_hash: str) -> Optional[str]:
+        """Find validated SQL for the question or a close paraphrase of it.
+
+        Args:
+            question (str): The user question.
+            schema_hash (str): The fingerprint of the current schema.
+
+        A neighbour is only accepted when its question carries the same
+        literals (see `question_literals`) and the text values of its SQL
+        occur in the new question (see `sql_literals_in`). Hits are counted by
+        `record_replay` once the returned SQL has executed.
+
+        Returns:
+            Optional[str]: The cached SQL if a neighbour passes the threshold.
+        """
+        if not SEMANTIC_CACHE_ENABLED:
+            return None
+        try:
+            self.check_schema(schema_hash)
+            normalized = normalize_question(question)
+            literals = question_literals(question)
+
+            # Exact repeats do not need an embedding at all
+            exact = self.collection.get(
+                ids=[self.entry_id(normalized, schema_hash)], include=["metadatas"]
+            )
+            if exact.get("ids"):
+                logger.info(f"Semantic cache exact hit for: {normalized}")
+                return exact["metadatas"][0]["sql"]
+
+            neighbours = self.collection.query(
+                query_embeddings=embed_texts([normalized]),
+                n_results=self.n_results,
+                where={"$and": [{"kind": ENTRY_KIND}, {"schema_hash": schema_hash}]},
+                include=["metadatas", "distances"],
+            )
+            for metadata, distance in zip(
+                neighbours["metadatas"][0], neighbours["distances"][0]
+            ):
+                if metadata.get("literals") != literals:
+                    continue
+                if not sql_literals_in(metadata["sql"], normalized):
+                    continue
+                similarity = distance_to_similarity(distance)
+                if similarity >= self.threshold:
+                    logger.info(
+                        f"Semantic cache hit ({similarity:.3f}) for: {normalized}"
+                    )
+                    return metadata["sql"]
+        except Exception as e:
+            logger.error(f"Error reading semantic cache: {e}")
+        cache_misses.inc()
+        return None
+
+    def record_replay(self, validated: bool) -> None:
+        """Count a lookup as a hit only if its SQL executed successfully."""
+        if validated:
+            cache_hits.inc()
+        else:
+            cache_misses.inc()
+
+    def store(self, question: str, sql: str, schema_hash: str) -> None:
+        """Remember SQL that executed successfully for a question.
+
+        Args:
+            question (str): The user question.
+            sql (str): The validated SQL.
+            schema_hash (str): The fingerprint of the schema the SQL ran against.
+        """
+        if not SEMANTIC_CACHE_ENABLED:
+            return
+        try:
+            normalized = normalize_question(question)
+            self.collection.upsert(
+                ids=[self.entry_id(normalized, schema_hash)],
+                embeddings=embed_texts([normalized]),
+                documents=[normalized],
+                metadatas=[
+                    {
+                        "kind": ENTRY_KIND,
+                        "schema_hash": schema_hash,
+                        "sql": sql,
+                        "literals": question_literals(question),
+                    }
+                ],
+            )
+            logger.info(f"Semantic cache stored SQL for: {normalized}")
+        except Exception as e:
+            logger.error(f"Error writing semantic cache: {e}")
+
+
+semantic_cache = SemanticQueryCache()
@@ -0,0 +1,81 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import asyncio
+import threading
+from typing import Any, Callable
+from backend.log import logger
+
+
+class ServiceRegistry:
+    """
+    Heavy clients created on first use instead of at import time.
+
+    Modules register a factory when they are imported; the client (and the
+    libraries it needs) is only built when something asks for it. A broker
+    that is down therefore fails the call that needs it, not the startup,
+    and a failed factory is retried on the next call.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        """Register the factory of a service.
+
+        Args:
+            name (str): The service name.
+            factory (Callable): Builds the service; called at most once.
+        """
+        with self._guard:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """Return a service, building it on first use.
+
+        Args:
+            name (str): The service name.
+
+        Returns:
+            Any: The service instance.
+
+        Raises:
+            KeyError: If no factory is registered under `name`.
+        """
+        try:
+            return self._instances[name]
+        except KeyError:
+            pass
+        with self._guard:
+            factory = self._factories[name]
+            lock = self._locks[name]
+        # Concurrent first calls build the service only once
+        with lock:
+            if name not in self._instances:
+                self._instances[name] = factory()
+                logger.info(f"Service {name} initialized")
+            return self._instances[name]
+
+    async def aget(self, name: str) -> Any:
+        """Like `get`, but builds the service off the event loop."""
+        if name in self._instances:
+            return self._instances[name]
+        return await asyncio.to_thread(self.get, name)
+
+    def initialized(self, name: str) -> bool:
+        return name in self._instances
+
+
+services = ServiceRegistry()
@@ -0,0 +1,282 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import re
+from collections import defaultdict
+from typing import Optional
+import sqlglot
+from sqlglot import exp
+from pydantic import BaseModel
+from prometheus_client import Counter
+from sqlalchemy.sql import text
+from dotenv import load_dotenv
+from backend.database import SQL_GUARD_TIMEOUT_MS
+from backend.cache import canonical_sql, is_write_statement
+from backend.log import logger
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+SQL_GUARD_ENABLED = os.getenv("SQL_GUARD_ENABLED", "true").lower() == "true"
+# LIMIT injected into (or enforced on) every generated SELECT
+SQL_GUARD_MAX_ROWS = int(os.getenv("SQL_GUARD_MAX_ROWS", "10000"))
+# Plans whose EXPLAIN estimate examines more rows than this are over budget
+SQL_GUARD_EXPLAIN_MAX_ROWS = int(os.getenv("SQL_GUARD_EXPLAIN_MAX_ROWS", "1000000"))
+# What to do with an over-budget plan: "reject" it or "cap" its LIMIT
+SQL_GUARD_OVER_BUDGET = os.getenv("SQL_GUARD_OVER_BUDGET", "reject").lower()
+# LIMIT used for over-budget plans when SQL_GUARD_OVER_BUDGET is "cap"
+SQL_GUARD_CAPPED_ROWS = int(os.getenv("SQL_GUARD_CAPPED_ROWS", "1000"))
+
+guard_limits = Counter(
+    "sql_guard_limits_total", "Generated SELECTs whose LIMIT was added or lowered"
+)
+guard_rejections = Counter(
+    "sql_guard_rejections_total", "Generated SQL rejected by the cost guard", ["reason"]
+)
+
+
+class QueryRejected(ValueError):
+    """Raised when the cost guard refuses to run a statement."""
+
+
+class GuardedQuery(BaseModel):
+    sql: str  # The SQL reported to the user, with the enforced LIMIT
+    limit: Optional[int] = None  # The row limit in effect, if any
+    timeout_ms: Optional[int] = None  # Set when the statement carries the hint
+    decisions: list[str] = []
+
+    @property
+    def executable_sql(self) -> str:
+        """The SQL sent to MySQL, including the MAX_EXECUTION_TIME hint."""
+        if self.timeout_ms is None:
+            return self.sql
+        tree = sqlglot.parse_one(self.sql, read="mysql")
+        first_select(tree).set(
+            "hint",
+            exp.Hint(
+                expressions=[
+                    exp.Anonymous(
+                        this="MAX_EXECUTION_TIME",
+                        expressions=[exp.Literal.number(self.timeout_ms)],
+                    )
+                ]
+            ),
+        )
+        return tree.sql(dialect="mysql")
+
+
+def first_select(tree: exp.Expression) -> Optional[exp.Select]:
+    """Return the SELECT that has to carry statement-level optimizer hints.
+
+    MySQL only accepts MAX_EXECUTION_TIME after the first SELECT keyword, so
+    statements starting with a CTE are left to the session-level timeout.
+    """
+    while True:
+        if any(isinstance(arg, exp.With) for arg in tree.args.values()):
+            return None
+        if not isinstance(tree, exp.Union):
+            break
+        tree = tree.this
+    return tree if isinstance(tree, exp.Select) else None
+
+
+def side_effect(sql: str, tree: Optional[exp.Expression]) -> Optional[str]:
+    """Name what a read statement would do besides returning rows.
+
+    SELECT ... INTO writes a file or variables and FOR UPDATE / LOCK IN SHARE
+    MODE take row locks, neither of which generated SQL may do. sqlglot
+    can't parse INTO OUTFILE/DUMPFILE, so those are found in the text.
+
+    Args:
+        sql (str): The statement.
+        tree (Optional[exp.Expression]): Its parse tree, None if unparsable.
+
+    Returns:
+        Optional[str]: "into" or "lock", None for a plain read.
+    """
+    code = re.sub(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"", "''", sql)
+    if re.search(r"\binto\s+(outfile|dumpfile)\b", canonical_sql(code)):
+        return "into"
+    for select in tree.find_all(exp.Select) if tree is not None else []:
+        if select.args.get("into") is not None:
+            return "into"
+        if select.args.get("locks"):
+            return "lock"
+    return None
+
+
+def limit_value(tree: exp.Expression) -> Optional[int]:
+    limit = tree.args.get("limit")
+    if limit is None:
+        return None
+    value = limit.expression
+    if isinstance(value, exp.Literal) and not value.is_string:
+        return int(value.this)
+    return None
+
+
+class QueryGuard:
+    """
+    Bounds the cost of LLM-generated SQL before it reaches MySQL: only single
+    read statements are allowed, every SELECT gets a LIMIT and a
+    MAX_EXECUTION_TIME hint, and plans with a large EXPLAIN estimate are
+    rejected or capped.
+    """
+
+    def __init__(
+        self,
+        max_rows=SQL_GUARD_MAX_ROWS,
+        timeout_ms=SQL_GUARD_TIMEOUT_MS,
+        explain_max_rows=SQL_GUARD_EXPLAIN_MAX_ROWS,
+        over_budget=SQL_GUARD_OVER_BUDGET,
+        capped_rows=SQL_GUARD_CAPPED_ROWS,
+    ):
+        self.max_rows = max_rows
+        self.timeout_ms = timeout_ms
+        self.explain_max_rows = explain_max_rows
+        self.over_budget = over_budget
+        self.capped_rows = capped_rows
+
+    def prepare(self, sql: str) -> GuardedQuery:
+        """Rewrite a statement so that its result size and runtime are bounded.
+
+        Args:
+            sql (str): The generated SQL.
+
+        Returns:
+            GuardedQuery: The rewritten SQL and the decisions taken.
+
+        Raises:
+            QueryRejected: If the statement is not a single read-only query.
+        """
+        if not SQL_GUARD_ENABLED:
+            return GuardedQuery(sql=sql)
+        if is_write_statement(sql):
+            guard_rejections.labels(reason="write").inc()
+            raise QueryRejected("Only read-only queries can be executed")
+        try:
+            tree = sqlglot.parse_one(sql, read="mysql")
+        except sqlglot.errors.ParseError:
+            tree = None
+        reason = side_effect(sql, tree)
+        if reason is not None:
+            guard_rejections.labels(reason=reason).inc()
+            raise QueryRejected(
+                "Only read-only queries can be executed: SELECT ... INTO and "
+                "locking reads are not allowed"
+            )
+        if tree is None:
+            # MySQL reports the syntax error, the read-only session still applies
+            return GuardedQuery(sql=sql)
+        if not isinstance(tree, (exp.Select, exp.Union)):
+            return GuardedQuery(sql=sql)
+
+        guarded = GuardedQuery(sql=sql)
+        current = limit_value(tree)
+        if current is None and tree.args.get("limit") is None:
+            tree = tree.limit(self.max_rows)
+            guarded.decisions.append(f"Added LIMIT {self.max_rows}")
+        elif current is not None and current > self.max_rows:
+            tree.args["limit"].set("expression", exp.Literal.number(self.max_rows))
+            guarded.decisions.append(
+                f"Lowered LIMIT {current} to the maximum of {self.max_rows}"
+            )
+        if guarded.decisions:
+            guard_limits.inc()
+            guarded.sql = tree.sql(dialect="mysql")
+        guarded.limit = limit_value(tree)
+
+        if self.timeout_ms > 0 and first_select(tree) is not None:
+            guarded.timeout_ms = self.timeout_ms
+        return guarded
+
+    async def admit(self, guarded: GuardedQuery, session) -> GuardedQuery:
+        """Check the EXPLAIN estimate of a prepared statement.
+
+        Args:
+            guarded (GuardedQuery): The output of `prepare`.
+            session (AsyncSession): The read-only session the query runs on.
+
+        Returns:
+            GuardedQuery: The statement to execute, capped if over budget.
+
+        Raises:
+            QueryRejected: If the plan is over budget and capping is disabled.
+        """
+        if not SQL_GUARD_ENABLED or self.explain_max_rows <= 0:
+            return guarded
+        estimate = await self.estimate_rows(guarded.sql, session)
+        if estimate is None or estimate <= self.explain_max_rows:
+            return guarded
+
+        logger.warning(f"Query over budget (~{estimate} rows): {guarded.sql}")
+        if self.over_budget != "cap" or guarded.limit is None:
+            guard_rejections.labels(reason="explain").inc()
+            raise QueryRejected(
+                f"Rejected: the query would examine about {estimate:,} rows "
+                f"(limit {self.explain_max_rows:,}). Filter or aggregate the "
+                "data further."
+            )
+
+        capped = guarded.model_copy(deep=True)
+        if capped.limit > self.capped_rows:
+            tree = sqlglot.parse_one(capped.sql, read="mysql")
+            tree.args["limit"].set("expression", exp.Literal.number(self.capped_rows))
+            capped.sql = tree.sql(dialect="mysql")
+            capped.limit = self.capped_rows
+        capped.decisions.append(
+            f"Estimated {estimate:,} rows examined (budget "
+            f"{self.explain_max_rows:,}), result capped at {capped.limit} rows"
+        )
+        return capped
+
+    async def estimate_rows(self, sql: str, session) -> Optional[int]:
+        """Estimate the rows a statement examines from its EXPLAIN plan.
+
+        Tables joined within one SELECT multiply (nested loops), separate
+        SELECTs of the statement add up.
+
+        Args:
+            sql (str): The statement.
+            session (AsyncSession): The database session.
+
+        Returns:
+            Optional[int]: The estimate, or None if MySQL could not explain it.
+        """
+        try:
+            plan = (await session.execute(text(f"EXPLAIN {sql}"))).mappings().all()
+        except Exception as e:
+            # Invalid SQL fails again on execution with a better error message
+            logger.debug(f"EXPLAIN failed: {e}")
+            return None
+
+        per_select = defaultdict(lambda: 1.0)
+        for step in plan:
+            rows = step.get("rows")
+            if rows is None:
+                continue
+            filtered = step.get("filtered")
+            fraction = float(filtered) / 100 if filtered is not None else 1.0
+            per_select[step.get("id")] *= max(float(rows) * fraction, 1.0)
+        return int(sum(per_select.values()))
+
+    def truncation_notice(self, guarded: GuardedQuery, row_count: int) -> Optional[str]:
+        """Explain that a result stopped at a limit enforced by the guard."""
+        if guarded.limit is None or row_count < guarded.limit:
+            return None
+        # SQL replayed from a cache already carries the limit the guard added
+        if guarded.decisions or guarded.limit in (self.max_rows, self.capped_rows):
+            return f"Result truncated at {guarded.limit} rows"
+        return None
+
+
+query_guard = QueryGuard()
@@ -0,0 +1,157 @@
+import os
+import sys
+
+# Get the absolute path of the current file
+current_file_path = os.path.abspath(__file__)
+# Get the directory path of the current file
+current_dir_path = os.path.dirname(current_file_path)
+# Get the parent directory path
+parent_dir_path = os.path.dirname(current_dir_path)
+# Add the parent directory path to the sys.path
+sys.path.insert(0, parent_dir_path)
+import difflib
+from typing import Optional
+import sqlglot
+from sqlglot import exp
+from pydantic import BaseModel
+from prometheus_client import Counter
+from dotenv import load_dotenv
+from backend.log import logger
+
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Minimum difflib ratio for an identifier to be replaced by a schema name
+SQL_REPAIR_CUTOFF = float(os.getenv("SQL_REPAIR_CUTOFF", "0.8"))
+
+local_repairs = Counter(
+    "sql_local_repairs_total", "Generated SQL statements repaired without the LLM"
+)
+local_rejections = Counter(
+    "sql_local_rejections_total", "Generated SQL statements rejected before execution"
+)
+
+
+class ValidationResult(BaseModel):
+    sql: str  # The (possibly repaired) SQL
+    valid: bool = True
+    errors: list[str] = []
+    repairs: list[str] = []  # e.g. "column sales.unit_sold -> units_sold"
+
+    @property
+    def repaired(self) -> bool:
+        return bool(self.repairs)
+
+
+def closest(name: str, candidates: list[str]) -> Optional[str]:
+    """Return the schema identifier closest to `name`, if close enough."""
+    by_lower = {c.lower(): c for c in candidates}
+    if name.lower() in by_lower:
+        return by_lower[name.lower()]
+    match = difflib.get_close_matches(
+        name.lower(), list(by_lower), n=1, cutoff=SQL_REPAIR_CUTOFF
+    )
+    return by_lower[match[0]] if match else None
+
+
+def validate_sql(sql: str, schema: dict[str, list[str]]) -> ValidationResult:
+    """Check generated SQL against the schema and repair identifier typos.
+
+    Syntax errors and unknown tables or columns are reported without a
+    database round trip. Unknown identifiers that closely match a schema name
+    are rewritten to that name.
+
+    Args:
+        sql (str): The generated SQL.
+        schema (dict[str, list[str]]): Column names per table. An empty schema
+            disables the identifier checks.
+
+    Returns:
+        ValidationResult: The outcome, with the repaired SQL if anything changed.
+    """
+    try:
+        statements = [s for s in sqlglot.parse(sql, read="mysql") if s is not None]
+    except sqlglot.errors.ParseError as e:
+        local_rejections.inc()
+        return ValidationResult(sql=sql, valid=False, errors=[f"Syntax error: {e}"])
+    if len(statements) != 1:
+        local_rejections.inc()
+        return ValidationResult(
+            sql=sql, valid=False, errors=["Expected exactly one SQL statement"]
+        )
+    if not schema:
+        return ValidationResult(sql=sql)
+
+    tree = statements[0]
+    result = ValidationResult(sql=sql)
+    table_names = list(schema)
+    columns_lower = {t: {c.lower() for c in cols} for t, cols in schema.items()}
+
+    # Names defined inside the statement itself (CTEs, derived tables, aliases)
+    local_sources = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    local_sources |= {
+        sub.alias_or_name.lower() for sub in tree.find_all(exp.Subquery) if sub.alias
+    }
+    output_aliases = {a.alias.lower() for a in tree.find_all(exp.Alias)}
+
+    sources = {}  # alias or table name -> schema table
+    for table in tree.find_all(exp.Table):
+        name = table.name
+        if name.lower() in local_sources:
+            # e.g. `FROM totals AS t` where `totals` is a CTE
+            local_sources.add(table.alias_or_name.lower())
+            continue
+        if name not in schema:
+            match = closest(name, table_names)
+            if match is None:
+                result.errors.append(f"Unknown table `{name}`")
+                continue
+            table.set("this", exp.to_identifier(match))
+            result.repairs.append(f"table {name} -> {match}")
+            name = match
+        sources[table.alias_or_name.lower()] = name
+        sources[name.lower()] = name
+
+    in_scope = sorted(set(sources.values()))
+    for column in tree.find_all(exp.Column):
+        if isinstance(column.this, exp.Star):
+            continue
+        name = column.name
+        qualifier = column.table.lower()
+
+        if qualifier:
+            if qualifier in local_sources:
+                continue
+            table = sources.get(qualifier)
+            if table is None:
+                result.errors.append(f"Unknown table or alias `{column.table}`")
+                continue
+            candidates = schema[table]
+        else:
+            # Unqualified names may come from derived tables we can't resolve
+            if local_sources or name.lower() in output_aliases:
+                continue
+            candidates = [c for t in in_scope for c in schema[t]]
+            table = None
+
+        if (table and name.lower() in columns_lower[table]) or (
+            not table and name.lower() in {c.lower() for c in candidates}
+        ):
+            continue
+        match = closest(name, candidates)
+        if match is None:
+            where = f" in `{table}`" if table else ""
+            result.errors.append(f"Unknown column `{name}`{where}")
+            continue
+        column.set("this", exp.to_identifier(match))
+        result.repairs.append(f"column {column.table or '?'}.{name} -> {match}")
+
+    if result.errors:
+        result.valid = False
+        local_rejections.inc()
+    elif result.repairs:
+        result.sql = tree.sql(dialect="mysql")
+        local_repairs.inc()
+        logger.info(f"Repaired SQL locally: {result.repairs}")
+    return result
@@ -9,18 +9,69 @@ current_dir_path = os.path.dirname(current_file_path)
 parent_dir_path = os.path.dirname(current_dir_path)
 # Add the parent directory path to the sys.path
 sys.path.insert(0, parent_dir_path)
-import chromadb
 from backend.log import logger
+from backend.services import services
 from dotenv import load_dotenv
 
 
 # Load environment variables from .env file
 load_dotenv()
 
-chromadb_database = os.getenv("chromadb_database")
+chromadb_database = os.getenv("chromadb_database", "data_analyzer")
 
-client = chromadb.PersistentClient()
-collection = client.get_or_create_collection(chromadb_database)
+
+def create_collection():
+    import chromadb
+
+    client = chromadb.PersistentClient()
+    return client.get_or_create_collection(chromadb_database)
+
+
+def create_embedding_function():
+    from chromadb.utils import embedding_functions
+
+    return embedding_functions.DefaultEmbeddingFunction()
+
+
+services.register("chroma_collection", create_collection)
+# Sentence embedding model shared by every caller that needs text embeddings
+services.register("embedding_function", create_embedding_function)
+
+
+def get_collection():
+    """Return the Chroma collection, opening the database on first use."""
+    return services.get("chroma_collection")
+
+
+def embed_texts(texts: list) -> list:
+    """Embed a list of texts with the shared embedding model.
+
+    Args:
+        texts (list): The texts to embed.
+
+    Returns:
+        list: One embedding (list of floats) per text.
+    """
+    embedding_function = services.get("embedding_function")
+    return [list(map(float, vector)) for vector in embedding_function(texts)]
+
+
+def distance_to_similarity(distance: float) -> float:
+    """Convert a Chroma distance from the collection into a cosine similarity.
+
+    The default embedding model returns unit-length vectors, so a squared L2
+    distance maps directly onto cosine similarity.
+
+    Args:
+        distance (float): The distance returned by `collection.query`.
+
+    Returns:
+        float: The cosine similarity in the range [-1, 1].
+    """
+    space = (get_collection().metadata or {}).get("hnsw:space", "l2")
+    if space in ("cosine", "ip"):
+        return 1.0 - distance
+    return 1.0 - distance / 2.0
 
 
 def add_vector(id: str, vector: list) -> None:
@@ -30,7 +81,7 @@ def add_vector(id: str, vector: list) -> None:
         id (str): The ID of the vector.
         vector (list): The vector data.
     """
-    collection.add(id=id, embedding=vector)
+    get_collection().add(ids=[id], embeddings=[vector])
 
 
 def query_vector(vector: list) -> list:
@@ -42,4 +93,4 @@ def query_vector(vector: list) -> list:
     Returns:
         list: The top 10 similar vectors.
     """
-    return collection.query(query_embeddings=[vector], n_results=10)
+    return get_collection().query(query_embeddings=[vector], n_results=10)
@@ -0,0 +1,95 @@
+"""Fail when importing the API gets slower than its budget.
+
+Runs `python -X importtime -c "import backend.app"` in a fresh interpreter,
+reports the slowest top-level imports and exits with status 1 when the total
+exceeds the budget or a lazily loaded library is imported at startup.
+
+Usage:
+    python benchmarks/import_time.py --budget-ms 3000
+"""
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that must only be imported on first use (see backend/services.py)
+LAZY_MODULES = ("dspy", "litellm", "chromadb", "kafka", "pandas", "pymongo")
+
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def measure(module: str) -> list[tuple[str, int, int]]:
+    """Import `module` in a fresh interpreter.
+
+    Returns:
+        list: `(name, cumulative_us, depth)` for `module` and everything it
+            imported, `module` last.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        sys.stderr.write(process.stderr)
+        raise SystemExit(f"Importing {module} failed")
+
+    imports = []
+    for line in process.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            _, cumulative, indent, name = match.groups()
+            imports.append((name, int(cumulative), (len(indent) - 1) // 2))
+    # Drop the interpreter's own imports (site, encodings) listed before it
+    start = max(i for i, item in enumerate(imports[:-1]) if item[2] == 0) + 1
+    return imports[start:]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="backend.app")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        # About twice the 1.2-1.9 s measured locally: shared CI runners are
+        # noisy, and the eager-import check below catches regressions exactly
+        default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "3000")),
+    )
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # The fastest run is the least disturbed by the machine
+    runs = [measure(args.module) for _ in range(args.runs)]
+    imports = min(runs, key=lambda run: run[-1][1])
+    total_ms = imports[-1][1] / 1000
+
+    print(f"import {args.module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f})")
+    top_level = [item for item in imports if item[2] == 1]
+    for name, cumulative, _ in sorted(top_level, key=lambda i: -i[1])[: args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = sorted(
+        {name for name, _, _ in imports if name.split(".")[0] in LAZY_MODULES}
+        & set(LAZY_MODULES)
+    )
+    if eager:
+        print(f"FAIL: imported at startup, not on first use: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        over = total_ms - args.budget_ms
+        print(f"FAIL: import time exceeds the budget by {over:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Login throughput versus the latency of concurrent requests.
+
+Simulates a login storm (bcrypt verifications) while measuring how long a
+trivial `asyncio.to_thread` call, standing in for sync endpoints and the
+blocking work of queries, waits for the shared threadpool. Two modes are
+compared:
+
+- threadpool: bcrypt on the shared threadpool (the old `asyncio.to_thread`)
+- process: bcrypt on the dedicated `password_hasher` process pool
+
+Usage:
+    python benchmarks/login_load.py --logins 200 --concurrency 50
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.password_hashing import (  # noqa: E402
+    HashingOverloaded,
+    PasswordHasher,
+    password_context,
+)
+
+PASSWORD = "correct horse battery staple"
+
+
+async def login_storm(mode, hasher, hashed, logins, concurrency) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    rejected = 0
+
+    async def login():
+        nonlocal rejected
+        async with semaphore:
+            if mode == "threadpool":
+                await asyncio.to_thread(password_context.verify, PASSWORD, hashed)
+                return
+            try:
+                await hasher.verify(PASSWORD, hashed)
+            except HashingOverloaded:
+                rejected += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[login() for _ in range(logins)])
+    elapsed = time.perf_counter() - start
+    return {"elapsed": elapsed, "rejected": rejected}
+
+
+async def probe(stop: asyncio.Event, interval: float) -> list:
+    """Latency of a no-op threadpool call, sampled until `stop` is set."""
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.to_thread(lambda: None)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+def percentile(values, q) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] * 1000
+
+
+async def run(mode, args) -> None:
+    hasher = PasswordHasher(workers=args.workers, max_pending=args.max_pending)
+    hashed = password_context.hash(PASSWORD)
+    if mode == "process":
+        hasher.warm_up()
+        await hasher.verify(PASSWORD, hashed)
+
+    stop = asyncio.Event()
+    # Several probes keep the threadpool queue busy like concurrent requests
+    probes = [
+        asyncio.create_task(probe(stop, args.probe_interval))
+        for _ in range(args.probes)
+    ]
+    storm = await login_storm(mode, hasher, hashed, args.logins, args.concurrency)
+    stop.set()
+    latencies = [value for task in probes for value in await task]
+    hasher.shutdown()
+
+    accepted = args.logins - storm["rejected"]
+    print(
+        f"{mode:>10}: {accepted / storm['elapsed']:7.1f} logins/s, "
+        f"{storm['rejected']} rejected | threadpool wait "
+        f"p50 {percentile(latencies, 0.5):6.2f} ms, "
+        f"p99 {percentile(latencies, 0.99):6.2f} ms, "
+        f"mean {statistics.mean(latencies) * 1000:6.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--probes", type=int, default=4)
+    parser.add_argument("--probe-interval", type=float, default=0.005)
+    parser.add_argument(
+        "--mode", choices=("threadpool", "process", "both"), default="both"
+    )
+    args = parser.parse_args()
+
+    modes = ("threadpool", "process") if args.mode == "both" else (args.mode,)
+    for mode in modes:
+        asyncio.run(run(mode, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ let accessToken = localStorage.getItem('access_token');
 let chartInstance = null;
 // Open WebSocket connection
 let websocket = null;
+// State of the answer currently streamed over the WebSocket
+let currentAnswer = null;
 let port = 8005;
 let host = 'localhost';
 
@@ -28,8 +30,8 @@ function openWebSocket() {
     };
 
     websocket.onmessage = (event) => {
-            console.log("Message received from server:", event.data);
-    }
+        handleQueryEvent(JSON.parse(event.data));
+    };
 
     websocket.onerror = (error) => {
         console.error("WebSocket error:", error);
@@ -66,6 +68,7 @@ async function login() {
         document.getElementById("login-section").style.display = "none";
         document.getElementById("chat-section").style.display = "block";
         openWebSocket();
+        fetchQuestions();  // Served from the precomputed catalogue
     } catch (error) {
         alert("Login failed: " + error.message);
     }
@@ -106,51 +109,23 @@ async function sendMessage() {
     appendMessage("You", userMessage);
     document.getElementById("user-message").value = "";
 
-    try {
-        // Sending the message via WebSocket
-        if (websocket && websocket.readyState === WebSocket.OPEN) {
-            websocket.send(JSON.stringify({ query: userMessage }));
-        }
-
-        const questions_response = await fetch(`http://${host}:${port}/business_questions/`, {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json",
-                "Authorization": `Bearer ${accessToken}`, // Correct Authorization format
-            },
-            body: JSON.stringify({ query: userMessage })
-        });
-        const questions = await questions_response.json();
+    // The WebSocket streams every stage; fall back to plain HTTP without it
+    if (websocket && websocket.readyState === WebSocket.OPEN) {
+        currentAnswer = { columns: [], data: [], description: null };
+        websocket.send(JSON.stringify({ query: userMessage }));
+        return;
+    }
 
-        const sql_response = await fetch(`http://${host}:${port}/execute_query/`, {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json",
-                "Authorization": `Bearer ${accessToken}`, // Correct Authorization format
-            },
-            body: JSON.stringify({ query: userMessage })
-        });
-        const data = await sql_response.json();
+    try {
+        // Rows are rendered chunk by chunk while the query is still streaming
+        const data = { data: await streamQuery(userMessage) };
 
-        const description_response = await fetch(`http://${host}:${port}/chart_description/`, {
-            method: "POST",
-            headers: {
-                "Content-Type": "application/json",
-                "Authorization": `Bearer ${accessToken}`, // Correct Authorization format
-            },
-            body: JSON.stringify({ query: userMessage, data: data.data })
-        });
-        const description = await description_response.json();
+        // The description is shown token by token as it is generated
+        const description = await streamDescription(userMessage, data.data);
 
         console.log("userMessage:", userMessage);
         console.log("data:", data.data);
-        console.log("description:", description.description);
-        console.log("questions:", questions.questions);
-
-        appendMessage("Bot", `Here are the results: ${description.description}`);
-
-        displayTable(data.data);
-        displayChart(data.data);
+        console.log("description:", description);
     } catch (error) {
         appendMessage("Bot", "Error fetching results.");
     }
@@ -164,40 +139,195 @@ function appendMessage(sender, message) {
     messageElement.textContent = `${sender}: ${message}`; // Corrected with backticks
     chatBox.appendChild(messageElement);
     chatBox.scrollTop = chatBox.scrollHeight;
+    return messageElement;
 }
 
 
-function displayTable(data) {
+function handleQueryEvent(message) {
+    if (!currentAnswer) return;
+
+    switch (message.event) {
+        case "sql_generated":
+            appendMessage("Bot", message.cached
+                ? `Reusing SQL: ${message.sql}`
+                : `Generated SQL (attempt ${message.attempt}): ${message.sql}`);
+            break;
+        case "retry":
+            appendMessage("Bot", `Attempt ${message.attempt} failed: ${message.reason || message.error}`);
+            break;
+        case "result":
+            currentAnswer.columns = message.columns;
+            (message.guard || []).forEach(decision => appendMessage("Guard", decision));
+            startTable(message.columns);
+            startChart();
+            break;
+        case "rows": {
+            const columns = currentAnswer.columns;
+            const records = message.rows.map(row =>
+                Object.fromEntries(columns.map((column, i) => [column, row[i]]))
+            );
+            currentAnswer.data.push(...records);
+            appendTableRows(records);
+            appendChartData(records);
+            break;
+        }
+        case "description_token":
+            if (!currentAnswer.description) {
+                currentAnswer.description = appendMessage("Bot", "Here are the results: ");
+            }
+            currentAnswer.description.textContent += message.token;
+            break;
+        case "done":
+            console.log("data:", currentAnswer.data);
+            currentAnswer = null;
+            break;
+        case "error":
+            appendMessage("Bot", `Error fetching results: ${message.detail}`);
+            currentAnswer = null;
+            break;
+        default:
+            console.log("Message received from server:", message);
+    }
+}
+
+
+async function streamQuery(userMessage) {
+    const response = await fetch(`http://${host}:${port}/execute_query/stream?format=ndjson`, {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json",
+            "Authorization": `Bearer ${accessToken}`,
+        },
+        body: JSON.stringify({ query: userMessage })
+    });
+
+    if (!response.ok) {
+        throw new Error(`HTTP error! Status: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const data = [];
+    let columns = [];
+    let buffer = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();  // Keep the incomplete last line for the next read
+
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            const message = JSON.parse(line);
+
+            if (message.columns) {
+                columns = message.columns;
+                // Tell the user why the query was limited by the cost guard
+                (message.guard || []).forEach(decision => appendMessage("Guard", decision));
+                startTable(columns);
+                startChart();
+                continue;
+            }
+
+            const records = message.rows.map(row =>
+                Object.fromEntries(columns.map((column, i) => [column, row[i]]))
+            );
+            data.push(...records);
+            appendTableRows(records);
+            appendChartData(records);
+        }
+    }
+    return data;
+}
+
+
+async function streamDescription(userMessage, data) {
+    const response = await fetch(`http://${host}:${port}/chart_description/stream`, {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json",
+            "Authorization": `Bearer ${accessToken}`,
+        },
+        body: JSON.stringify({ query: userMessage, data: data })
+    });
+
+    if (!response.ok) {
+        throw new Error(`HTTP error! Status: ${response.status}`);
+    }
+
+    const messageElement = appendMessage("Bot", "Here are the results: ");
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let description = "";
+    let buffer = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();  // Keep the incomplete last event for the next read
+
+        for (const event of events) {
+            const lines = event.split("\n");
+            const name = lines.find(line => line.startsWith("event: "));
+            const payload = lines.find(line => line.startsWith("data: "));
+            if (!payload) continue;
+
+            const message = JSON.parse(payload.slice(6));
+            if (name === "event: error") throw new Error(message.detail);
+            if (message.token) {
+                description += message.token;
+                messageElement.textContent += message.token;
+            }
+        }
+    }
+    return description;
+}
+
+
+function startTable(columns) {
     const table = document.getElementById("result-table");
     table.innerHTML = "";
     table.style.display = "table";
 
-    if (data.length === 0) return;
-
     const headerRow = document.createElement("tr");
-    Object.keys(data[0]).forEach(key => {
+    columns.forEach(key => {
         const th = document.createElement("th");
         th.textContent = key;
         headerRow.appendChild(th);
     });
     table.appendChild(headerRow);
+}
+
+function appendTableRows(rows) {
+    const table = document.getElementById("result-table");
+    const fragment = document.createDocumentFragment();
 
-    data.forEach(row => {
+    rows.forEach(row => {
         const tr = document.createElement("tr");
         Object.values(row).forEach(value => {
             const td = document.createElement("td");
             td.textContent = value;
             tr.appendChild(td);
         });
-        table.appendChild(tr);
+        fragment.appendChild(tr);
     });
+    table.appendChild(fragment);
 }
 
-function displayChart(data) {
-    if (!data.length) return;
+function displayTable(data) {
+    if (data.length === 0) return;
+
+    startTable(Object.keys(data[0]));
+    appendTableRows(data);
+}
 
-    const labels = data.map(row => row[Object.keys(row)[0]]);
-    const values = data.map(row => row[Object.keys(row)[1]]);
+function startChart() {
     const ctx = document.getElementById("result-chart").getContext("2d");
     document.getElementById("result-chart").style.display = "block";
 
@@ -208,16 +338,17 @@ function displayChart(data) {
     chartInstance = new Chart(ctx, {
         type: "bar",
         data: {
-            labels,
+            labels: [],
             datasets: [{
                 label: "Query Results",
-                data: values,
+                data: [],
                 backgroundColor: "#007bff"
             }]
         },
         options: {
             responsive: true,
             maintainAspectRatio: false,
+            animation: false,
             scales: {
                 y: { beginAtZero: true }
             }
@@ -225,6 +356,24 @@ function displayChart(data) {
     });
 }
 
+function appendChartData(rows) {
+    if (!chartInstance || !rows.length) return;
+
+    const keys = Object.keys(rows[0]);
+    rows.forEach(row => {
+        chartInstance.data.labels.push(row[keys[0]]);
+        chartInstance.data.datasets[0].data.push(row[keys[1]]);
+    });
+    chartInstance.update("none");
+}
+
+function displayChart(data) {
+    if (!data.length) return;
+
+    startChart();
+    appendChartData(data);
+}
+
 
 async function fetchQuestions() {
     try {
@@ -0,0 +1,68 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from backend import coalesce
+from backend.coalesce import LOCK_PREFIX, RESULT_PREFIX, Coalescer
+from backend.schemas import QueryResult
+
+
+@pytest.fixture(autouse=True)
+def redis_server(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        coalesce,
+        "get_async_redis",
+        lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+    )
+    return server
+
+
+def test_concurrent_callers_share_one_execution():
+    calls = []
+
+    async def resolve():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return QueryResult(sql="SELECT 1", rows=[[1]])
+
+    async def main():
+        coalescer = Coalescer()
+        return await asyncio.gather(*[coalescer.run("key", resolve) for _ in range(5)])
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [leader for _, leader in results].count(True) == 1
+    assert all(result.rows == [[1]] for result, _ in results)
+
+
+def test_follower_reads_the_result_of_another_replica(redis_server):
+    async def resolve():
+        raise AssertionError("the other replica is running this question")
+
+    async def main():
+        client = fakeredis.aioredis.FakeRedis(server=redis_server)
+        await client.set(f"{LOCK_PREFIX}key", "other-replica")
+        await client.set(
+            f"{RESULT_PREFIX}key", QueryResult(sql="SELECT 2").model_dump_json()
+        )
+        return await Coalescer().run("key", resolve)
+
+    result, leader = asyncio.run(main())
+    assert not leader
+    assert result.sql == "SELECT 2"
+
+
+def test_leader_releases_its_lock(redis_server):
+    async def resolve():
+        return QueryResult(sql="SELECT 3")
+
+    async def main():
+        result = await Coalescer().run("key", resolve)
+        client = fakeredis.aioredis.FakeRedis(server=redis_server)
+        return result, await client.exists(f"{LOCK_PREFIX}key")
+
+    (result, leader), locked = asyncio.run(main())
+    assert leader and result.sql == "SELECT 3"
+    assert not locked
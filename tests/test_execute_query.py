@@ -0,0 +1,56 @@
+import asyncio
+
+import fakeredis
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.sql import text
+
+pytest.importorskip("dspy")
+
+from backend import cache, main, sql_guard  # noqa: E402
+from backend.main import AgentSystem  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        cache,
+        "get_async_redis",
+        lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+    )
+    # SQLite has neither information_schema nor EXPLAIN rows
+    monkeypatch.setattr(sql_guard, "SQL_GUARD_ENABLED", False)
+
+
+async def run_select_around_external_write(monkeypatch):
+    stamps = ["2024-01-01T00:00:00"]
+
+    async def table_update_times(session, tables):
+        return list(stamps)
+
+    monkeypatch.setattr(main, "table_update_times", table_update_times)
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.execute(text("CREATE TABLE sales (id INTEGER, total INTEGER)"))
+        await connection.execute(text("INSERT INTO sales VALUES (1, 10)"))
+
+    agent = AgentSystem(dataset_information="")
+    select = "SELECT total FROM sales"
+    async with engine.connect() as connection:
+        async with AsyncSession(bind=connection) as session:
+            first = await agent.execute_query(select, session)
+            second = await agent.execute_query(select, session)
+            # Another client writes the table, MySQL moves its UPDATE_TIME
+            await session.execute(text("UPDATE sales SET total = 20"))
+            stamps[0] = "2024-01-01T00:00:05"
+            third = await agent.execute_query(select, session)
+    await engine.dispose()
+    return first, second, third
+
+
+def test_external_write_misses_cached_select(monkeypatch):
+    first, second, third = asyncio.run(run_select_around_external_write(monkeypatch))
+    assert (first.cached, first.rows) == (False, [[10]])
+    assert (second.cached, second.rows) == (True, [[10]])
+    assert (third.cached, third.rows) == (False, [[20]])
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+dspy = pytest.importorskip("dspy")
+
+from backend.llm import llm_client  # noqa: E402
+from backend.main import AgentSystem, GroqLM  # noqa: E402
+
+COMPLETION = "[[ ## generated_sql ## ]]\nSELECT 1\n\n[[ ## completed ## ]]"
+
+
+@pytest.fixture
+def chat_calls(monkeypatch):
+    calls = []
+
+    async def chat(messages, **kwargs):
+        calls.append(
+            {"messages": messages, "loop": asyncio.get_running_loop(), **kwargs}
+        )
+        return COMPLETION
+
+    monkeypatch.setattr(llm_client, "chat", chat)
+    return calls
+
+
+def test_agent_predictions_use_llm_client(chat_calls):
+    agent = AgentSystem(dataset_information="sales(id, total)")
+
+    async def predict():
+        return await agent.sql_agent.acall(
+            user_query="How many sales?",
+            dataset_information=agent.dataset_information,
+            sql_dialect="MySQL",
+            config={"temperature": 0.7},
+        )
+
+    with dspy.context(lm=GroqLM(), cache=False):
+        response = asyncio.run(predict())
+
+    assert response.generated_sql == "SELECT 1"
+    assert len(chat_calls) == 1
+    assert chat_calls[0]["temperature"] == 0.7
+    assert chat_calls[0]["model"] == "groq/llama3-8b-8192"
+    assert "How many sales?" in chat_calls[0]["messages"][-1]["content"]
+
+
+def test_sync_predictions_run_on_the_client_loop(chat_calls, monkeypatch):
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(llm_client, "_loop", loop)
+    agent = AgentSystem(dataset_information="")
+    try:
+        with dspy.context(lm=GroqLM(), cache=False):
+            response = agent.sql_agent(
+                user_query="How many sales?",
+                dataset_information="",
+                sql_dialect="MySQL",
+            )
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    assert response.generated_sql == "SELECT 1"
+    assert chat_calls[0]["loop"] is loop
+    assert chat_calls[0]["temperature"] == 0.1
+
+
+class Completions:
+    """Stands in for the Groq API and records how many calls overlap."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+
+    async def create(self, model, temperature, max_tokens, messages):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        # The coldest candidate answers last
+        await asyncio.sleep(0.05 if temperature == 0.0 else 0.01)
+        self.in_flight -= 1
+        sql = f"SELECT id FROM unknown_{int(temperature * 10)}"
+        content = f"[[ ## generated_sql ## ]]\n{sql}\n\n[[ ## completed ## ]]"
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_speculative_candidates_share_the_client_limit(monkeypatch):
+    completions = Completions()
+    agent = AgentSystem(
+        dataset_information="", schema_index={"sales": ["id"]}, candidates=3
+    )
+
+    async def speculate():
+        monkeypatch.setattr(
+            llm_client,
+            "_client",
+            SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+        )
+        monkeypatch.setattr(llm_client, "_semaphore", asyncio.Semaphore(2))
+        monkeypatch.setattr(llm_client, "_loop", asyncio.get_running_loop())
+        return await agent.speculate("How many sales?")
+
+    with dspy.context(lm=GroqLM(), cache=False):
+        winner, prediction = asyncio.run(speculate())
+
+    assert winner is None
+    assert completions.peak == 2
+    # Candidate 0 finished last but still seeds the repair loop
+    assert prediction.generated_sql == "SELECT id FROM unknown_0"
@@ -0,0 +1,155 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+from sqlalchemy import exc, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend import history_writer as module
+from backend.database import Base
+from backend.history_writer import DEAD_LETTER_KEY, SPOOL_KEY, HistoryWriter
+from backend.models import Query
+from backend.result_store import load_result
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        module,
+        "get_async_redis",
+        lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+    )
+    return server
+
+
+async def with_database(monkeypatch, scenario):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+    monkeypatch.setattr(module, "AsyncSessionLocal", sessions)
+    try:
+        return await scenario(sessions)
+    finally:
+        await engine.dispose()
+
+
+def test_flush_writes_spooled_records(monkeypatch, redis_server):
+    async def scenario(sessions):
+        writer = HistoryWriter(batch_size=2)
+        for i in range(3):
+            await writer.enqueue(1, f"question {i}", {"rows": [[i]]})
+        written = await writer.flush()
+        spooled = await module.get_async_redis().llen(SPOOL_KEY)
+        async with sessions() as db:
+            queries = (await db.execute(select(Query).order_by(Query.id))).scalars()
+            results = [await load_result(db, q.result_digest) for q in queries]
+        return written, spooled, results
+
+    written, spooled, results = asyncio.run(with_database(monkeypatch, scenario))
+    assert (written, spooled) == (3, 0)
+    assert [json.loads(r) for r in results] == [{"rows": [[i]]} for i in range(3)]
+
+
+def test_failed_insert_keeps_the_spool(monkeypatch, redis_server):
+    async def failing_insert(batch):
+        raise RuntimeError("MySQL is down")
+
+    async def scenario(sessions):
+        writer = HistoryWriter()
+        await writer.enqueue(1, "question", [[1]])
+        monkeypatch.setattr(writer, "insert", failing_insert)
+        with pytest.raises(RuntimeError):
+            await writer.flush()
+        spooled = await module.get_async_redis().llen(SPOOL_KEY)
+        async with sessions() as db:
+            stored = (await db.execute(select(func.count(Query.id)))).scalar()
+        return spooled, stored
+
+    spooled, stored = asyncio.run(with_database(monkeypatch, scenario))
+    assert (spooled, stored) == (1, 0)
+
+
+def test_records_are_buffered_while_redis_is_down(monkeypatch):
+    class Down:
+        async def rpush(self, key, value):
+            raise ConnectionError("Redis is down")
+
+    monkeypatch.setattr(module, "get_async_redis", lambda: Down())
+    writer = HistoryWriter()
+    asyncio.run(writer.enqueue(1, "question", [[1]]))
+    assert len(writer._buffer) == 1
+
+
+def rejecting(writer, word, error):
+    insert = writer.insert
+
+    async def insert_unless_rejected(batch):
+        if any(word in json.loads(record)["query_text"] for record in batch):
+            raise error
+        await insert(batch)
+
+    return insert_unless_rejected
+
+
+def test_rejected_records_move_to_the_dead_letters(monkeypatch, redis_server):
+    monkeypatch.setattr(module, "HISTORY_MAX_ATTEMPTS", 2)
+
+    async def scenario(sessions):
+        writer = HistoryWriter()
+        for text in ("first", "bad", "last"):
+            await writer.enqueue(1, text, [[1]])
+        monkeypatch.setattr(
+            writer, "insert", rejecting(writer, "bad", ValueError("Data too long"))
+        )
+        with pytest.raises(ValueError):
+            await writer.flush()
+        written = await writer.flush()
+        client = module.get_async_redis()
+        dead = await client.lrange(DEAD_LETTER_KEY, 0, -1)
+        spooled = await client.llen(SPOOL_KEY)
+        async with sessions() as db:
+            stored = (await db.execute(select(Query.query_text))).scalars().all()
+        return written, [json.loads(r)["query_text"] for r in dead], spooled, stored
+
+    written, dead, spooled, stored = asyncio.run(with_database(monkeypatch, scenario))
+    assert (written, dead, spooled) == (2, ["bad"], 0)
+    assert sorted(stored) == ["first", "last"]
+
+
+def test_unreachable_mysql_is_retried_without_limit(monkeypatch, redis_server):
+    monkeypatch.setattr(module, "HISTORY_MAX_ATTEMPTS", 2)
+    down = exc.OperationalError("INSERT", {}, ConnectionError("MySQL is down"))
+
+    async def scenario(sessions):
+        writer = HistoryWriter()
+        await writer.enqueue(1, "question", [[1]])
+        monkeypatch.setattr(writer, "insert", rejecting(writer, "question", down))
+        for _ in range(3):
+            with pytest.raises(exc.OperationalError):
+                await writer.flush()
+        client = module.get_async_redis()
+        return await client.llen(SPOOL_KEY), await client.llen(DEAD_LETTER_KEY)
+
+    assert asyncio.run(with_database(monkeypatch, scenario)) == (1, 0)
+
+
+def test_buffered_records_are_spooled_once_redis_is_back(monkeypatch, redis_server):
+    spool = fakeredis.aioredis.FakeRedis(server=redis_server, decode_responses=True)
+
+    class Down:
+        async def rpush(self, key, *values):
+            raise ConnectionError("Redis is down")
+
+    async def scenario():
+        writer = HistoryWriter()
+        monkeypatch.setattr(module, "get_async_redis", lambda: Down())
+        await writer.enqueue(1, "while down", [[1]])
+        monkeypatch.setattr(module, "get_async_redis", lambda: spool)
+        await writer.enqueue(1, "after", [[2]])
+        records = await spool.lrange(SPOOL_KEY, 0, -1)
+        return len(writer._buffer), [json.loads(r)["query_text"] for r in records]
+
+    assert asyncio.run(scenario()) == (0, ["while down", "after"])
@@ -0,0 +1,60 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from backend import jobs
+from backend.jobs import create_job, get_job, publish_event, subscribe
+
+
+@pytest.fixture(autouse=True)
+def redis_server(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        jobs,
+        "get_async_redis",
+        lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+    )
+    return server
+
+
+async def follow_job():
+    job = await create_job(1, "How many sales?")
+    events = []
+
+    async def listen():
+        async for event in subscribe(job.job_id):
+            events.append(event)
+
+    listener = asyncio.create_task(listen())
+    while not events:
+        await asyncio.sleep(0.01)
+    await publish_event(job.job_id, "running")
+    await publish_event(job.job_id, "sql_generated", {"sql": "SELECT 1"})
+    await publish_event(job.job_id, "succeeded", {"rows": [[1]]})
+    await asyncio.wait_for(listener, 5)
+    return job, events, await get_job(job.job_id)
+
+
+def test_subscriber_follows_job_until_it_finishes():
+    job, events, finished = asyncio.run(follow_job())
+    assert [event["event"] for event in events] == [
+        "status",
+        "running",
+        "sql_generated",
+        "succeeded",
+    ]
+    assert events[0]["status"] == "queued"
+    assert (finished.status, finished.result) == ("succeeded", {"rows": [[1]]})
+
+
+async def subscribe_after_finish():
+    job = await create_job(1, "How many sales?")
+    await publish_event(job.job_id, "failed", {"error": "boom"})
+    return [event async for event in subscribe(job.job_id)]
+
+
+def test_late_subscriber_gets_the_final_state():
+    events = asyncio.run(subscribe_after_finish())
+    assert len(events) == 1
+    assert (events[0]["status"], events[0]["error"]) == ("failed", "boom")
@@ -0,0 +1,113 @@
+import asyncio
+import gzip
+import json
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+from backend import mq
+from backend.mq import EventPublisher, InMemoryProducer
+from backend.services import ServiceRegistry
+
+EVENT = {"type": "query_executed", "user_id": 1, "sql": "SELECT 1"}
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_batch_is_sent_after_linger():
+    producer = InMemoryProducer(linger_ms=50, batch_size=1 << 20)
+    for _ in range(3):
+        producer.send("events", EVENT)
+    assert producer.batches == []
+
+    assert wait_for(lambda: producer.batches)
+    assert [(topic, count) for topic, count, _ in producer.batches] == [("events", 3)]
+    assert producer.topics["events"] == [EVENT] * 3
+
+
+def test_full_batch_is_sent_without_waiting():
+    size = len(json.dumps(EVENT).encode("utf-8"))
+    producer = InMemoryProducer(linger_ms=60_000, batch_size=2 * size)
+    deliveries = [producer.send("events", EVENT) for _ in range(3)]
+
+    assert [count for _, count, _ in producer.batches] == [2]
+    assert [d.offset for d in deliveries] == [0, 1, None]
+    producer.flush()
+    assert [count for _, count, _ in producer.batches] == [2, 1]
+    assert deliveries[2].offset == 2
+
+
+@pytest.mark.parametrize("compression_type", ["gzip", None])
+def test_batches_are_compressed(compression_type):
+    producer = InMemoryProducer(linger_ms=60_000, compression_type=compression_type)
+    for _ in range(50):
+        producer.send("events", EVENT)
+    producer.flush()
+
+    ((_, count, payload),) = producer.batches
+    raw = b"\n".join([json.dumps(EVENT).encode("utf-8")] * 50)
+    if compression_type == "gzip":
+        assert len(payload) < len(raw) / 5
+        payload = gzip.decompress(payload)
+    assert (count, payload) == (50, raw)
+
+
+def counter(name):
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(mq, "KAFKA_BROKER", mq.MEMORY_BROKER)
+    registry = ServiceRegistry()
+    monkeypatch.setattr(mq, "services", registry)
+    return registry
+
+
+def test_full_buffer_drops_events(registry):
+    producer = InMemoryProducer(linger_ms=0)
+    connected = threading.Event()
+
+    def connect():
+        # The broker is slow to connect, events pile up in the buffer
+        connected.wait(5)
+        return producer
+
+    registry.register("kafka_producer", connect)
+    publisher = EventPublisher(topic="events", max_pending=1)
+    dropped = counter("kafka_events_dropped_total")
+
+    assert publisher.send({"n": 1})  # taken by the drain thread
+    assert wait_for(lambda: publisher._queue.empty())
+    assert publisher.send({"n": 2})  # fills the buffer
+    assert not publisher.send({"n": 3})
+    assert not asyncio.run(publisher.publish({"n": 4}, timeout=0.05))
+    assert counter("kafka_events_dropped_total") == dropped + 2
+
+    connected.set()
+    publisher.flush(timeout=5)
+    assert producer.topics["events"] == [{"n": 1}, {"n": 2}]
+
+
+def test_closed_publisher_delivers_buffer_and_refuses_events(registry):
+    producer = InMemoryProducer(linger_ms=60_000)
+    registry.register("kafka_producer", lambda: producer)
+    publisher = EventPublisher(topic="events")
+
+    sent = counter("kafka_events_sent_total")
+    for n in range(3):
+        assert publisher.send({"n": n})
+    publisher.close(timeout=5)
+
+    assert producer.topics["events"] == [{"n": 0}, {"n": 1}, {"n": 2}]
+    assert counter("kafka_events_sent_total") == sent + 3
+    assert producer.closed
+    assert not publisher.send({"n": 3})
+    assert not asyncio.run(publisher.publish({"n": 4}))
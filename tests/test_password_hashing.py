@@ -0,0 +1,103 @@
+import asyncio
+
+import fakeredis
+import pytest
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend import crud, principal_cache
+from backend.database import Base
+from backend.models import User
+from backend.password_hashing import HashingOverloaded, PasswordHasher
+
+# Cost the worker processes require; hashes below it are upgraded
+ROUNDS = 5
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    # The spawned workers read the cost from the environment at import
+    monkeypatch.setenv("PASSWORD_BCRYPT_ROUNDS", str(ROUNDS))
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_requests_over_max_pending_are_rejected(hasher):
+    async def main():
+        first = asyncio.create_task(hasher.hash("secret"))
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(HashingOverloaded):
+                await hasher.hash("other")
+        finally:
+            hashed = await first
+        return hashed
+
+    assert bcrypt.verify("secret", asyncio.run(main()))
+
+
+def test_lower_cost_hash_is_upgraded(hasher):
+    weak = bcrypt.using(rounds=4).hash("secret")
+
+    valid, new_hash = asyncio.run(hasher.verify("secret", weak))
+    assert valid
+    assert bcrypt.from_string(new_hash).rounds == ROUNDS
+    assert bcrypt.verify("secret", new_hash)
+
+    assert asyncio.run(hasher.verify("wrong", weak)) == (False, None)
+    assert asyncio.run(hasher.verify("secret", new_hash)) == (True, None)
+
+
+async def with_user(monkeypatch, hashed_password, scenario):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        principal_cache,
+        "get_async_redis",
+        lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+    )
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with sessions() as db:
+        user = User(username="ada", email="ada@example.com")
+        user.hashed_password = hashed_password
+        db.add(user)
+        await db.commit()
+    try:
+        async with sessions() as db:
+            return await scenario(db, user)
+    finally:
+        await engine.dispose()
+
+
+def test_login_stores_the_upgraded_hash(monkeypatch, hasher):
+    monkeypatch.setattr(crud, "password_hasher", hasher)
+    weak = bcrypt.using(rounds=4).hash("secret")
+
+    async def scenario(db, user):
+        await principal_cache.principal_cache.put(user)
+        assert await principal_cache.principal_cache.get(str(user.id)) is not None
+        authenticated = await crud.authenticate_user(db, user.email, "secret")
+        await db.refresh(authenticated)
+        cached = await principal_cache.principal_cache.get(str(user.id))
+        return authenticated.hashed_password, cached
+
+    stored, cached = asyncio.run(with_user(monkeypatch, weak, scenario))
+    assert bcrypt.from_string(stored).rounds == ROUNDS
+    assert cached is None
+
+
+def test_overloaded_login_returns_503(monkeypatch):
+    monkeypatch.setattr(crud, "password_hasher", PasswordHasher(max_pending=0))
+
+    async def scenario(db, user):
+        with pytest.raises(HTTPException) as error:
+            await crud.authenticate_user(db, user.email, "secret")
+        return error.value
+
+    error = asyncio.run(with_user(monkeypatch, "unused", scenario))
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "1"}
@@ -0,0 +1,67 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from backend import principal_cache as module
+from backend.models import User
+from backend.principal_cache import PrincipalCache
+
+
+@pytest.fixture(autouse=True)
+def redis_server(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        module,
+        "get_async_redis",
+        lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+    )
+    return server
+
+
+def user(user_id=1):
+    return User(
+        id=user_id, username="ada", email="ada@example.com", hashed_password="x"
+    )
+
+
+def test_users_are_cached_without_the_password_hash():
+    async def main():
+        cache = PrincipalCache(ttl=30, size=10, redis_ttl=60)
+        await cache.put(user())
+        return await cache.get("1")
+
+    cached = asyncio.run(main())
+    assert (cached.id, cached.username, cached.email) == (1, "ada", "ada@example.com")
+    assert cached.hashed_password is None
+
+
+def test_replicas_share_users_through_redis():
+    async def main():
+        await PrincipalCache(redis_ttl=60).put(user())
+        return await PrincipalCache(redis_ttl=60).get(1)
+
+    assert asyncio.run(main()).email == "ada@example.com"
+
+
+def test_invalidate_drops_both_tiers():
+    async def main():
+        cache = PrincipalCache(redis_ttl=60)
+        other_replica = PrincipalCache(redis_ttl=60)
+        await cache.put(user())
+        await cache.invalidate(1)
+        return await cache.get(1), await other_replica.get(1)
+
+    assert asyncio.run(main()) == (None, None)
+
+
+def test_least_recently_used_users_are_evicted():
+    async def main():
+        cache = PrincipalCache(size=2, redis_ttl=0)
+        for user_id in (1, 2):
+            await cache.put(user(user_id))
+        await cache.get(1)
+        await cache.put(user(3))
+        return [await cache.get(user_id) is not None for user_id in (1, 2, 3)]
+
+    assert asyncio.run(main()) == [True, False, True]
@@ -0,0 +1,37 @@
+from backend.profiling import profile_data
+
+RESULT = {
+    "columns": ["order_date", "region", "manager", "units", "revenue"],
+    "data": [
+        ["2024-01-05", "2024-02-05", "2024-03-05", "2024-04-05"],
+        ["North", "South", "North", None],
+        [None, None, None, None],
+        ["10", "20", "30", "40"],
+        [100.0, 210.0, 290.0, 400.0],
+    ],
+}
+
+
+def test_profile_lists_columns_by_kind():
+    profile = profile_data(RESULT, token_budget=2000)
+    assert profile.startswith("4 rows, 5 columns: order_date, region")
+    assert "- units: 4, 10, 17.5, 25, 32.5, 40, 25, 12.91, 100" in profile
+    assert "- region: 2 distinct; North 50%, South 25% (1 nulls)" in profile
+    assert "- order_date: 2024-01-05 to 2024-04-05" in profile
+    assert "- units: rising" in profile
+
+
+def test_all_null_column_is_not_reported_as_unique():
+    profile = profile_data(RESULT, token_budget=2000)
+    assert "- manager: all null" in profile
+    assert "manager: 0 distinct" not in profile
+
+
+def test_profile_respects_the_token_budget():
+    profile = profile_data(RESULT, token_budget=30)
+    assert profile.endswith("(profile truncated to fit the token budget)")
+    assert len(profile) < 30 * 4 + 60
+
+
+def test_empty_result():
+    assert profile_data([]) == "The query returned no rows."
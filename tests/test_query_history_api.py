@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import app as module
+from backend.auth import get_current_user
+from backend.database import get_async_db
+from backend.models import User
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def no_db():
+        yield None
+
+    async def user_queries(user_id, db, limit, cursor):
+        return {"items": [], "next_cursor": None}
+
+    monkeypatch.setattr(module, "get_user_queries", user_queries)
+    module.app.dependency_overrides[get_current_user] = lambda: User(id=1)
+    module.app.dependency_overrides[get_async_db] = no_db
+    yield TestClient(module.app)
+    module.app.dependency_overrides.clear()
+
+
+def test_history_requires_authentication():
+    client = TestClient(module.app)
+    assert client.get("/queries/1").status_code == 401
+    assert client.get("/queries/1/7").status_code == 401
+
+
+def test_own_history_is_listed(client):
+    response = client.get("/queries/1")
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+
+
+def test_history_of_another_user_is_forbidden(client):
+    assert client.get("/queries/2").status_code == 403
+    assert client.get("/queries/2/7").status_code == 403
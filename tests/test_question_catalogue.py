@@ -0,0 +1,90 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from backend import cache, question_catalogue
+from backend.question_catalogue import (
+    LOCK_PREFIX,
+    QuestionCatalogue,
+    QuestionCatalogueStore,
+)
+
+SCHEMA_HASH = "schema"
+LOCK = f"{LOCK_PREFIX}{SCHEMA_HASH}"
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch):
+    server = fakeredis.FakeServer()
+
+    def get_async_redis():
+        return fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+
+    monkeypatch.setattr(cache, "get_async_redis", get_async_redis)
+    monkeypatch.setattr(question_catalogue, "get_async_redis", get_async_redis)
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+
+@pytest.fixture(autouse=True)
+def schema(monkeypatch):
+    async def snapshot():
+        return SimpleNamespace(fingerprint=SCHEMA_HASH)
+
+    async def full_context():
+        return "sales(id, total)", SCHEMA_HASH
+
+    introspector = SimpleNamespace(snapshot=snapshot, full_context=full_context)
+    monkeypatch.setattr(question_catalogue, "schema_introspector", introspector)
+
+
+def llm_answering(questions, during=None):
+    async def groq_llm(prompt):
+        if during is not None:
+            during()
+        return json.dumps({"questions": questions})
+
+    return groq_llm
+
+
+def test_generate_stores_the_catalogue_and_releases_the_lock(monkeypatch, redis_client):
+    monkeypatch.setattr(question_catalogue, "groq_llm", llm_answering(["Q1", "Q2"]))
+    catalogue = asyncio.run(QuestionCatalogueStore().get())
+
+    assert catalogue.questions == ["Q1", "Q2"]
+    assert redis_client.get(LOCK) is None
+    other_process = asyncio.run(QuestionCatalogueStore().read(SCHEMA_HASH))
+    assert other_process.questions == ["Q1", "Q2"]
+
+
+def test_lock_taken_over_after_timeout_is_kept(monkeypatch, redis_client):
+    # The lock expires mid-generation and another worker acquires it
+    def take_over():
+        redis_client.set(LOCK, "other-worker")
+
+    groq_llm = llm_answering(["Q1"], during=take_over)
+    monkeypatch.setattr(question_catalogue, "groq_llm", groq_llm)
+    asyncio.run(QuestionCatalogueStore().generate(SCHEMA_HASH))
+
+    assert redis_client.get(LOCK) == "other-worker"
+
+
+def test_cold_start_waits_for_the_generating_worker(monkeypatch, redis_client):
+    monkeypatch.setattr(question_catalogue, "groq_llm", llm_answering(["unused"]))
+    redis_client.set(LOCK, "other-worker")
+
+    async def wait_for_other_worker():
+        waiting = asyncio.create_task(QuestionCatalogueStore().get())
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        # The worker holding the lock finishes its catalogue
+        catalogue = QuestionCatalogue(
+            schema_hash=SCHEMA_HASH, questions=["Q1"], generated_at=time.time()
+        )
+        redis_client.set(f"questions:{SCHEMA_HASH}", catalogue.model_dump_json())
+        return await asyncio.wait_for(waiting, 5)
+
+    assert asyncio.run(wait_for_other_worker()).questions == ["Q1"]
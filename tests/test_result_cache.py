@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+
+from backend import cache
+from backend.cache import (
+    INDEX_KEY,
+    bump_table_versions,
+    canonical_sql,
+    get_cached_result,
+    referenced_tables,
+    result_cache_key,
+    set_cached_result,
+    table_update_times,
+)
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        cache,
+        "get_async_redis",
+        lambda: fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+    )
+    return fakeredis.FakeRedis(server=server, decode_responses=True)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_canonical_sql_ignores_formatting():
+    assert (
+        canonical_sql("SELECT  `name`, SUM(total)\n-- note\nFROM Sales /* x */ ;")
+        == canonical_sql("select name,sum(total) from sales")
+        == "select name,sum(total)from sales"
+    )
+
+
+def test_canonical_sql_keeps_string_literals():
+    assert canonical_sql("SELECT * FROM t WHERE name = 'Acme  Corp'") == (
+        "select*from t where name='Acme  Corp'"
+    )
+    assert canonical_sql("SELECT 'A'") != canonical_sql("SELECT 'a'")
+
+
+def test_referenced_tables():
+    sql = "SELECT * FROM db.sales s JOIN stores ON s.id = stores.id, regions r"
+    assert referenced_tables(sql) == ["regions", "sales", "stores"]
+    sql = "WITH top AS (SELECT * FROM Sales) SELECT * FROM top"
+    assert referenced_tables(sql) == ["sales"]
+    assert referenced_tables("UPDATE sales SET total = 0") == ["sales"]
+
+
+def test_result_cache_key_follows_table_versions():
+    sql = "SELECT * FROM sales JOIN stores ON sales.store = stores.id"
+    key = run(result_cache_key(sql))
+    same = "select * from sales join stores on sales.store=stores.id"
+    assert run(result_cache_key(same)) == key
+
+    run(bump_table_versions(["regions"]))
+    assert run(result_cache_key(sql)) == key
+    run(bump_table_versions(["stores"]))
+    assert run(result_cache_key(sql)) != key
+
+
+def test_result_cache_key_follows_update_times():
+    sql = "SELECT * FROM sales"
+    assert run(result_cache_key(sql, ["2024-01-01T00:00:00"])) != run(
+        result_cache_key(sql, ["2024-01-01T00:00:05"])
+    )
+
+
+def test_write_misses_cached_select():
+    sql = "SELECT * FROM sales"
+    run(set_cached_result(sql, {"rows": [[1]]}))
+    assert run(get_cached_result(sql)) == {"rows": [[1]]}
+
+    run(bump_table_versions(referenced_tables("UPDATE sales SET total = 0")))
+    assert run(get_cached_result(sql)) is None
+
+
+def test_eviction_drops_least_recently_used(monkeypatch, redis_client):
+    monkeypatch.setattr(cache, "RESULT_CACHE_MAX_ENTRIES", 2)
+    clock = iter(range(100, 200))
+    # Only the cache's clock: the asyncio Redis client reads time.time too
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: next(clock)))
+
+    run(set_cached_result("SELECT 1 FROM a", [1]))
+    run(set_cached_result("SELECT 1 FROM b", [2]))
+    # Reading `a` makes `b` the least recently used entry
+    assert run(get_cached_result("SELECT 1 FROM a")) == [1]
+    run(set_cached_result("SELECT 1 FROM c", [3]))
+
+    assert run(get_cached_result("SELECT 1 FROM a")) == [1]
+    assert run(get_cached_result("SELECT 1 FROM b")) is None
+    assert run(get_cached_result("SELECT 1 FROM c")) == [3]
+    assert redis_client.zcard(INDEX_KEY) == 2
+
+
+class StampSession:
+    def __init__(self, rows=None, error=None):
+        self.rows = rows or []
+        self.error = error
+
+    async def execute(self, statement, params):
+        if self.error:
+            raise self.error
+        return self.rows
+
+
+def test_table_update_times():
+    stamp = datetime(2024, 1, 1, 12, 0, 0)
+    session = StampSession([("sales", stamp, 0), ("stores", None, None)])
+    times = asyncio.run(table_update_times(session, ["sales", "stores"]))
+    assert times == [stamp.isoformat(), ""]
+
+
+def test_table_update_times_skips_the_cache():
+    just_written = StampSession([("sales", datetime.now(), 1)])
+    assert asyncio.run(table_update_times(just_written, ["sales"])) is None
+    failing = StampSession(error=RuntimeError("no information_schema"))
+    assert asyncio.run(table_update_times(failing, ["sales"])) is None
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from prometheus_client import REGISTRY
+
+from backend import semantic_cache as module
+from backend.semantic_cache import (
+    SemanticQueryCache,
+    normalize_question,
+    question_literals,
+)
+
+SCHEMA_HASH = "schema"
+
+
+class FakeCollection:
+    """Stores entries in memory; every stored question is a close neighbour."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, ids=None, where=None, include=None):
+        found = [i for i in (ids or []) if i in self.entries]
+        return {"ids": found, "metadatas": [self.entries[i] for i in found]}
+
+    def query(self, query_embeddings, n_results, where, include):
+        metadatas = list(self.entries.values())[:n_results]
+        return {"metadatas": [metadatas], "distances": [[0.01] * len(metadatas)]}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.entries.update(zip(ids, metadatas))
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(module, "embed_texts", lambda texts: [[0.0] for _ in texts])
+    monkeypatch.setattr(module, "distance_to_similarity", lambda d: 1.0 - d)
+    cache = SemanticQueryCache(collection=FakeCollection(), threshold=0.92)
+    cache.schema_hash = SCHEMA_HASH
+    return cache
+
+
+def test_normalize_question_keeps_numbers():
+    assert normalize_question("Total sales in 2021?") == "total sales in 2021"
+    assert normalize_question("Growth above 2.5%!") == "growth above 2.5%"
+
+
+def test_question_literals():
+    assert question_literals("Sales of 'Acme' in 2021") == '["acme", "2021"]'
+    assert question_literals("Show all customers") == "[]"
+    assert question_literals("Orders from Acme in january") == '["acme", "january"]'
+    assert question_literals("Acme orders. What did I sell?") == "[]"
+
+
+def test_paraphrase_with_same_literals_hits(cache):
+    cache.store("Total sales in 2021", "SELECT 2021", SCHEMA_HASH)
+    assert cache.lookup("What were the sales in 2021?", SCHEMA_HASH) == "SELECT 2021"
+
+
+@pytest.mark.parametrize(
+    "stored, asked",
+    [
+        ("Total sales in 2021", "Total sales in 2022"),
+        ("Orders of employee 5", "Orders of employee 6"),
+        ("Revenue of 'Acme'", "Revenue of 'Globex'"),
+        ("Sales in January", "Sales in February"),
+        ("Revenue of Acme last year", "Revenue of Globex last year"),
+        ("sales in january", "sales in february"),
+    ],
+)
+def test_neighbour_with_other_literals_misses(cache, stored, asked):
+    cache.store(stored, "SELECT 1", SCHEMA_HASH)
+    assert cache.lookup(asked, SCHEMA_HASH) is None
+
+
+def counter(name):
+    return REGISTRY.get_sample_value(name) or 0.0
+
+
+def test_hits_are_counted_after_replay(cache):
+    cache.store("Total sales in 2021", "SELECT 2021", SCHEMA_HASH)
+    hits = counter("semantic_cache_hits_total")
+    misses = counter("semantic_cache_misses_total")
+
+    assert cache.lookup("Total sales in 2021", SCHEMA_HASH) == "SELECT 2021"
+    assert counter("semantic_cache_hits_total") == hits
+
+    cache.record_replay(validated=False)
+    assert counter("semantic_cache_hits_total") == hits
+    assert counter("semantic_cache_misses_total") == misses + 1
+
+    cache.record_replay(validated=True)
+    assert counter("semantic_cache_hits_total") == hits + 1
+
+
+def test_neighbour_whose_sql_filters_on_other_names_misses(cache):
+    cache.store("acme revenue", "SELECT SUM(total) WHERE name = 'Acme'", SCHEMA_HASH)
+    assert cache.lookup("globex revenue", SCHEMA_HASH) is None
+    assert cache.lookup("revenue of acme", SCHEMA_HASH) is not None
+
+
+def test_failed_replay_is_not_counted_as_hit(cache, monkeypatch):
+    main = pytest.importorskip("backend.main")
+    from backend import coalesce
+    from backend.schemas import QueryResult
+
+    monkeypatch.setattr(main, "semantic_cache", cache)
+    monkeypatch.setattr(coalesce, "COALESCE_ENABLED", False)
+    cache.store("Total sales in 2021", "SELECT broken", SCHEMA_HASH)
+
+    class Agent:
+        async def replay(self, sql, session, stream, on_event):
+            return QueryResult(attempts=[sql], error="no such column")
+
+        async def forward(self, query, session, stream, on_event):
+            return QueryResult(sql="SELECT 2021", rows=[[1]], validated=True)
+
+    hits = counter("semantic_cache_hits_total")
+    misses = counter("semantic_cache_misses_total")
+    result = asyncio.run(
+        main.answer(Agent(), "Total sales in 2021", SCHEMA_HASH, None, False, None)
+    )
+
+    assert result.sql == "SELECT 2021"
+    assert counter("semantic_cache_hits_total") == hits
+    assert counter("semantic_cache_misses_total") == misses + 1
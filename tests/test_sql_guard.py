@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from backend import sql_guard
+from backend.sql_guard import QueryGuard, QueryRejected
+
+
+@pytest.fixture
+def guard(monkeypatch):
+    monkeypatch.setattr(sql_guard, "SQL_GUARD_ENABLED", True)
+    return QueryGuard(max_rows=100, timeout_ms=5000, explain_max_rows=1000)
+
+
+def test_limit_is_added(guard):
+    guarded = guard.prepare("SELECT name FROM stores")
+    assert guarded.sql == "SELECT name FROM stores LIMIT 100"
+    assert guarded.limit == 100
+    assert guarded.decisions == ["Added LIMIT 100"]
+
+
+def test_limit_is_lowered(guard):
+    guarded = guard.prepare("SELECT name FROM stores LIMIT 5000")
+    assert guarded.sql == "SELECT name FROM stores LIMIT 100"
+    assert guarded.decisions == ["Lowered LIMIT 5000 to the maximum of 100"]
+
+
+def test_smaller_limit_is_kept(guard):
+    guarded = guard.prepare("SELECT name FROM stores LIMIT 10")
+    assert guarded.sql == "SELECT name FROM stores LIMIT 10"
+    assert guarded.limit == 10
+    assert guarded.decisions == []
+
+
+def test_timeout_hint_goes_after_the_first_select(guard):
+    guarded = guard.prepare("SELECT id FROM sales UNION SELECT id FROM returns")
+    assert guarded.timeout_ms == 5000
+    executable = guarded.executable_sql
+    assert executable.startswith("SELECT /*+ MAX_EXECUTION_TIME(5000) */ id")
+    assert executable.count("MAX_EXECUTION_TIME") == 1
+    assert executable.endswith("LIMIT 100")
+
+
+def test_ctes_rely_on_the_session_timeout(guard):
+    guarded = guard.prepare("WITH s AS (SELECT id FROM sales) SELECT id FROM s")
+    assert guarded.timeout_ms is None
+    assert guarded.executable_sql == guarded.sql
+    assert guarded.limit == 100
+
+
+@pytest.mark.parametrize(
+    "sql", ["DELETE FROM sales", "update sales set units_sold = 0", "DROP TABLE x"]
+)
+def test_writes_are_rejected(guard, sql):
+    with pytest.raises(QueryRejected):
+        guard.prepare(sql)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT * FROM sales INTO OUTFILE '/tmp/sales.csv'",
+        "SELECT * INTO DUMPFILE '/tmp/sales' FROM sales",
+        "SELECT total INTO @total FROM sales",
+    ],
+)
+def test_select_into_is_rejected(guard, sql):
+    with pytest.raises(QueryRejected):
+        guard.prepare(sql)
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT * FROM sales FOR UPDATE",
+        "SELECT * FROM sales LOCK IN SHARE MODE",
+        "SELECT id FROM sales UNION SELECT id FROM returns FOR SHARE",
+    ],
+)
+def test_locking_reads_are_rejected(guard, sql):
+    with pytest.raises(QueryRejected):
+        guard.prepare(sql)
+
+
+def test_into_outfile_in_a_string_is_allowed(guard):
+    guarded = guard.prepare("SELECT * FROM notes WHERE body = 'into outfile'")
+    assert guarded.limit == 100
+
+
+def test_parse_errors_pass_through(guard):
+    sql = "SELECT FROM WHERE ("
+    guarded = guard.prepare(sql)
+    assert guarded.sql == sql
+    assert guarded.limit is None
+    assert guarded.executable_sql == sql
+
+
+class ExplainSession:
+    def __init__(self, plan):
+        self.plan = plan
+
+    async def execute(self, statement):
+        return self
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.plan
+
+
+def test_estimate_rows_multiplies_joins_and_adds_selects(guard):
+    plan = [
+        {"id": 1, "rows": 100, "filtered": 50.0},  # 50 rows
+        {"id": 1, "rows": 20, "filtered": 100.0},  # joined: 50 * 20
+        {"id": 2, "rows": 30, "filtered": None},  # a separate SELECT
+        {"id": 2, "rows": None, "filtered": None},
+    ]
+    estimate = asyncio.run(guard.estimate_rows("SELECT 1", ExplainSession(plan)))
+    assert estimate == 50 * 20 + 30
+
+
+def test_over_budget_plan_is_rejected_or_capped(guard):
+    plan = [{"id": 1, "rows": 5000, "filtered": 100.0}]
+    guarded = guard.prepare("SELECT name FROM stores")
+    with pytest.raises(QueryRejected):
+        asyncio.run(guard.admit(guarded, ExplainSession(plan)))
+
+    guard.over_budget = "cap"
+    guard.capped_rows = 10
+    capped = asyncio.run(guard.admit(guarded, ExplainSession(plan)))
+    assert capped.sql == "SELECT name FROM stores LIMIT 10"
+    assert capped.limit == 10
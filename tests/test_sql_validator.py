@@ -0,0 +1,75 @@
+from backend.sql_validator import validate_sql
+
+SCHEMA = {
+    "sales": ["id", "store_id", "units_sold", "sold_at"],
+    "stores": ["id", "name", "region"],
+}
+
+
+def test_valid_sql_is_unchanged():
+    sql = "SELECT s.units_sold FROM sales s JOIN stores ON s.store_id = stores.id"
+    result = validate_sql(sql, SCHEMA)
+    assert result.valid
+    assert not result.repaired
+    assert result.sql == sql
+
+
+def test_table_typo_is_repaired():
+    result = validate_sql("SELECT units_sold FROM sale", SCHEMA)
+    assert result.valid
+    assert result.repairs == ["table sale -> sales"]
+    assert result.sql == "SELECT units_sold FROM sales"
+
+
+def test_column_typo_is_repaired():
+    result = validate_sql("SELECT s.unit_sold FROM sales AS s", SCHEMA)
+    assert result.valid
+    assert result.repairs == ["column s.unit_sold -> units_sold"]
+    assert result.sql == "SELECT s.units_sold FROM sales AS s"
+
+
+def test_unqualified_column_typo_is_repaired():
+    result = validate_sql("SELECT regoin FROM stores", SCHEMA)
+    assert result.repairs == ["column ?.regoin -> region"]
+    assert result.sql == "SELECT region FROM stores"
+
+
+def test_unknown_qualifier_is_rejected():
+    result = validate_sql("SELECT x.name FROM stores", SCHEMA)
+    assert not result.valid
+    assert result.errors == ["Unknown table or alias `x`"]
+
+
+def test_unknown_table_and_column_are_rejected():
+    result = validate_sql("SELECT customers.email FROM customers", SCHEMA)
+    assert not result.valid
+    assert "Unknown table `customers`" in result.errors
+
+    result = validate_sql("SELECT revenue FROM sales", SCHEMA)
+    assert result.errors == ["Unknown column `revenue`"]
+
+
+def test_multiple_statements_are_rejected():
+    result = validate_sql("SELECT id FROM sales; DROP TABLE sales", SCHEMA)
+    assert not result.valid
+    assert result.errors == ["Expected exactly one SQL statement"]
+
+
+def test_syntax_error_is_rejected():
+    result = validate_sql("SELECT FROM WHERE (", SCHEMA)
+    assert not result.valid
+    assert result.errors[0].startswith("Syntax error")
+
+
+def test_ctes_and_aliases_are_not_repaired():
+    sql = (
+        "WITH totals AS (SELECT store_id, SUM(units_sold) AS units FROM sales "
+        "GROUP BY store_id) SELECT t.units FROM totals AS t ORDER BY units"
+    )
+    result = validate_sql(sql, SCHEMA)
+    assert result.valid
+    assert not result.repaired
+
+
+def test_empty_schema_skips_identifier_checks():
+    assert validate_sql("SELECT anything FROM anywhere", {}).valid